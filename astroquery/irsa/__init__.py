@@ -8,8 +8,15 @@ IRSA_SERVER = ConfigurationItem('irsa_server', ['http://irsa.ipac.caltech.edu/cg
                                'Name of the IRSA mirror to use.')
 GATOR_LIST_CATALOGS = ConfigurationItem('gator_list_catalogs', ['http://irsa.ipac.caltech.edu/cgi-bin/Gator/nph-scan'],
                                         'URL from which to list all the public catalogs in IRSA.')
+GATOR_DD = ConfigurationItem('gator_dd', ['http://irsa.ipac.caltech.edu/cgi-bin/Gator/nph-dd'],
+                             'URL from which to get the column descriptions of an IRSA catalog.')
+CATALOG_CACHE_TTL = ConfigurationItem('catalog_cache_ttl', 86400,
+                                      'time in seconds for which the cached list of IRSA catalogs '
+                                      'and their columns is reused')
 ROW_LIMIT = ConfigurationItem('row_limit', 500, 'maximum number of rows to retrieve in result')
 TIMEOUT = ConfigurationItem('timeout', 60, 'time limit for connecting to the IRSA server')
+POSITIONS_PER_QUERY = ConfigurationItem('positions_per_query', 1000,
+                                          'maximum number of positions uploaded per multi-object search')
 
 from .core import Irsa,IrsaClass
 
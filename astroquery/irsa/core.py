@@ -90,20 +90,32 @@ If onlist=0, the following parameters are required:
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 from __future__ import print_function, division
 
+import os
+import json
+import time
 import warnings
 import tempfile
 import xml.etree.ElementTree as tree
 
+import numpy as np
+
 import astropy.units as u
 import astropy.coordinates as coord
 import astropy.io.votable as votable
+from astropy.table import Column, vstack
+from astropy.config import get_cache_dir
+from astropy.utils import OrderedDict
 
 from ..query import BaseQuery
-from ..utils import commons
+from ..utils import commons, parallel, tilecache
+from ..utils.ipac import read_ipac_table
 from . import (IRSA_SERVER,
                GATOR_LIST_CATALOGS,
+               GATOR_DD,
+               CATALOG_CACHE_TTL,
                ROW_LIMIT,
-               TIMEOUT)
+               TIMEOUT,
+               POSITIONS_PER_QUERY)
 from ..exceptions import TableParseError
 
 __all__ = ['Irsa','IrsaClass']
@@ -112,8 +124,24 @@ __all__ = ['Irsa','IrsaClass']
 class IrsaClass(BaseQuery):
     IRSA_URL = IRSA_SERVER()
     GATOR_LIST_URL = GATOR_LIST_CATALOGS()
+    GATOR_DD_URL = GATOR_DD()
+    CATALOG_CACHE_TTL = CATALOG_CACHE_TTL()
     TIMEOUT = TIMEOUT()
     ROW_LIMIT = ROW_LIMIT()
+    POSITIONS_PER_QUERY = POSITIONS_PER_QUERY()
+    # format of the results: 3 for VOTable, or 1 for the IPAC ASCII table,
+    # which is faster to parse but carries less metadata
+    OUTFMT = 3
+    # optional `astroquery.utils.TileCache` answering cone/box queries
+    tile_cache = None
+    # file keeping the catalog list and the column descriptions for all the
+    # sessions; defaults to irsa_catalogs.json in the astroquery cache directory
+    catalog_cache_location = None
+
+    def __init__(self):
+        super(IrsaClass, self).__init__()
+        self._catalog_cache = None
+        self._catalog_cache_key = None
 
     def query_region(self, coordinates=None, catalog=None, spatial='Cone', radius=10 * u.arcsec,
                      width=None, polygon=None, get_query_payload=False, verbose=False):
@@ -158,7 +186,20 @@ class IrsaClass(BaseQuery):
         -------
         table : `~astropy.table.Table`
             A table containing the results of the query
+
+        Notes
+        -----
+        If ``tile_cache`` is set to an `astroquery.utils.TileCache`, the cone
+        and box searches around coordinates (not object names) are answered
+        from the cached sky tiles, and only the missing tiles are queried.
+        The tiles truncated by ``ROW_LIMIT`` are not cached.
         """
+        if (self.tile_cache is not None and not get_query_payload and
+                spatial in ['Cone', 'Box'] and
+                commons._is_coordinate(coordinates)):
+            return self._query_region_cached(coordinates, catalog,
+                                             spatial=spatial, radius=radius,
+                                             width=width, verbose=verbose)
         response = self.query_region_async(coordinates, catalog=catalog, spatial=spatial,
                                            radius=radius, width=width, polygon=polygon,
                                            get_query_payload=get_query_payload)
@@ -223,6 +264,245 @@ class IrsaClass(BaseQuery):
                                         Irsa.TIMEOUT, request_type='GET')
         return response
 
+    def query_region_list(self, table, catalog=None, radius=10 * u.arcsec,
+                          chunk_size=None, max_workers=None, verbose=False):
+        """
+        Cross-matches a list of positions with a catalog using the
+        multi-object search of Gator: the positions are uploaded as a table
+        and all the sources within ``radius`` of any of them are returned in
+        a single request. Long lists are uploaded in chunks of at most
+        ``chunk_size`` positions, which are sent concurrently.
+
+        Parameters
+        ----------
+        table : `astropy.table.Table` or `astropy.coordinates` object
+            The positions to search around: a table with ``ra`` and ``dec``
+            columns (in degrees unless they have units) or a coordinates
+            object holding an array of positions.
+        catalog : str
+            The catalog to be used.
+        radius : str or `astropy.units.Quantity` object, optional
+            The string must be parsable by `astropy.coordinates.Angle`. The appropriate
+            `Quantity` object from `astropy.units` may also be used. Defaults to 10 arcsec.
+        chunk_size : int, optional
+            Maximum number of positions per upload. Defaults to
+            `astroquery.irsa.POSITIONS_PER_QUERY`.
+        max_workers : int, optional
+            Maximum number of simultaneous uploads. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        verbose : bool, optional.
+            When set to `True` displays warnings if the returned VOTables do not
+            conform to the standard. Defaults to `False`.
+
+        Returns
+        -------
+        table : `~astropy.table.Table`
+            The matched sources. The ``INPUT_INDEX`` column gives the row of
+            ``table`` each source was found around; a source near several
+            positions appears once for each. ``ROW_LIMIT`` applies to every
+            chunk.
+
+        Raises
+        ------
+        ValueError
+            If ``table`` holds no positions.
+        """
+        if catalog is None:
+            raise Exception("Catalog name is required!")
+        ra, dec = commons.coord_array_to_radec(table)
+        if len(ra) == 0:
+            raise ValueError("No positions to cross-match: the input is empty.")
+        if chunk_size is None:
+            chunk_size = self.POSITIONS_PER_QUERY
+        radius = _parse_dimension(radius).to(u.arcsec).value
+        if not verbose:
+            commons.suppress_vo_warnings()
+
+        def query_chunk(start):
+            stop = min(start + chunk_size, len(ra))
+            request_payload = self._args_to_payload(catalog)
+            request_payload['spatial'] = 'Upload'
+            request_payload['uradius'] = radius
+            request_payload['uradunits'] = 'arcsec'
+            upload = _upload_table(np.arange(start, stop), ra[start:stop],
+                                   dec[start:stop])
+            response = commons.send_request(self.IRSA_URL, request_payload,
+                                            self.TIMEOUT,
+                                            files={'filename': ('upload.tbl', upload)})
+            result = self._parse_result(response, verbose=True)
+            if len(result) >= self.ROW_LIMIT:
+                warnings.warn("The results of {0} reached ROW_LIMIT={1} and "
+                              "are probably incomplete.".format(catalog,
+                                                                self.ROW_LIMIT))
+            return _index_upload_result(result, start)
+
+        tables = parallel.parallel_map(query_chunk, range(0, len(ra), chunk_size),
+                                       max_workers=max_workers)
+        return tables[0] if len(tables) == 1 else vstack(tables)
+
+    def iter_query_region_tiled(self, coordinates=None, catalog=None, spatial='Box',
+                                width=None, polygon=None, density=None,
+                                max_workers=None, verbose=False):
+        """
+        Performs a large box or polygon search as many smaller searches sent
+        concurrently, and yields the results tile by tile as they arrive.
+
+        The bounding box of the region is cut in tiles expected to hold about
+        half of ``ROW_LIMIT`` sources each, given the ``density`` of the
+        catalog. Every tile is fetched with a cone search containing it; the
+        rows are then cut to the tile, so that a source on the border of two
+        tiles is only returned once, and to the exact box or polygon. A tile
+        whose search reaches ``ROW_LIMIT`` is split in four and searched
+        again.
+
+        Parameters
+        ----------
+        coordinates : str, `astropy.coordinates` object
+            The center of the box. Required if spatial is 'Box'.
+        catalog : str
+            The catalog to be used.
+        spatial : str
+            Type of spatial query: 'Box' or 'Polygon'. Defaults to 'Box'.
+        width : str, `astropy.units.Quantity` object [Required for spatial is 'Box'.]
+            The string must be parsable by `astropy.coordinates.Angle`. The appropriate
+            `Quantity` object from `astropy.units` may also be used.
+        polygon : list, [Required for spatial is 'Polygon']
+            A list of ``(ra, dec)`` pairs (as tuples), in decimal degrees,
+            outlinining the polygon to search in. It can also be a list of
+            `astropy.coordinates` object or strings that can be parsed by
+            `astropy.coordinates.ICRS`.
+        density : float, optional
+            The expected number of sources per square degree. If missing, the
+            whole region is searched first and split as needed.
+        max_workers : int, optional
+            Maximum number of simultaneous searches. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        verbose : bool, optional.
+            When set to `True` displays warnings if the returned VOTables do not
+            conform to the standard. Defaults to `False`.
+
+        Returns
+        -------
+        generator
+            Yields an `~astropy.table.Table` with the sources of each tile.
+        """
+        if catalog is None:
+            raise Exception("Catalog name is required!")
+        if spatial == 'Box':
+            c = commons.parse_coordinates(coordinates)
+            ra, dec = c.icrs.ra.degree, c.icrs.dec.degree
+            size = _parse_dimension(width).to(u.deg).value
+
+            def region_mask(table):
+                return tilecache.region_mask(table['ra'], table['dec'], ra, dec,
+                                             width=size)
+            # slightly larger than the box, to keep the sources on its edges
+            half_ra = min(180., size * 0.501 / max(np.cos(np.radians(dec)), 1e-3))
+            bounds = (ra - half_ra, ra + half_ra,
+                      max(dec - size * 0.501, -90.), min(dec + size * 0.501, 90.))
+        elif spatial == 'Polygon':
+            polygon_ra, polygon_dec = _polygon_to_deg(polygon)
+
+            def region_mask(table):
+                return tilecache.polygon_mask(table['ra'], table['dec'],
+                                              polygon_ra, polygon_dec)
+            bounds = _polygon_bounds(polygon_ra, polygon_dec)
+        else:
+            raise ValueError("Tiled queries must be either 'Box' or 'Polygon'.")
+        if not verbose:
+            commons.suppress_vo_warnings()
+
+        def fetch(tile):
+            tile_ra, tile_dec, tile_radius = _tile_cone(tile)
+            center = coord.ICRS(tile_ra % 360., tile_dec, unit=(u.deg, u.deg))
+            response = self.query_region_async(center, catalog=catalog,
+                                               spatial='Cone',
+                                               radius=tile_radius * u.deg)
+            return self._parse_result(response, verbose=True)
+
+        tiles = _plan_tiles(bounds, density, self.ROW_LIMIT)
+        while tiles:
+            split = []
+            results = parallel.parallel_imap(fetch, tiles, max_workers=max_workers)
+            for index, table in enumerate(results):
+                tile = tiles[index]
+                ra_min, ra_max, dec_min, dec_max = tile
+                if len(table) >= self.ROW_LIMIT:
+                    if dec_max - dec_min > 1. / 3600:
+                        split += _split_tile(tile)
+                        continue
+                    warnings.warn("The results of {0} reached ROW_LIMIT={1} and "
+                                  "are probably incomplete.".format(catalog,
+                                                                    self.ROW_LIMIT))
+                table_ra = _unwrap_ra(np.asarray(table['ra'], dtype=float), bounds[0])
+                table_dec = np.asarray(table['dec'], dtype=float)
+                mask = ((table_ra >= ra_min) & (table_ra < ra_max) &
+                        (table_dec >= dec_min) & (table_dec < dec_max))
+                table = table[mask]
+                yield table[region_mask(table)]
+            tiles = split
+
+    def query_region_tiled(self, coordinates=None, catalog=None, spatial='Box',
+                           width=None, polygon=None, density=None,
+                           max_workers=None, verbose=False):
+        """
+        Performs a large box or polygon search as many smaller searches sent
+        concurrently. See `iter_query_region_tiled` for the parameters.
+
+        Returns
+        -------
+        table : `~astropy.table.Table`
+            A table containing the results of the query
+        """
+        tables = list(self.iter_query_region_tiled(coordinates, catalog=catalog,
+                                                   spatial=spatial, width=width,
+                                                   polygon=polygon, density=density,
+                                                   max_workers=max_workers,
+                                                   verbose=verbose))
+        non_empty = [table for table in tables if len(table) > 0]
+        if len(non_empty) == 0:
+            return tables[0]
+        return non_empty[0] if len(non_empty) == 1 else vstack(non_empty)
+
+    def _query_region_cached(self, coordinates, catalog, spatial='Cone',
+                             radius=10 * u.arcsec, width=None, verbose=False):
+        """
+        Answers a cone or box search from ``self.tile_cache``, querying IRSA
+        only for the tiles that are not cached yet.
+        """
+        if catalog is None:
+            raise Exception("Catalog name is required!")
+        if isinstance(coordinates, basestring):
+            c = coord.ICRS(coordinates)
+        else:
+            c = coordinates
+        ra, dec = c.icrs.ra.degree, c.icrs.dec.degree
+        if spatial == 'Cone':
+            region = dict(radius=_parse_dimension(radius).to(u.deg).value)
+        else:
+            region = dict(width=_parse_dimension(width).to(u.deg).value)
+
+        def fetch(tile_ra, tile_dec, tile_radius):
+            center = coord.ICRS(tile_ra, tile_dec, unit=(u.deg, u.deg))
+            response = self.query_region_async(center, catalog=catalog,
+                                               spatial='Cone',
+                                               radius=tile_radius * u.deg)
+            table = self._parse_result(response, verbose=verbose)
+            if len(table) >= self.ROW_LIMIT:
+                warnings.warn("The results of {0} reached ROW_LIMIT={1} and "
+                              "are probably incomplete.".format(catalog,
+                                                                self.ROW_LIMIT))
+            return {catalog: table}
+
+        # the tiles cut by ROW_LIMIT are not cached, and fetched again later
+        tables = self.tile_cache.query(('irsa', Irsa.IRSA_URL, catalog,
+                                        self.ROW_LIMIT, self.OUTFMT),
+                                       fetch, ra, dec,
+                                       complete=lambda result:
+                                       len(result[catalog]) < self.ROW_LIMIT,
+                                       **region)
+        return tables[catalog]
+
     def _parse_spatial(self, spatial, coordinates, radius=None, width=None,
                        polygon=None):
         """
@@ -302,14 +582,17 @@ class IrsaClass(BaseQuery):
         -------
         request_payload : dict
         """
+        self._validate_catalog(catalog)
         request_payload = dict(catalog=catalog,
-                               outfmt=3,
-                               outrows=Irsa.ROW_LIMIT)
+                               outfmt=self.OUTFMT,
+                               outrows=self.ROW_LIMIT)
         return request_payload
 
     def _parse_result(self, response, verbose=False):
         """
         Parses the results form the HTTP response to `astropy.table.Table`.
+        Both the VOTable and the IPAC table formats (see ``OUTFMT``) are
+        recognized.
 
         Parameters
         ----------
@@ -337,6 +620,18 @@ class IrsaClass(BaseQuery):
         if len(response.content) == 0:
             raise Exception("The IRSA server sent back an empty reply")
 
+        if response.content.lstrip()[:1] in ('|', '\\', b'|', b'\\'):
+            try:
+                table = read_ipac_table(response.content)
+            except Exception as ex:
+                self.response = response
+                self.table_parse_error = ex
+                raise TableParseError("Failed to parse IRSA IPAC table! The raw response can be found "
+                                      "in self.response, and the error in self.table_parse_error.")
+            if len(table) == 0:
+                warnings.warn("Query returned no results, so the table will be empty")
+            return table
+
         # Write table to temporary file
         output = tempfile.NamedTemporaryFile()
         output.write(response.content.encode())
@@ -360,10 +655,20 @@ class IrsaClass(BaseQuery):
 
         return table
 
-    def list_catalogs(self):
+    def list_catalogs(self, cache=True):
         """
         Return a dictionary of the catalogs in the IRSA Gator tool.
 
+        The list is kept in a file shared by all the sessions (see
+        ``catalog_cache_location``), and only fetched again once it is older
+        than ``CATALOG_CACHE_TTL`` seconds.
+
+        Parameters
+        ----------
+        cache : bool, optional
+            Defaults to `True`. If `False`, the list is fetched from IRSA and
+            replaces the cached one.
+
         Returns
         -------
         catalogs : dict
@@ -371,14 +676,54 @@ class IrsaClass(BaseQuery):
             be used in query functions, and the value is the verbose description
             of the catalog.
         """
-        response = commons.send_request(Irsa.GATOR_LIST_URL, dict(mode='xml'), Irsa.TIMEOUT, request_type="GET")
-        root =tree.fromstring(response.content)
-        catalogs = {}
-        for catalog in root.findall('catalog'):
-            catname = catalog.find('catname').text
-            desc = catalog.find('desc').text
-            catalogs[catname] = desc
-        return catalogs
+        catalogs = self._cached_entry('catalogs') if cache else None
+        if catalogs is None:
+            response = commons.send_request(Irsa.GATOR_LIST_URL, dict(mode='xml'), Irsa.TIMEOUT, request_type="GET")
+            root =tree.fromstring(response.content)
+            catalogs = {}
+            for catalog in root.findall('catalog'):
+                catname = catalog.find('catname').text
+                desc = catalog.find('desc').text
+                catalogs[catname] = desc
+            self._update_catalog_cache('catalogs', catalogs)
+        return dict(catalogs)
+
+    def list_columns(self, catalog, cache=True):
+        """
+        Return the columns of a catalog in the IRSA Gator tool, from its data
+        dictionary. The columns are cached like the catalog list (see
+        `list_catalogs`).
+
+        Parameters
+        ----------
+        catalog : str
+            The name of the catalog.
+        cache : bool, optional
+            Defaults to `True`. If `False`, the columns are fetched from IRSA
+            and replace the cached ones.
+
+        Returns
+        -------
+        columns : `~astropy.utils.OrderedDict`
+            The descriptions of the columns, keyed by column name, in the order
+            of the data dictionary.
+        """
+        key = 'columns:' + catalog
+        columns = self._cached_entry(key) if cache else None
+        if columns is None:
+            self._validate_catalog(catalog)
+            response = commons.send_request(Irsa.GATOR_DD_URL,
+                                            dict(catalog=catalog, mode='ascii'),
+                                            Irsa.TIMEOUT, request_type="GET")
+            if 'The catalog is not on the list' in response.text:
+                raise Exception("Catalog not found")
+            table = read_ipac_table(response.content)
+            descriptions = (table['description'].astype(str)
+                            if 'description' in table.colnames else [''] * len(table))
+            columns = [[name, desc] for name, desc
+                       in zip(table['name'].astype(str), descriptions)]
+            self._update_catalog_cache(key, columns)
+        return OrderedDict(columns)
 
     def print_catalogs(self):
         """
@@ -388,9 +733,107 @@ class IrsaClass(BaseQuery):
         for catname in catalogs:
             print("{:30s}  {:s}".format(catname, catalogs[catname]))
 
+    def _validate_catalog(self, catalog):
+        """
+        Checks a catalog name against the cached catalog list. The check
+        costs no request for a known catalog: it is skipped while no list
+        fetched within ``CATALOG_CACHE_TTL`` is cached, and the list is only
+        fetched again for a name missing from it, which may have been added
+        since the list was cached.
+        """
+        catalogs = self._cached_entry('catalogs')
+        if catalogs is not None and catalog not in catalogs:
+            catalogs = self.list_catalogs(cache=False)
+        if catalogs is not None and catalog not in catalogs:
+            raise ValueError("Catalog not found: {0}. The available catalogs "
+                             "are given by list_catalogs.".format(catalog))
+
+    def _catalog_cache_file(self):
+        if self.catalog_cache_location is not None:
+            return self.catalog_cache_location
+        return os.path.join(get_cache_dir(), 'astroquery', 'irsa_catalogs.json')
+
+    def _load_catalog_cache(self):
+        """
+        The content of the catalog cache file. It is read when first needed,
+        and again only once the file was replaced, possibly by another session.
+        """
+        filename = self._catalog_cache_file()
+        key = (filename, _mtime(filename))
+        if self._catalog_cache is None or key != self._catalog_cache_key:
+            self._catalog_cache = _read_catalog_cache(filename)
+            self._catalog_cache_key = key
+        return self._catalog_cache
+
+    def _cached_entry(self, key):
+        """ The cached value of an entry, or `None` if it is missing or expired """
+        entry = self._load_catalog_cache().get(key)
+        if entry is None or not 0 <= time.time() - entry['time'] < self.CATALOG_CACHE_TTL:
+            return None
+        return entry['data']
+
+    def _update_catalog_cache(self, key, data):
+        """
+        Stores an entry in the catalog cache file, merged with the entries
+        written by the other sessions since the file was read.
+        """
+        filename = self._catalog_cache_file()
+        cache = _read_catalog_cache(filename)
+        cache[key] = dict(time=time.time(), data=data)
+        try:
+            _write_catalog_cache(filename, cache)
+        except (IOError, OSError) as ex:
+            warnings.warn("The IRSA catalog cache could not be written to "
+                          "{0}: {1}".format(filename, ex))
+        self._catalog_cache = cache
+        self._catalog_cache_key = (filename, _mtime(filename))
+
 Irsa = IrsaClass()
 
 
+def _mtime(filename):
+    """ The modification time of a file, or `None` if it does not exist """
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
+
+def _read_catalog_cache(filename):
+    """ The entries of a catalog cache file, empty if it is missing or unreadable """
+    try:
+        with open(filename) as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _write_catalog_cache(filename, cache):
+    """
+    Writes a catalog cache file through a temporary file renamed in place,
+    so that the other sessions never read a partly written file.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # created meanwhile by another session
+            if not os.path.isdir(directory):
+                raise
+    handle, temp_name = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'w') as f:
+            json.dump(cache, f)
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(temp_name, filename)
+    except:
+        os.remove(temp_name)
+        raise
+
+
 def _parse_coordinates(coordinates):
 # borrowed from commons.parse_coordinates as from_name wasn't required in this case
     if isinstance(coordinates, basestring):
@@ -431,6 +874,124 @@ def _pair_to_deg(pair):
     return tuple(pair)
 
 
+def _unwrap_ra(ra, ra_min):
+    """ Right ascensions shifted by whole turns to start at ``ra_min`` """
+    return (np.asarray(ra, dtype=float) - ra_min) % 360. + ra_min
+
+
+def _polygon_to_deg(polygon):
+    """ The right ascensions and declinations of the vertices of a polygon """
+    try:
+        vertices = [[float(value) for value in _parse_coordinates(c).split()]
+                    for c in polygon]
+    except (ValueError, TypeError):
+        vertices = [_pair_to_deg(pair) for pair in polygon]
+    ra = np.array([float(vertex[0]) for vertex in vertices])
+    dec = np.array([float(vertex[1]) for vertex in vertices])
+    return ra, dec
+
+
+def _polygon_bounds(polygon_ra, polygon_dec, samples=32):
+    """
+    The ``(ra_min, ra_max, dec_min, dec_max)`` limits, in degrees, of a
+    polygon with great circle edges, which may reach beyond the vertices in
+    declination. The right ascensions are unwrapped from the first vertex.
+    """
+    vertices = tilecache._unit_vectors(polygon_ra, polygon_dec)
+    fractions = np.linspace(0, 1, samples)
+    points = []
+    for i in range(len(polygon_ra)):
+        start, stop = vertices[:, i - 1], vertices[:, i]
+        edge = (np.outer(start, 1 - fractions) + np.outer(stop, fractions))
+        points.append(edge / np.sqrt((edge ** 2).sum(axis=0)))
+    points = np.hstack(points)
+    dec = np.degrees(np.arcsin(np.clip(points[2], -1, 1)))
+    ra = np.degrees(np.arctan2(points[1], points[0]))
+    ra = (ra - polygon_ra[0] + 180.) % 360. + polygon_ra[0] - 180.
+    margin = 1e-3 * max(dec.max() - dec.min(), ra.max() - ra.min(), 1. / 3600)
+    return (ra.min() - margin, ra.max() + margin,
+            max(dec.min() - margin, -90.), min(dec.max() + margin, 90.))
+
+
+def _plan_tiles(bounds, density, row_limit):
+    """
+    Cuts the ``(ra_min, ra_max, dec_min, dec_max)`` bounds in tiles expected
+    to hold about half of ``row_limit`` sources at the given density (in
+    sources per square degree), or in a single tile if it is not known.
+    """
+    ra_min, ra_max, dec_min, dec_max = bounds
+    if density is None or density <= 0:
+        return [bounds]
+    tile_size = np.sqrt(row_limit / 2. / density)
+    cos_dec = max(np.cos(np.radians((dec_min + dec_max) / 2.)), 1e-3)
+    ndec = int(np.ceil((dec_max - dec_min) / tile_size))
+    nra = int(np.ceil((ra_max - ra_min) * cos_dec / tile_size))
+    ra_edges = np.linspace(ra_min, ra_max, max(nra, 1) + 1)
+    dec_edges = np.linspace(dec_min, dec_max, max(ndec, 1) + 1)
+    return [(ra_edges[i], ra_edges[i + 1], dec_edges[j], dec_edges[j + 1])
+            for j in range(len(dec_edges) - 1) for i in range(len(ra_edges) - 1)]
+
+
+def _split_tile(tile):
+    """ The four quarters of a tile """
+    ra_min, ra_max, dec_min, dec_max = tile
+    ra_mid, dec_mid = (ra_min + ra_max) / 2., (dec_min + dec_max) / 2.
+    return [(ra_min, ra_mid, dec_min, dec_mid), (ra_mid, ra_max, dec_min, dec_mid),
+            (ra_min, ra_mid, dec_mid, dec_max), (ra_mid, ra_max, dec_mid, dec_max)]
+
+
+def _tile_cone(tile):
+    """ The ``(ra, dec, radius)`` of a cone containing a tile, in degrees """
+    ra_min, ra_max, dec_min, dec_max = tile
+    if dec_min <= -90. or dec_max >= 90. or ra_max - ra_min >= 180.:
+        # bounding cones from the pole or of very wide tiles
+        if dec_min + dec_max >= 0:
+            return 0., 90., 90. - dec_min
+        return 0., -90., dec_max + 90.
+    ra = (ra_min + ra_max) / 2.
+    dec = (dec_min + dec_max) / 2.
+    radius = max([tilecache._distance(ra, dec, corner_ra, corner_dec)
+                  for corner_ra in (ra_min, ra_max)
+                  for corner_dec in (dec_min, dec_max)])
+    return ra, dec, radius * 1.001
+
+
+def _upload_table(index, ra, dec):
+    """
+    Formats positions, in decimal degrees, as the IPAC table uploaded to the
+    multi-object search. The ``in_row`` column carries the input row numbers
+    through to the results.
+    """
+    rows = np.char.add(np.char.add(np.char.mod(' %12d', index),
+                                   np.char.mod(' %14.8f', ra)),
+                       np.char.mod(' %14.8f', dec))
+    header = ['|{0:>12s}|{1:>14s}|{2:>14s}|'.format('in_row', 'ra', 'dec'),
+              '|{0:>12s}|{1:>14s}|{2:>14s}|'.format('int', 'double', 'double')]
+    return '\n'.join(header + rows.tolist()) + '\n'
+
+
+def _index_upload_result(table, start):
+    """
+    Replaces the uploaded row numbers of a multi-object search result by an
+    ``INPUT_INDEX`` column. Gator returns the uploaded columns with a suffix
+    (e.g. ``in_row_01``); if they are missing, the running counter of the
+    upload (``cntr_01`` or ``cntr_u``, counted from 1 in each chunk) is used.
+    """
+    names = [name for name in table.colnames
+             if name == 'in_row' or name.startswith('in_row_')]
+    if names:
+        index = np.asarray(table[names[0]], dtype=int)
+        table.remove_columns(names)
+    else:
+        counters = [name for name in ('cntr_01', 'cntr_u') if name in table.colnames]
+        if not counters:
+            raise TableParseError("The uploaded row numbers are missing from "
+                                  "the IRSA result.")
+        index = start + np.asarray(table[counters[0]], dtype=int) - 1
+    table.add_column(Column(name='INPUT_INDEX', data=index), index=0)
+    return table
+
+
 def _format_decimal_coords(ra, dec):
     """
     Print *decimal degree* RA/Dec values in an IPAC-parseable form
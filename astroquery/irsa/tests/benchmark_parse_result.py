@@ -0,0 +1,73 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Compares the time taken by `~astroquery.irsa.core.IrsaClass._parse_result` to
+parse the same random catalog returned as a VOTable (``outfmt=3``) and as an
+IPAC ASCII table (``outfmt=1``). Run with::
+
+    python -m astroquery.irsa.tests.benchmark_parse_result [nrows]
+"""
+from __future__ import print_function
+import sys
+import timeit
+
+import numpy as np
+from astropy.table import Table
+import astropy.io.votable as votable
+
+from ..core import Irsa
+from ...extern import six
+from ...utils import commons
+
+
+class Response(object):
+    def __init__(self, content):
+        self.content = content
+
+
+def make_table(nrows):
+    random = np.random.RandomState(0)
+    ra = random.uniform(0, 360, nrows)
+    dec = random.uniform(-90, 90, nrows)
+    designation = np.char.mod('J%017.8f', ra * 1e5)
+    j_m = random.uniform(5, 17, nrows)
+    scan = random.randint(0, 100, nrows)
+    return Table([ra, dec, designation, j_m, scan],
+                 names=['ra', 'dec', 'designation', 'j_m', 'scan'])
+
+
+def to_votable(table):
+    output = six.BytesIO()
+    votable.from_table(table).to_xml(output)
+    return output.getvalue().decode('utf-8')
+
+
+def to_ipac(table):
+    formats = ['{0:>14.8f}', '{0:>14.8f}', '{0:>18s}', '{0:>8.3f}', '{0:>6d}']
+    types = ['double', 'double', 'char', 'double', 'int']
+    widths = [14, 14, 18, 8, 6]
+    header = []
+    for row in (table.colnames, types, [''] * 5, ['null'] * 5):
+        header.append('|' + '|'.join([value.rjust(width)
+                                      for value, width in zip(row, widths)]) + '|')
+    line_format = ' ' + ' '.join(formats)
+    lines = [line_format.format(*row) for row in
+             zip(table['ra'], table['dec'], table['designation'].astype(str),
+                 table['j_m'], table['scan'])]
+    return '\n'.join(['\\fixlen = T'] + header + lines) + '\n'
+
+
+def main(nrows=100000, repeat=3):
+    commons.suppress_vo_warnings()
+    table = make_table(nrows)
+    xml = Response(to_votable(table))
+    ipac = Response(to_ipac(table))
+    vo_time = min(timeit.repeat(lambda: Irsa._parse_result(xml),
+                                number=1, repeat=repeat))
+    ipac_time = min(timeit.repeat(lambda: Irsa._parse_result(ipac),
+                                  number=1, repeat=repeat))
+    print("{0} rows  VOTable {1:.3f} s  IPAC {2:.3f} s  speedup x{3:.2f}"
+          .format(nrows, vo_time, ipac_time, vo_time / ipac_time))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
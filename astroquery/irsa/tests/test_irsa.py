@@ -1,6 +1,7 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 from __future__ import print_function
 import os
+import warnings
 import requests
 
 from astropy.tests.helper import pytest
@@ -9,6 +10,7 @@ import astropy.coordinates as coord
 import astropy.units as u
 import numpy as np
 
+from ...utils import TileCache, tilecache
 from ...utils.testing_tools import MockResponse
 from ... import irsa
 from ...irsa import ROW_LIMIT
@@ -155,3 +157,252 @@ def test_spatial_invalid(spatial):
     with pytest.raises(ValueError):
         irsa.core.Irsa._parse_spatial(spatial, coordinates='m31')
 
+
+
+def test_query_region_tile_cache(request):
+    calls = []
+
+    def get_counting(url, params=None, timeout=10, **kwargs):
+        calls.append(params)
+        return get_mockreturn(url, params=params, timeout=timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_counting)
+    irsa_cache = irsa.core.IrsaClass()
+    irsa_cache.tile_cache = TileCache(tile_size=0.25)
+    center = coord.ICRS(ra=10.6847, dec=41.269, unit=(u.deg, u.deg))
+    result = irsa_cache.query_region(center, catalog='fp_psc', radius=1 * u.arcmin)
+    assert len(result) == 1
+    assert all(params['spatial'] == 'Cone' for params in calls)
+    ncalls = len(calls)
+    result = irsa_cache.query_region(center, catalog='fp_psc', spatial='Box',
+                                     width=1 * u.arcmin)
+    assert len(result) == 1
+    assert len(calls) == ncalls
+
+
+def test_query_region_tile_cache_truncated(request):
+    calls = []
+
+    def get_counting(url, params=None, timeout=10, **kwargs):
+        calls.append(params)
+        return get_mockreturn(url, params=params, timeout=timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_counting)
+    irsa_cache = irsa.core.IrsaClass()
+    irsa_cache.ROW_LIMIT = 1
+    irsa_cache.tile_cache = TileCache(tile_size=0.25)
+    center = coord.ICRS(ra=10.6847, dec=41.269, unit=(u.deg, u.deg))
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always')
+        irsa_cache.query_region(center, catalog='fp_psc', radius=1 * u.arcmin)
+    assert any('ROW_LIMIT' in str(warning.message) for warning in w)
+    assert len(irsa_cache.tile_cache) == 0
+    # the truncated tiles are not served from the cache
+    ncalls = len(calls)
+    with warnings.catch_warnings(record=True):
+        warnings.simplefilter('always')
+        irsa_cache.query_region(center, catalog='fp_psc', radius=1 * u.arcmin)
+    assert len(calls) == 2 * ncalls
+
+
+def post_upload_mockreturn(url, data=None, timeout=10, files=None, **kwargs):
+    # a multi-object search result with one source per uploaded position,
+    # carrying the uploaded row numbers as Gator does
+    upload = files['filename'][1]
+    rows = [line.split() for line in upload.splitlines()[2:]]
+    content = open(data_path(DATA_FILES['Cone']), 'r').read()
+    start = content.index('<TR>')
+    end = content.index('</TR>') + len('</TR>')
+    source = content[start:end]
+    content = content.replace('<TABLE>', '<TABLE>\n<FIELD name="in_row_01" datatype="int"/>')
+    content = content[:start] + ''.join([source.replace('<TR>', '<TR><TD>{0}</TD>'.format(row[0]))
+                                         for row in rows]) + content[end:]
+    return MockResponse(content, **kwargs)
+
+
+def test_query_region_list(request):
+    uploads = []
+
+    def post_counting(url, data=None, timeout=10, files=None, **kwargs):
+        uploads.append((data, files))
+        return post_upload_mockreturn(url, data=data, timeout=timeout, files=files, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_counting)
+    targets = Table([[10., 20., 30.], [40., -10., 0.]], names=['ra', 'dec'])
+    result = irsa.core.Irsa.query_region_list(targets, catalog='fp_psc',
+                                              radius=5 * u.arcsec, chunk_size=2)
+    assert len(uploads) == 2
+    assert all(data['spatial'] == 'Upload' for data, files in uploads)
+    assert uploads[0][0]['uradius'] == 5
+    assert sorted(result['INPUT_INDEX']) == [0, 1, 2]
+    assert 'in_row_01' not in result.colnames
+    upload = sorted(files['filename'][1] for data, files in uploads)[0]
+    assert upload.splitlines()[2].split() == ['0', '10.00000000', '40.00000000']
+
+
+def test_query_region_list_empty(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', None)
+    targets = Table([np.zeros(0), np.zeros(0)], names=['ra', 'dec'])
+    with pytest.raises(ValueError):
+        irsa.core.Irsa.query_region_list(targets, catalog='fp_psc')
+
+
+IPAC_RESULT = """\\fixlen = T
+|        ra|       dec|      designation|   j_m|
+|    double|    double|             char|double|
+|       deg|       deg|                 |   mag|
+|      null|      null|             null|  null|
+  10.684737  41.269035  00424433+4116085  9.453
+"""
+
+
+def test_query_region_ipac(request):
+    sent = []
+
+    def get_ipac(url, params=None, timeout=10, **kwargs):
+        sent.append(params)
+        return MockResponse(IPAC_RESULT, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_ipac)
+    irsa_ipac = irsa.core.IrsaClass()
+    irsa_ipac.OUTFMT = 1
+    result = irsa_ipac.query_region("m31", catalog='fp_psc')
+    assert sent[0]['outfmt'] == 1
+    assert result.colnames == ['ra', 'dec', 'designation', 'j_m']
+    assert result['designation'][0] == b'00424433+4116085'
+    np.testing.assert_allclose(result['j_m'], [9.453])
+
+
+# a grid of sources every 0.01 degree
+GRID_RA, GRID_DEC = [values.ravel() for values in
+                     np.meshgrid(np.arange(10., 10.305, 0.01),
+                                 np.arange(20., 20.305, 0.01))]
+
+
+def get_grid_mockreturn(url, params=None, timeout=10, **kwargs):
+    # a cone search on the grid, returned as an IPAC table
+    ra, dec = [float(value) for value in params['objstr'].split()]
+    radius = (params['radius'] * u.Unit(params['radunits'])).to(u.deg).value
+    mask = tilecache.region_mask(GRID_RA, GRID_DEC, ra, dec, radius=radius)
+    rows = ['{0:6d} {1:10.5f} {2:10.5f}'.format(i, GRID_RA[i], GRID_DEC[i])
+            for i in np.where(mask)[0][:params['outrows']]]
+    content = '\n'.join(['|    id|        ra|       dec|',
+                         '|   int|    double|    double|'] + rows) + '\n'
+    return MockResponse(content, **kwargs)
+
+
+@pytest.mark.parametrize(('density'), [None, 5000.])
+def test_query_region_tiled_box(request, density):
+    calls = []
+
+    def get_counting(url, params=None, timeout=10, **kwargs):
+        calls.append(params)
+        return get_grid_mockreturn(url, params=params, timeout=timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_counting)
+    irsa_tiled = irsa.core.IrsaClass()
+    irsa_tiled.ROW_LIMIT = 50
+    center = coord.ICRS(ra=10.15, dec=20.15, unit=(u.deg, u.deg))
+    result = irsa_tiled.query_region_tiled(center, catalog='fp_psc', spatial='Box',
+                                           width=0.2 * u.deg, density=density)
+    expected = np.where(tilecache.region_mask(GRID_RA, GRID_DEC, 10.15, 20.15,
+                                              width=0.2))[0]
+    # every source once, although the tiles overlap
+    assert sorted(result['id']) == sorted(expected)
+    assert len(calls) > 1
+
+
+def test_query_region_tiled_polygon(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_grid_mockreturn)
+    irsa_tiled = irsa.core.IrsaClass()
+    irsa_tiled.ROW_LIMIT = 100
+    polygon = [(10.02, 20.02), (10.28, 20.05), (10.1, 20.25)]
+    tables = list(irsa_tiled.iter_query_region_tiled(catalog='fp_psc', spatial='Polygon',
+                                                     polygon=polygon))
+    assert len(tables) > 1
+    ids = np.hstack([table['id'] for table in tables])
+    expected = np.where(tilecache.polygon_mask(GRID_RA, GRID_DEC, [10.02, 10.28, 10.1],
+                                               [20.02, 20.05, 20.25]))[0]
+    assert sorted(ids) == sorted(expected)
+
+
+CATALOG_LIST = """<?xml version="1.0"?>
+<catalogs>
+<catalog><catname>fp_psc</catname><desc>2MASS All-Sky Point Source Catalog (PSC)</desc></catalog>
+<catalog><catname>fp_xsc</catname><desc>2MASS All-Sky Extended Source Catalog (XSC)</desc></catalog>
+</catalogs>
+"""
+
+CATALOG_COLUMNS = """|  name|          description| units|
+|  char|                 char|  char|
+     ra       right ascension    deg
+    dec           declination    deg
+    j_m  J selected magnitude    mag
+"""
+
+
+def test_list_catalogs_cache(request, tmpdir):
+    sent = []
+    catalog_list = [CATALOG_LIST]
+
+    def get_catalogs(url, params=None, timeout=10, **kwargs):
+        sent.append(url)
+        if 'catalog' in params:
+            return MockResponse(CATALOG_COLUMNS, **kwargs)
+        return MockResponse(catalog_list[0], **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_catalogs)
+    cache_file = str(tmpdir.join('irsa_catalogs.json'))
+    irsa_a = irsa.core.IrsaClass()
+    irsa_a.catalog_cache_location = cache_file
+    # nothing is fetched to validate a catalog before the list is cached
+    assert irsa_a._args_to_payload('nonexistent')['catalog'] == 'nonexistent'
+    assert sent == []
+    catalogs = irsa_a.list_catalogs()
+    assert sorted(catalogs) == ['fp_psc', 'fp_xsc']
+    assert irsa_a.list_catalogs() == catalogs
+    assert len(sent) == 1
+    # another session shares the cache file
+    irsa_b = irsa.core.IrsaClass()
+    irsa_b.catalog_cache_location = cache_file
+    assert irsa_b.list_catalogs() == catalogs
+    assert irsa_b._args_to_payload('fp_xsc')['catalog'] == 'fp_xsc'
+    assert len(sent) == 1
+    # a name missing from the cached list fetches it again before failing
+    with pytest.raises(ValueError):
+        irsa_b._args_to_payload('nonexistent')
+    assert len(sent) == 2
+    # a catalog added since the list was cached is accepted
+    catalog_list[0] = CATALOG_LIST.replace(
+        '</catalogs>', '<catalog><catname>new_cat</catname><desc>New</desc></catalog>\n</catalogs>')
+    assert irsa_b._args_to_payload('new_cat')['catalog'] == 'new_cat'
+    assert len(sent) == 3
+    assert 'new_cat' in irsa_a.list_catalogs()
+    assert len(sent) == 3
+    columns = irsa_b.list_columns('fp_psc')
+    assert list(columns) == ['ra', 'dec', 'j_m']
+    assert columns['j_m'] == 'J selected magnitude'
+    assert irsa_a.list_columns('fp_psc') == columns
+    assert len(sent) == 4
+    # expired entries are fetched again
+    irsa_a.CATALOG_CACHE_TTL = 0
+    irsa_a.list_catalogs()
+    assert len(sent) == 5
+    irsa_a._args_to_payload('nonexistent')
+
+
+def test_list_columns_not_found(request, tmpdir):
+    def get_bytes(url, params=None, timeout=10, **kwargs):
+        response = requests.Response()
+        response._content = b'ERROR: The catalog is not on the list'
+        response.encoding = 'ascii'
+        return response
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_bytes)
+    irsa_c = irsa.core.IrsaClass()
+    irsa_c.catalog_cache_location = str(tmpdir.join('irsa_catalogs.json'))
+    with pytest.raises(Exception) as exinfo:
+        irsa_c.list_columns('nonexistent')
+    assert 'Catalog not found' in str(exinfo.value)
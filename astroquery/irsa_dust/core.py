@@ -1,10 +1,14 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
-from astropy.table import Table, Column
+import numpy as np
+import requests
+from astropy.table import Table, Column, MaskedColumn
 import astropy.units as u
 import astropy.coordinates as coord
 from . import utils
 from . import IRSA_DUST_SERVER, IRSA_DUST_TIMEOUT
-from ..utils import commons
+from ..utils import commons, parallel
+from ..utils.commons import ObjectError
+from ..exceptions import TimeoutError
 from ..query import BaseQuery
 import io
 
@@ -35,6 +39,15 @@ SFD = "SFD"
 DATA_IMAGE = "./data/image"
 DATA_TABLE = "./data/table"
 
+# the statistics kept in the batch tables: section code, column prefix,
+# <desc> of the <result> node, suffix of the statistics nodes and unit
+BATCH_STATISTICS = [('r', 'ext SandF', EXT_DESC, SANDF, u.mag),
+                    ('r', 'ext SFD', EXT_DESC, SFD, u.mag),
+                    ('e', 'em', EM_DESC, '', u.MJy / u.sr),
+                    ('t', 'temp', TEMP_DESC, '', u.K)]
+BATCH_STATISTICS_NODES = [(REF_PIXEL_VALUE, 'ref'), (MEAN_VALUE, 'mean'),
+                          (STD, 'std'), (MAX_VALUE, 'max'), (MIN_VALUE, 'min')]
+
 
 class IrsaDustClass(BaseQuery):
 
@@ -279,6 +292,103 @@ class IrsaDustClass(BaseQuery):
                    'ebv, temperature, location or 100um.')
             raise ValueError(msg)
 
+    def get_query_table_batch(self, coordinates, radius=None, section=None,
+                              max_workers=None, timeout=TIMEOUT):
+        """
+        Query the dust values at many locations and return them in a single
+        table, with one row per location in the order of the input.
+
+        The requests are sent concurrently through the session of this
+        instance, and through the query cache if ``cache_location`` is set.
+        The values are read directly from the responses into the columns,
+        which only hold the numbers of `get_query_table`: the descriptions,
+        the image and table URLs and the reference coordinates are left out.
+
+        Parameters
+        ----------
+        coordinates : list, `astropy.coordinates` or `astropy.table.Table`
+            A list of object names, coordinate strings (see `get_query_table`)
+            or `astropy.coordinates` objects. An `astropy.coordinates` object
+            holding an array of positions, or a table with ``ra`` and ``dec``
+            columns in degrees, may also be given.
+        radius : str/astropy.units.Quantity, optional
+            The size of the region to include in the dust query, in radian, degree
+            or hour as per format specified by `astropy.coordinates.Angle or `astropy
+            .units.Quantity`. Defaults to 5 degrees.
+        section : str, optional
+            When missing, all the sections are returned. Otherwise only the
+            columns of the specified section (`ebv`, `100um`, `temperature`,
+            `location`) are returned. Defaults to `None`
+        max_workers : int, optional
+            Maximum number of simultaneous requests. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        timeout : int, optional
+            Time limit for establishing successful connection with remote server.
+            Defaults to `astroquery.irsa_dust.IrsaDust.TIMEOUT`
+
+        Returns
+        -------
+        table : `astropy.table.Table`
+            One row per location. The rows of the locations rejected by the
+            service, or whose request failed or timed out, are masked, and the
+            ``errors`` attribute of the table is a list of
+            ``ObjectError(index, name, msg)`` for them.
+        """
+        if section is None:
+            codes = ['l', 'r', 'e', 't']
+        elif section in ["location", "loc", "l"]:
+            codes = ['l']
+        elif section in self.image_type_to_section:
+            codes = [self.image_type_to_section[section]]
+        else:
+            msg = ('section must be one of the following:\n'
+                   'ebv, temperature, location or 100um.')
+            raise ValueError(msg)
+        location = 'l' in codes
+        statistics = [stats for stats in BATCH_STATISTICS if stats[0] in codes]
+        names, units = [], []
+        if location:
+            names.extend(["RA", "Dec", REG_SIZE])
+            units.extend([u.deg, u.deg, u.deg])
+        for code, prefix, desc, suffix, unit in statistics:
+            for node_name, label in BATCH_STATISTICS_NODES:
+                names.append(prefix + " " + label)
+                units.append(unit)
+
+        locations = _locations(coordinates)
+        payload = self._args_to_payload(None, radius=radius)
+        data = np.zeros((len(locations), len(names)))
+        mask = np.zeros(len(locations), dtype=bool)
+
+        def query(index):
+            try:
+                response = self.request('POST', self.DUST_SERVICE_URL,
+                                        data=dict(payload, locstr=locations[index]),
+                                        timeout=timeout)
+                data[index] = _batch_values(utils.xml(response.content),
+                                            location, statistics)
+            except (requests.exceptions.RequestException, TimeoutError) as ex:
+                mask[index] = True
+                return ObjectError(index, locations[index],
+                                   "Query failed: {0}".format(ex))
+            except Exception as ex:
+                mask[index] = True
+                return ObjectError(index, locations[index], str(ex).strip())
+            return None
+
+        errors = parallel.parallel_map(query, range(len(locations)),
+                                       max_workers=max_workers)
+        if mask.any():
+            table = Table([MaskedColumn(name=name, data=data[:, i], mask=mask,
+                                        unit=unit)
+                           for i, (name, unit) in enumerate(zip(names, units))],
+                          masked=True)
+        else:
+            table = Table([Column(name=name, data=data[:, i], unit=unit)
+                           for i, (name, unit) in enumerate(zip(names, units))])
+        table.errors = [error for error in errors if error is not None]
+        return table
+
     def _args_to_payload(self, coordinate, radius=None):
         """
         Accepts the query parameters and returns a dictionary
@@ -1075,3 +1185,39 @@ class TemperatureSection(BaseResultSection):
         string = "[TemperatureSection: " + \
             base_string + self._stats.__str__() + "]"
         return string
+
+
+def _locations(coordinates):
+    """
+    The location strings sent to the dust service for a list of locations,
+    an `astropy.coordinates` object or a table of positions.
+    """
+    if isinstance(coordinates, (Table, coord.SphericalCoordinatesBase)):
+        ra, dec = commons.coord_array_to_radec(coordinates)
+        return ['{0:.6f} {1:.6f} equ J2000'.format(ra_value, dec_value)
+                for ra_value, dec_value in zip(ra, dec)]
+    locations = []
+    for location in coordinates:
+        if isinstance(location, coord.SphericalCoordinatesBase):
+            location = _locations(location)[0]
+        locations.append(location)
+    return locations
+
+
+def _batch_values(xml_tree, location, statistics):
+    """
+    Reads the numbers of a dust query response, in the order of the columns
+    of `IrsaDustClass.get_query_table_batch`.
+    """
+    values = []
+    if location:
+        input_node = xml_tree.find(INPUT)
+        coords = utils.parse_coords(input_node.find(OBJ_NAME).text)
+        values.extend([coords[0], coords[1],
+                       utils.parse_number(input_node.find(REG_SIZE).text)])
+    for code, prefix, desc, suffix, unit in statistics:
+        stats_node = utils.find_result_node(desc, xml_tree).find(STATISTICS)
+        for node_name, label in BATCH_STATISTICS_NODES:
+            values.append(utils.parse_number(stats_node.find(node_name + suffix).text))
+    return values
+
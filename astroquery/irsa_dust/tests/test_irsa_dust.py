@@ -1,7 +1,10 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 import os
 
+import requests
+import numpy as np
 import astropy.units as u
+import astropy.coordinates as coord
 from astropy.tests.helper import pytest  # import this since the user may not have pytest installed
 
 from ... import irsa_dust
@@ -193,6 +196,60 @@ class TestDust(DustTestCase):
             "m31", section=section)
         assert len(qtable.colnames) == expected_length
 
+    @pytest.mark.parametrize(('section', 'expected_length'),
+                             [(None, 23),
+                              ('100um', 5),
+                              ('location', 3),
+                              ('ebv', 10),
+                              ('temperature', 5)
+                              ])
+    def test_query_table_batch(self, monkeypatch, section, expected_length):
+        sent = []
+
+        def session_request_mockreturn(session, method, url, data=None,
+                                       timeout=None, **kwargs):
+            sent.append(data['locstr'])
+            response = requests.Response()
+            filename = ERR_XML if data['locstr'] == 'nowhere' else M31_XML
+            response._content = open(self.data(filename), 'rb').read()
+            response.url = url
+            return response
+        monkeypatch.setattr(requests.Session, 'request',
+                            session_request_mockreturn)
+        locations = ['m31', 'nowhere',
+                     coord.ICRS(ra=10.68479, dec=41.26906, unit=(u.deg, u.deg))]
+        qtable = irsa_dust.core.IrsaDust.get_query_table_batch(
+            locations, section=section, max_workers=2)
+        assert sorted(sent) == sorted(['m31', 'nowhere', '10.684790 41.269060 equ J2000'])
+        assert len(qtable) == 3
+        assert len(qtable.colnames) == expected_length
+        assert list(qtable.mask[qtable.colnames[0]]) == [False, True, False]
+        assert [error.index for error in qtable.errors] == [1]
+        assert isinstance(qtable.errors[0], commons.ObjectError)
+        assert 'Invalid object name' in qtable.errors[0].msg
+        if section is None:
+            np.testing.assert_allclose(qtable['ext SFD ref'][[0, 2]], 0.6943)
+            np.testing.assert_allclose(qtable['temp min'][[0, 2]], 17.6152)
+            np.testing.assert_allclose(qtable['RA'][0], 10.684790)
+
+    def test_query_table_batch_request_error(self, monkeypatch):
+        def session_request_mockreturn(session, method, url, data=None,
+                                       timeout=None, **kwargs):
+            if data['locstr'] == 'm81':
+                raise requests.exceptions.ConnectionError("connection refused")
+            response = requests.Response()
+            response._content = open(self.data(M31_XML), 'rb').read()
+            response.url = url
+            return response
+        monkeypatch.setattr(requests.Session, 'request',
+                            session_request_mockreturn)
+        qtable = irsa_dust.core.IrsaDust.get_query_table_batch(
+            ['m31', 'm81'], section='ebv', max_workers=2)
+        assert len(qtable) == 2
+        assert list(qtable.mask[qtable.colnames[0]]) == [False, True]
+        assert [error.index for error in qtable.errors] == [1]
+        assert 'connection refused' in qtable.errors[0].msg
+
     def test_get_extinction_table_async_class(self, patch_request):
         readable_obj = irsa_dust.core.IrsaDust.get_extinction_table_async(
             "m31")
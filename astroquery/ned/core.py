@@ -7,14 +7,20 @@ from collections import namedtuple
 from xml.dom.minidom import parseString
 from datetime import datetime
 
+import numpy as np
+
 import astropy.units as u
 import astropy.coordinates as coord
 import astropy.io.votable as votable
 from astropy import __version__ as ASTROPY_VERSION
 from astropy.io import fits
+from astropy.table import Column, vstack
+# maintain compat with PY<2.7
+from astropy.utils import OrderedDict
 
 from ..query import BaseQuery
-from ..utils import commons
+from ..utils import commons, parallel
+from ..utils.commons import ObjectError
 from . import (HUBBLE_CONSTANT,
                CORRECT_REDSHIFT,
                OUTPUT_COORDINATE_FRAME,
@@ -41,6 +47,11 @@ class NedClass(BaseQuery):
                       2: Options('Data as Published', 'pub'),
                       3: Options('Homogenized Units (mJy)', 'mjy')}
 
+    def __init__(self):
+        super(NedClass, self).__init__()
+        # parsed image and spectra URL lists, by (item, object_name)
+        self._url_lists = {}
+
     def query_object(self, object_name, get_query_payload=False, verbose=False):
         """
         Queries objects by name from the NED Service and returns the Main Source Table.
@@ -192,6 +203,139 @@ class NedClass(BaseQuery):
         response = commons.send_request(Ned.OBJ_SEARCH_URL, request_payload, Ned.TIMEOUT, request_type='GET')
         return response
 
+    def query_objects(self, object_names, max_workers=None, verbose=False):
+        """
+        Queries many objects by name and returns their Main Source Table rows
+        in a single table. NED answers one object per request, so the
+        requests are sent concurrently and the responses parsed as they
+        arrive.
+
+        Parameters
+        ----------
+        object_names : sequence of str
+            names of the identifiers to query.
+        max_workers : int, optional
+            Maximum number of simultaneous requests. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        verbose : bool, optional.
+            When set to `True` displays warnings if the returned VOTables do not
+            conform to the standard. Defaults to `False`.
+
+        Returns
+        -------
+        result : `astropy.table.Table`
+            The rows found, in the order of ``object_names``, or `None` if no
+            object was found. The ``INPUT_INDEX`` column gives the position of
+            the name of each row in ``object_names``. The ``errors`` attribute
+            is a list of ``ObjectError(index, name, msg)`` for the names
+            rejected by NED or whose request failed.
+        """
+        object_names = list(object_names)
+        payloads = []
+        for object_name in object_names:
+            request_payload = self._request_payload_init()
+            self._set_input_options(request_payload)
+            self._set_output_options(request_payload)
+            request_payload['objname'] = object_name
+            payloads.append(request_payload)
+        return self._query_many(self.OBJ_SEARCH_URL, payloads, object_names,
+                                max_workers, verbose)
+
+    def query_regions(self, coordinates, radius=1 * u.arcmin, equinox='J2000.0',
+                      max_workers=None, verbose=False):
+        """
+        Searches around many positions and returns all the objects found in a
+        single table. One request is sent per position, concurrently.
+
+        Parameters
+        ----------
+        coordinates : `astropy.table.Table` or `astropy.coordinates` object
+            The positions around which to search: a table with ``ra`` and
+            ``dec`` columns (in degrees unless they have units) or a
+            coordinates object holding an array of positions.
+        radius : str or `astropy.units.Quantity` object, optional
+            The string must be parsable by `astropy.coordinates.Angle`. The appropriate
+            `Quantity` object from `astropy.units` may also be used. Defaults to 1 arcmin.
+        equinox : str, optional
+            The equinox may be either J2000.0 or B1950.0. Defaults to J2000.0
+        max_workers : int, optional
+            Maximum number of simultaneous requests. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        verbose : bool, optional.
+            When set to `True` displays warnings if the returned VOTables do not
+            conform to the standard. Defaults to `False`.
+
+        Returns
+        -------
+        result : `astropy.table.Table`
+            The objects found, or `None` if there is none. The ``INPUT_INDEX``
+            column gives the index of the position each row was found around;
+            an object near several positions appears once for each. The
+            ``errors`` attribute is a list of ``ObjectError(index, name, msg)``
+            for the searches rejected by NED or whose request failed, with
+            the position as name.
+        """
+        ra, dec = commons.coord_array_to_radec(coordinates)
+        radius = _parse_radius(radius)
+        payloads = []
+        for ra_value, dec_value in zip(ra, dec):
+            request_payload = self._request_payload_init()
+            self._set_input_options(request_payload)
+            self._set_output_options(request_payload)
+            request_payload['in_csys'] = 'Equatorial'
+            request_payload['lon'] = ra_value
+            request_payload['lat'] = dec_value
+            request_payload['search_type'] = 'Near Position Search'
+            request_payload['in_equinox'] = equinox
+            request_payload['radius'] = radius
+            payloads.append(request_payload)
+        names = ['{0:.6f} {1:+.6f}'.format(ra_value, dec_value)
+                 for ra_value, dec_value in zip(ra, dec)]
+        return self._query_many(self.OBJ_SEARCH_URL, payloads, names,
+                                max_workers, verbose)
+
+    def _query_many(self, url, payloads, names, max_workers, verbose):
+        """
+        Sends the requests concurrently and stacks the parsed tables,
+        recording per input the errors reported by NED and the requests that
+        failed or timed out. If ``cache_location``
+        is set, the requests go through the query cache, so the responses
+        already cached are not requested again.
+        """
+        if not verbose:
+            # done once here, the warning filters are shared by the threads
+            commons.suppress_vo_warnings()
+
+        def query(index):
+            try:
+                if self.cache_location is None:
+                    response = commons.send_request(url, payloads[index], self.TIMEOUT,
+                                                    request_type='GET')
+                else:
+                    response = self.request('GET', url, params=payloads[index],
+                                            timeout=self.TIMEOUT)
+            except Exception as ex:
+                # send_request turns the requests errors into a TimeoutError
+                # or a plain Exception, self.request lets them through
+                return None, ObjectError(index, names[index],
+                                         "Query failed: {0}".format(str(ex).strip()))
+            try:
+                table = self._parse_result(response, verbose=True)
+            except (RemoteServiceError, TableParseError) as ex:
+                return None, ObjectError(index, names[index], str(ex))
+            table.add_column(Column(name='INPUT_INDEX',
+                                    data=np.repeat(index, len(table))))
+            return table, None
+
+        results = parallel.parallel_map(query, range(len(payloads)),
+                                        max_workers=max_workers)
+        tables = [table for table, error in results if table is not None]
+        if len(tables) == 0:
+            return None
+        result = tables[0] if len(tables) == 1 else vstack(tables)
+        result.errors = [error for table, error in results if error is not None]
+        return result
+
     def query_region_iau(self, iau_name, frame='Equatorial', equinox='B1950.0',
                          get_query_payload=False, verbose=False):
         """
@@ -456,6 +600,102 @@ class NedClass(BaseQuery):
         url_list = [base_url + img_url for img_url in matched_urls]
         return url_list
 
+    def get_image_lists(self, object_names, item='image', max_workers=None,
+                        refresh=False):
+        """
+        Returns the URLs of the FITS images or spectra of many objects. The
+        HTML listings are fetched concurrently, and the URLs extracted from
+        them are kept by this instance, so that the listing of an object is
+        only fetched once.
+
+        Parameters
+        ----------
+        object_names : sequence of str
+            names of the identifiers to query.
+        item : str, optional
+            Can be either 'image' or 'spectra'. Defaults to 'image'.
+        max_workers : int, optional
+            Maximum number of simultaneous requests. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        refresh : bool, optional
+            Fetch the listings again even if they are known already.
+
+        Returns
+        -------
+        url_lists : `~astropy.utils.OrderedDict`
+            Maps each object name to its list of URLs.
+        """
+        object_names = list(object_names)
+        missing = [object_name for object_name in OrderedDict.fromkeys(object_names)
+                   if refresh or (item, object_name) not in self._url_lists]
+
+        def fetch(object_name):
+            return self.get_image_list(object_name, item=item)
+
+        url_lists = parallel.parallel_map(fetch, missing, max_workers=max_workers)
+        for object_name, url_list in zip(missing, url_lists):
+            self._url_lists[(item, object_name)] = url_list
+        return OrderedDict([(object_name, self._url_lists[(item, object_name)])
+                            for object_name in object_names])
+
+    def get_images_batch(self, object_names, max_workers=None):
+        """
+        Downloads the FITS images of many objects. See `get_products_batch`.
+        """
+        return self.get_products_batch(object_names, item='image',
+                                       max_workers=max_workers)
+
+    def get_spectra_batch(self, object_names, max_workers=None):
+        """
+        Downloads the FITS spectra of many objects. See `get_products_batch`.
+        """
+        return self.get_products_batch(object_names, item='spectra',
+                                       max_workers=max_workers)
+
+    def get_products_batch(self, object_names, item='image', max_workers=None):
+        """
+        Downloads the FITS images or spectra of many objects. The URL lists
+        are obtained with `get_image_lists`, then every distinct file is
+        downloaded once, concurrently, into the astropy download cache. The
+        files are only read and parsed when requested from the returned
+        handles.
+
+        Parameters
+        ----------
+        object_names : sequence of str
+            names of the identifiers to query.
+        item : str, optional
+            Can be either 'image' or 'spectra'. Defaults to 'image'.
+        max_workers : int, optional
+            Maximum number of simultaneous requests. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+
+        Returns
+        -------
+        products : `~astropy.utils.OrderedDict`
+            Maps each object name to a list of
+            `~astroquery.utils.commons.FileContainer` objects, whose
+            ``get_fits`` method returns the `astropy.io.fits.HDUList` of the
+            cached file. Objects sharing a file share the same container.
+        """
+        url_lists = self.get_image_lists(object_names, item=item,
+                                         max_workers=max_workers)
+        unique_urls = list(OrderedDict.fromkeys([url for url_list in url_lists.values()
+                                                 for url in url_list]))
+
+        def download(url):
+            # only fills the cache, the content is read again on demand
+            with commons.get_readable_fileobj(url, encoding='binary', cache=True,
+                                              remote_timeout=self.TIMEOUT):
+                pass
+
+        parallel.parallel_map(download, unique_urls, max_workers=max_workers)
+        containers = dict([(url, commons.FileContainer(url, encoding='binary',
+                                                       remote_timeout=self.TIMEOUT))
+                           for url in unique_urls])
+        return OrderedDict([(object_name, [containers[url] for url in url_list])
+                            for object_name, url_list in url_lists.items()])
+
     def get_table(self, object_name, table='photometry', get_query_payload=False,
                   verbose=False, **kwargs):
         """
@@ -556,6 +796,52 @@ class NedClass(BaseQuery):
         response = commons.send_request(Ned.DATA_SEARCH_URL, request_payload, Ned.TIMEOUT, request_type='GET')
         return response
 
+    def get_tables(self, object_names, table='photometry', max_workers=None,
+                   verbose=False, **kwargs):
+        """
+        Fetches the same data table for many objects and returns them stacked
+        in a single `astropy.table.Table`. The requests are sent concurrently
+        and each response is parsed by the thread that fetched it.
+
+        If ``cache_location`` is set, the responses are stored there and the
+        tables already cached are read back instead of being requested again.
+
+        Parameters
+        ----------
+        object_names : sequence of str
+            names of the identifiers to query.
+        table : str, optional
+            Must be one of ['photometry'|'positions'|'diameters'|'redshifts'|'references'|'object_notes'].
+            Defaults to 'photometry'.
+        max_workers : int, optional
+            Maximum number of simultaneous requests. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        verbose : bool, optional.
+            When set to `True` displays warnings if the returned VOTables do not
+            conform to the standard. Defaults to `False`.
+        **kwargs
+            The options of `get_table` for the given ``table``.
+
+        Returns
+        -------
+        result : `astropy.table.Table`
+            The stacked tables, or `None` if no table was found. The
+            ``OBJECT_NAME`` and ``INPUT_INDEX`` columns give the name and its
+            position in ``object_names`` for each row. The ``errors``
+            attribute is a list of ``ObjectError(index, name, msg)`` for the
+            objects without a table or whose request failed.
+        """
+        object_names = list(object_names)
+        payloads = [self.get_table_async(object_name, table=table,
+                                         get_query_payload=True, **kwargs)
+                    for object_name in object_names]
+        result = self._query_many(self.DATA_SEARCH_URL, payloads, object_names,
+                                  max_workers, verbose)
+        if result is not None:
+            names = np.array(object_names)[np.asarray(result['INPUT_INDEX'])]
+            result.add_column(Column(name='OBJECT_NAME', data=names), index=0)
+        return result
+
     def _request_payload_init(self):
         """
         Initializes common cgi-parameters for all queries.
@@ -616,8 +902,11 @@ class NedClass(BaseQuery):
         if not verbose:
             commons.suppress_vo_warnings()
         try:
+            content = response.content
+            if not isinstance(content, bytes):
+                content = content.encode('utf-8')
             tf = tempfile.NamedTemporaryFile()
-            tf.write(response.content.encode('utf-8'))
+            tf.write(content)
             tf.flush()
             first_table = votable.parse(tf.name, pedantic=False).get_first_table()
             # For astropy version < 0.3 returns tables that have field ids as col names
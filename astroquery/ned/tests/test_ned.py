@@ -8,6 +8,7 @@ import requests
 from numpy import testing as npt
 from astropy.tests.helper import pytest
 from astropy.table import Table
+from astropy.io import fits
 import astropy.coordinates as coord
 import astropy.units as u
 from ...exceptions import RemoteServiceError
@@ -270,3 +271,118 @@ def test_parse_result(capsys):
         assert exinfo.value.message == "The remote service returned the following error message.\nERROR:  No note found."
     else:
         assert exinfo.value.args == ("The remote service returned the following error message.\nERROR:  No note found.",)
+
+
+def test_query_objects(request):
+    def get_mockreturn_errors(url, params=None, timeout=10, **kwargs):
+        if params.get('objname') == 'bad':
+            content = open(data_path(DATA_FILES['error']), 'r').read()
+            return MockResponse(content, **kwargs)
+        return get_mockreturn(url, params=params, timeout=timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_mockreturn_errors)
+    result = ned.core.Ned.query_objects(['m1', 'bad', 'm31'], max_workers=2)
+    single = ned.core.Ned.query_object('m1')
+    assert isinstance(result, Table)
+    assert len(result) == 2 * len(single)
+    assert list(result['INPUT_INDEX']) == [0] * len(single) + [2] * len(single)
+    assert len(result.errors) == 1
+    assert isinstance(result.errors[0], commons.ObjectError)
+    assert result.errors[0].index == 1
+    assert result.errors[0].name == 'bad'
+    assert 'No note found' in result.errors[0].msg
+
+
+def test_query_objects_request_errors(request):
+    def get_mockreturn_failing(url, params=None, timeout=10, **kwargs):
+        if params.get('objname') == 'down':
+            raise requests.exceptions.ConnectionError("connection refused")
+        if params.get('objname') == 'slow':
+            raise requests.exceptions.Timeout("read timed out")
+        return get_mockreturn(url, params=params, timeout=timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_mockreturn_failing)
+    result = ned.core.Ned.query_objects(['down', 'm1', 'slow'], max_workers=2)
+    single = ned.core.Ned.query_object('m1')
+    assert len(result) == len(single)
+    assert list(result['INPUT_INDEX']) == [1] * len(single)
+    assert [error.name for error in result.errors] == ['down', 'slow']
+    assert 'Query failed' in result.errors[0].msg
+    assert 'timed out' in result.errors[1].msg
+
+
+def test_query_regions(request):
+    sent = []
+
+    def get_mockreturn_params(url, params=None, timeout=10, **kwargs):
+        sent.append(params)
+        return get_mockreturn(url, params=params, timeout=timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_mockreturn_params)
+    targets = Table([[10., 200.], [20., -30.]], names=['ra', 'dec'])
+    result = ned.core.Ned.query_regions(targets, radius=2 * u.arcmin)
+    assert isinstance(result, Table)
+    assert sorted(set(result['INPUT_INDEX'])) == [0, 1]
+    assert result.errors == []
+    sent.sort(key=lambda params: params['lon'])
+    assert [(params['lon'], params['lat']) for params in sent] == [(10., 20.), (200., -30.)]
+    assert sent[0]['search_type'] == 'Near Position Search'
+    npt.assert_approx_equal(sent[0]['radius'], 2)
+
+
+def test_get_tables(patch_get):
+    result = ned.core.Ned.get_tables(['3c 273', 'm1'], table='photometry')
+    single = ned.core.Ned.get_table('3c 273', table='photometry')
+    assert isinstance(result, Table)
+    assert len(result) == 2 * len(single)
+    assert result.colnames[0] == 'OBJECT_NAME'
+    assert list(result['OBJECT_NAME']) == ['3c 273'] * len(single) + ['m1'] * len(single)
+    assert result.errors == []
+
+
+def test_get_tables_cache(request, tmpdir):
+    requested = []
+
+    def session_request_mockreturn(self, method, url, params=None, timeout=None, **kwargs):
+        requested.append(params['objname'])
+        response = requests.Response()
+        response._content = open(data_path(DATA_FILES['Redshifts']), 'rb').read()
+        response.url = url
+        return response
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests.Session, 'request', session_request_mockreturn)
+    mp.setattr(ned.core.Ned, 'cache_location', str(tmpdir))
+    result = ned.core.Ned.get_tables(['m1', 'm31'], table='redshifts')
+    assert sorted(requested) == ['m1', 'm31']
+    # the cached tables are not requested again
+    result = ned.core.Ned.get_tables(['m1', 'm31', 'm33'], table='redshifts')
+    assert sorted(requested) == ['m1', 'm31', 'm33']
+    assert set(result['OBJECT_NAME']) == set(['m1', 'm31', 'm33'])
+
+
+def test_get_images_batch(request):
+    listings = []
+    opened = []
+
+    def get_mockreturn_listing(url, params=None, timeout=10, **kwargs):
+        listings.append(params['objname'])
+        return get_mockreturn(url, params=params, timeout=timeout, **kwargs)
+
+    def get_readable_fileobj_mockreturn(filename, **kwargs):
+        opened.append(filename)
+        return open(data_path(DATA_FILES['image']), 'rb')
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_mockreturn_listing)
+    mp.setattr(commons, 'get_readable_fileobj', get_readable_fileobj_mockreturn)
+    nedclass = ned.core.NedClass()
+    images = nedclass.get_images_batch(['m1', 'm31', 'm1'])
+    assert list(images.keys()) == ['m1', 'm31']
+    assert sorted(listings) == ['m1', 'm31']
+    assert len(images['m1']) == 5
+    # the files are downloaded once, with one handle for each distinct file
+    assert len(opened) == 2 * 5
+    assert images['m1'][0] is images['m31'][0]
+    assert isinstance(images['m1'][0].get_fits(), fits.HDUList)
+    # the URL lists are kept
+    nedclass.get_image_lists(['m1', 'm31'])
+    assert sorted(listings) == ['m1', 'm31']
@@ -3,6 +3,8 @@
 import abc
 import pickle
 import hashlib
+import functools
+import threading
 import requests
 
 __all__ = ['BaseQuery']
@@ -29,17 +31,20 @@ class AstroResponse(object):
 
 class AstroQuery(object):
     
-    def __init__(self, method, url, params=None, data=None, headers=None, files=None):
+    def __init__(self, method, url, params=None, data=None, headers=None, files=None,
+                 timeout=None):
         self.method = method
         self.url = url
         self.params = params
         self.data = data
         self.headers = headers
         self.files = files
+        self.timeout = timeout
         self._hash = None
     
     def request(self, session, cache_location=None):
-        return AstroResponse(session.request(self.method, self.url, params=self.params, data=self.data, headers=self.headers, files=self.files))
+        return AstroResponse(session.request(self.method, self.url, params=self.params, data=self.data, headers=self.headers, files=self.files,
+                                             timeout=self.timeout))
     
     def hash(self):
         if self._hash is None:
@@ -89,19 +94,22 @@ class BaseQuery(object):
         """ init a fresh copy of self """
         return self.__class__(*args, **kwargs)
     
-    def request(self, method, url, params=None, data=None, headers=None, files=None, save=False):
+    def request(self, method, url, params=None, data=None, headers=None, files=None, save=False,
+                timeout=None):
         if save:
             local_filename = url.split('/')[-1]
             local_filepath = (self.cache_location if self.cache_location else ".") + "/" + local_filename
             print("Downloading {0}...".format(local_filename))
             with suspend_cache(self): #Never cache file downloads: they are already saved on disk
-                r = self.request(method, url)
+                r = self.request(method, url, timeout=timeout)
                 with open(local_filepath, 'wb') as f:
                     f.write(r.content)
             return local_filepath
         else:
-            query = AstroQuery(method, url, params=params, data=data, headers=headers, files=files)
-            if (self.cache_location is None) or (not self._cache_active):
+            query = AstroQuery(method, url, params=params, data=data, headers=headers, files=files,
+                               timeout=timeout)
+            if ((self.cache_location is None) or (not self._cache_active) or
+                    _cache_suspended(self)):
                 response = query.request(self.__session)
             else:
                 response = query.from_cache(self.cache_location)
@@ -111,19 +119,52 @@ class BaseQuery(object):
             return response
 
 
+# number of active suspend_cache contexts per query object, in each thread
+_suspended = threading.local()
+
+
+def _cache_suspended(obj):
+    """ Whether caching is suspended for ``obj`` in the current thread """
+    return getattr(_suspended, 'counts', {}).get(id(obj), 0) > 0
+
+
 class suspend_cache:
     """
-    A context manager that suspends caching.
+    A context manager that suspends caching. Only the requests made by the
+    current thread are affected, so that a query object shared by several
+    threads keeps its cache for the others. The contexts can be nested.
     """
     def __init__(self, obj):
         self.obj = obj
     def __enter__(self):
-        self.obj._cache_active = False
+        counts = _suspended.__dict__.setdefault('counts', {})
+        counts[id(self.obj)] = counts.get(id(self.obj), 0) + 1
     def __exit__(self, exc_type, exc_value, traceback):
-        self.obj._cache_active = True
+        counts = _suspended.counts
+        counts[id(self.obj)] -= 1
+        if counts[id(self.obj)] == 0:
+            del counts[id(self.obj)]
         return False
 
 
+def accepts_settings(method):
+    """
+    Decorator for the query methods of the classes implementing
+    ``get_settings`` and ``_from_settings``. The decorated method accepts an
+    optional ``settings`` keyword, an immutable object as returned by
+    ``get_settings``; the query then runs on a private instance configured
+    from it, so that the shared instance is neither read nor modified and
+    can be used from several threads at once.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        settings = kwargs.pop('settings', None)
+        if settings is not None:
+            self = self._from_settings(settings)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
 class QueryWithLogin(BaseQuery):
 
     """
@@ -16,6 +16,11 @@ SDSS_MAXQUERY = ConfigurationItem('maxqueries', 1, 'Max number of queries allowe
 SDSS_TIMEOUT = ConfigurationItem('timeout', 30,
                                  'Default timeout for connecting to server')
 
+SDSS_TEMPLATE_DIR = ConfigurationItem('template_dir', '',
+                                      'Directory of the local copy of the '
+                                      'spectral templates; empty for the '
+                                      'astropy cache directory.')
+
 from .core import SDSS, SDSSClass
 
 import warnings
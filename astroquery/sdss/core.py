@@ -11,11 +11,18 @@ Description: Access Sloan Digital Sky Survey database online.
 
 import numpy as np
 from astropy import units as u
-from astropy.table import Table
+from astropy.table import Table, vstack
+from astropy.io import fits
+from astropy.config.paths import get_cache_dir
+# maintain compat with PY<2.7
+from astropy.utils import OrderedDict
 import io
+import os
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
 from ..query import BaseQuery
-from . import SDSS_SERVER, SDSS_MAXQUERY, SDSS_TIMEOUT
-from ..utils import commons, async_to_sync
+from . import SDSS_SERVER, SDSS_MAXQUERY, SDSS_TIMEOUT, SDSS_TEMPLATE_DIR
+from ..utils import commons, async_to_sync, parallel
 from ..utils.docstr_chompers import prepend_docstr_noreturns
 
 __all__ = ['SDSS', 'SDSSClass']
@@ -38,8 +45,26 @@ spec_templates = {'star_O': 0, 'star_OB': 1, 'star_B': 2, 'star_A': [3, 4],
                   'qso_bal': [30, 31], 'qso_bright': 32
                   }
 
+# templates 0 to 32 of spec_templates
+NUMBER_OF_TEMPLATES = 33
+
+# numpy types of the default PhotoObj/SpecObj quantities (lower case), used
+# to parse the SkyServer CSV without inferring the types line by line
+field_dtypes = {'ra': 'f8', 'dec': 'f8', 'objid': 'i8', 'run': 'i4',
+                'rerun': 'i4', 'camcol': 'i4', 'field': 'i4', 'z': 'f8',
+                'plate': 'i4', 'mjd': 'i4', 'fiberid': 'i4', 'specobjid': 'i8',
+                'run2d': 'S', 'instrument': 'S',
+                # computed by query_crossid
+                'input_index': 'i8', 'distance': 'f8'}
+
 sdss_arcsec_per_pixel = 0.396
 
+# step in log10(wavelength) of the pixels of the SDSS spectra
+SPECTRUM_DLOGLAM = 1e-4
+
+# Result of SDSSClass.get_spectra_stack
+SpectraStack = namedtuple('SpectraStack', ['loglam', 'flux', 'ivar', 'index'])
+
 
 @async_to_sync
 class SDSSClass(BaseQuery):
@@ -51,6 +76,7 @@ class SDSSClass(BaseQuery):
     MAXQUERIES = SDSS_MAXQUERY()
     AVAILABLE_TEMPLATES = spec_templates
     TIMEOUT = SDSS_TIMEOUT()
+    TEMPLATE_DIR = SDSS_TEMPLATE_DIR()
 
     QUERY_URL = 'http://skyserver.sdss3.org/public/en/tools/search/x_sql.aspx'
 
@@ -177,6 +203,101 @@ class SDSSClass(BaseQuery):
 
         return r
 
+    def query_crossid(self, coordinates, radius=u.degree / 1800.,
+                      fields=None, spectro=False, chunk_size=500,
+                      max_workers=None, timeout=TIMEOUT,
+                      get_query_payload=False):
+        """
+        Finds the nearest SDSS object of each of many positions. The
+        positions are sent in chunks, each chunk being matched in a single
+        SQL query with ``fGetNearbyObjEq``; the chunks are queried
+        concurrently.
+
+        Parameters
+        ----------
+        coordinates : `astropy.table.Table` or `astropy.coordinates` object
+            The positions to match: either a table with ``ra`` and ``dec``
+            columns (in degrees unless the columns have angular units), or
+            an `astropy.coordinates` object holding an array of positions.
+        radius : str or `astropy.units.Quantity` object, optional
+            The string must be parsable by `astropy.coordinates.Angle`. The
+            appropriate `Quantity` object from `astropy.units` may also be
+            used. Defaults to 2 arcsec.
+        fields : list, optional
+            SDSS PhotoObj or SpecObj quantities to return. If None, defaults
+            to quantities required to find corresponding spectra and images
+            of matched objects (e.g. plate, fiberID, mjd, etc.).
+        spectro : bool, optional
+            If True, only objects with spectroscopy are matched.
+        chunk_size : int, optional
+            Number of positions per SQL query, at most 1000. Defaults to 500.
+            The queries are sent by POST, as they are too long for a URL.
+        max_workers : int, optional
+            Maximum number of concurrent queries. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        timeout : float, optional
+            Time limit (in seconds) for establishing successful connection with
+            remote server.  Defaults to `astroquery.sdss.SDSS.TIMEOUT`.
+        get_query_payload : bool, optional
+            If True, return the list of request payloads instead of querying.
+
+        Returns
+        -------
+        result : `astropy.table.Table` or None
+            One row per matched position, sorted by ``input_index``, the
+            (0-based) index of the position in ``coordinates``, with the
+            ``distance`` of the match in arcmin. None if no position has a
+            match.
+
+        Examples
+        --------
+        >>> from astroquery.sdss import SDSS
+        >>> from astropy.table import Table
+        >>> targets = Table([[2.02344, 30.4644], [14.83982, 7.8646]],
+        ...                 names=['ra', 'dec'])
+        >>> result = SDSS.query_crossid(targets, radius='0d0m5s')
+        """
+        if not 0 < chunk_size <= 1000:
+            raise ValueError("chunk_size must be between 1 and 1000")
+        ra, dec = commons.coord_array_to_radec(coordinates)
+        radius = commons.radius_to_unit(radius, 'arcmin')
+        # vectorized formatting of the "(index,ra,dec)" rows
+        values = np.char.add(np.char.add(
+            np.char.mod('(%d,', np.arange(len(ra))),
+            np.char.mod('%.10f,', ra)), np.char.mod('%.10f)', dec))
+        request_payloads = [dict(cmd=_crossid_sql(chunk, radius, fields,
+                                                  spectro),
+                                 format='csv')
+                            for chunk in parallel.chunks(values.tolist(),
+                                                         chunk_size)]
+        if get_query_payload:
+            return request_payloads
+
+        def query_chunk(request_payload):
+            # the SQL of a chunk is tens of kB, beyond the URL length limits
+            # of SkyServer, so it is sent in the body of a POST request
+            r = commons.send_request(SDSS.QUERY_URL, request_payload, timeout,
+                                     request_type='POST')
+            return self._parse_result(r)
+
+        tables = [table for table in
+                  parallel.parallel_map(query_chunk, request_payloads,
+                                        max_workers=max_workers)
+                  if table is not None]
+        if len(tables) == 0:
+            return None
+        table = tables[0] if len(tables) == 1 else vstack(tables)
+        # keep the nearest match of every position (a match can have
+        # several spectra)
+        order = np.lexsort((np.asarray(table['distance']),
+                            np.asarray(table['input_index'])))
+        table = table[order]
+        unique, first = np.unique(np.asarray(table['input_index']),
+                                  return_index=True)
+        table = table[first]
+        table['distance'].unit = u.arcmin
+        return table
+
     def query_photoobj_async(self, run=None, rerun=301, camcol=None,
                              field=None, fields=None, timeout=TIMEOUT,
                              get_query_payload=False):
@@ -239,6 +360,163 @@ class SDSSClass(BaseQuery):
 
         return r
 
+    def iter_query_pages(self, page_size=10000, timeout=TIMEOUT, **kwargs):
+        """
+        Runs a large query as a sequence of pages of at most ``page_size``
+        rows, so that results beyond the SkyServer size limit can be
+        retrieved in bounded memory.
+
+        The SQL built from ``kwargs`` is rewritten into keyset pages ordered
+        by ``objid`` (and ``specobjid`` for spectroscopic queries): every page
+        asks for the ``TOP page_size`` rows following the last row of the
+        previous page. The next page is requested as soon as a page arrives,
+        while the current one is being processed.
+
+        If ``fields`` leaves out the key columns, the pages still hold one
+        row per key, so that rows with the same requested values may repeat
+        across pages. These duplicates, which the unpaginated ``SELECT
+        DISTINCT`` query would not return, are removed; this keeps the rows
+        already yielded in memory.
+
+        Parameters
+        ----------
+        page_size : int, optional
+            Maximum number of rows per page. Defaults to 10000.
+        timeout : float, optional
+            Time limit (in seconds) for establishing successful connection with
+            remote server.  Defaults to `astroquery.sdss.SDSS.TIMEOUT`.
+        kwargs : dict
+            The query: ``coordinates``, ``radius``, ``fields``, ``spectro``,
+            ``plate``, ``mjd``, ``fiberID``, ``run``, ``rerun``, ``camcol``
+            or ``field``, as for `query_region`, `query_specobj` and
+            `query_photoobj`.
+
+        Returns
+        -------
+        generator
+            Yields an `astropy.table.Table` for each page.
+
+        Examples
+        --------
+        >>> from astroquery.sdss import SDSS
+        >>> for page in SDSS.iter_query_pages(run=5714, page_size=50000):
+        ...     print(len(page))
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be a positive integer")
+        request_payload = self._args_to_payload(**kwargs)
+        keys = ['p.objid']
+        if kwargs.get('spectro'):
+            keys.append('s.specobjid')
+        return self._iter_pages(request_payload['cmd'], keys, page_size,
+                                timeout)
+
+    def query_paginated(self, page_size=10000, timeout=TIMEOUT, **kwargs):
+        """
+        Same as `iter_query_pages`, but collects all the pages into a single
+        table. The number of rows is counted first so that the columns are
+        allocated once and filled page by page.
+
+        Parameters
+        ----------
+        page_size : int, optional
+            Maximum number of rows per page. Defaults to 10000.
+        timeout : float, optional
+            Time limit (in seconds) for establishing successful connection with
+            remote server.  Defaults to `astroquery.sdss.SDSS.TIMEOUT`.
+        kwargs : dict
+            The query, see `iter_query_pages`.
+
+        Returns
+        -------
+        result : `astropy.table.Table` or None
+            None if no rows match the query.
+        """
+        request_payload = self._args_to_payload(**kwargs)
+        count_payload = dict(cmd='SELECT COUNT(*) AS n FROM ({0}) AS q'.format(
+                             request_payload['cmd'].strip()), format='csv')
+        r = commons.send_request(SDSS.QUERY_URL, count_payload, timeout,
+                                 request_type='GET')
+        nrows = int(r.content.strip().splitlines()[-1])
+        if nrows == 0:
+            return None
+
+        names, columns = None, None
+        filled = 0
+        for page in self.iter_query_pages(page_size=page_size,
+                                          timeout=timeout, **kwargs):
+            if columns is None:
+                names = page.colnames
+                columns = [np.empty(max(nrows, len(page)),
+                                    dtype=page[name].dtype)
+                           for name in names]
+            if filled + len(page) > len(columns[0]):
+                # rows were added since the count
+                columns = [np.resize(column, filled + len(page))
+                           for column in columns]
+            for index, name in enumerate(names):
+                values = np.asarray(page[name])
+                if values.dtype.itemsize > columns[index].dtype.itemsize:
+                    # wider strings than in the first page
+                    columns[index] = columns[index].astype(values.dtype)
+                columns[index][filled:filled + len(page)] = values
+            filled += len(page)
+        if filled == 0:
+            return None
+        return Table([column[:filled] for column in columns], names=names)
+
+    def _iter_pages(self, sql, keys, page_size, timeout):
+        """
+        Generator over the keyset pages of ``sql``, see `iter_query_pages`.
+        The key columns that were not requested are removed from the pages,
+        and the rows repeating the requested values of an earlier row are
+        then dropped.
+        """
+        # fails early on a query that cannot be paged
+        _keyset_page_sql(sql, keys, None, page_size)
+        select = sql[len('SELECT DISTINCT '):sql.index(' FROM ')]
+        hidden = [key.split('.')[1] for key in keys
+                  if key not in select.strip().split(',')]
+        key_names = [key.split('.')[1] for key in keys]
+        seen = set()
+
+        def fetch(last):
+            request_payload = dict(cmd=_keyset_page_sql(sql, keys, last,
+                                                        page_size),
+                                   format='csv')
+            r = commons.send_request(SDSS.QUERY_URL, request_payload, timeout,
+                                     request_type='GET')
+            return self._parse_result(r)
+
+        # a single worker: each page needs the last key of the previous one
+        pool = ThreadPool(1)
+        try:
+            pending = pool.apply_async(fetch, (None,))
+            while pending is not None:
+                page = pending.get()
+                if page is None:
+                    break
+                pending = None
+                if len(page) >= page_size:
+                    last = [page[name][-1] for name in key_names]
+                    pending = pool.apply_async(fetch, (last,))
+                if hidden:
+                    for name in hidden:
+                        page.remove_column(name)
+                    keep = []
+                    for index, row in enumerate(zip(*[page[name] for name
+                                                      in page.colnames])):
+                        if row not in seen:
+                            seen.add(row)
+                            keep.append(index)
+                    if len(keep) == 0:
+                        continue
+                    if len(keep) < len(page):
+                        page = page[keep]
+                yield page
+        finally:
+            pool.terminate()
+
     def get_spectra_async(self, coordinates=None, radius=u.degree / 1800.,
                           matches=None, plate=None, fiberID=None, mjd=None,
                           timeout=TIMEOUT, get_query_payload=False):
@@ -316,14 +594,7 @@ class SDSSClass(BaseQuery):
 
         results = []
         for row in matches:
-            link = ('{base}/{instrument}/spectro/redux/{run2d}/spectra'
-                    '/{plate:04d}/spec-{plate:04d}-{mjd}-{fiber:04d}.fits')
-            link = link.format(base=SDSS.SPECTRO_OPTICAL,
-                               instrument=row['instrument'].lower(),
-                               run2d=row['run2d'], plate=row['plate'],
-                               fiber=row['fiberID'], mjd=row['mjd'])
-
-            results.append(commons.FileContainer(link,
+            results.append(commons.FileContainer(_spectrum_link(row),
                                                  encoding='binary',
                                                  remote_timeout=timeout))
 
@@ -347,6 +618,110 @@ class SDSSClass(BaseQuery):
 
         return [obj.get_fits() for obj in readable_objs]
 
+    def get_spectra_stack(self, coordinates=None, radius=u.degree / 1800.,
+                          matches=None, plate=None, fiberID=None, mjd=None,
+                          loglam_min=3.55, loglam_max=4.02, dloglam=1e-4,
+                          memmap_dir=None, timeout=TIMEOUT, max_workers=None):
+        """
+        Download many spectra and stack their coadded flux on a common
+        wavelength grid.
+
+        Only the ``loglam``, ``flux`` and ``ivar`` columns of the coadd HDU
+        of each spectrum are read, and they are written directly in a
+        preallocated 2D array, so the memory used does not grow with the
+        size of the spectrum files. The spectra are downloaded concurrently.
+        SDSS spectra are sampled on a fixed grid of steps of 1e-4 in
+        log10(wavelength), so every pixel is copied to the nearest pixel of
+        the common grid without resampling; other steps are rejected. Pixels
+        outside of the range of a spectrum have zero inverse variance.
+
+        Parameters
+        ----------
+        coordinates, radius, matches, plate, mjd, fiberID, timeout
+            Select the spectra as for `get_spectra`.
+        loglam_min, loglam_max, dloglam : float, optional
+            The common grid, in log10 of the wavelength in Angstrom. Defaults
+            to 3.55 to 4.02 (3548 to 10471 Angstrom) with steps of 1e-4.
+            ``dloglam`` must be the native step of 1e-4.
+        memmap_dir : str, optional
+            If given, the flux and inverse variance arrays are memory-mapped
+            ``.npy`` files ``flux.npy`` and ``ivar.npy`` created in this
+            directory (see `numpy.load`), so that stacks larger than the
+            memory can be built.
+        max_workers : int, optional
+            Maximum number of simultaneous downloads. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+
+        Returns
+        -------
+        stack : `SpectraStack`
+            A named tuple with the ``loglam`` grid (1D array), the ``flux``
+            and ``ivar`` arrays of shape ``(number of spectra, len(loglam))``
+            and an ``index`` table with the ``plate``, ``mjd`` and
+            ``fiberID`` of every row.
+
+        Examples
+        --------
+        >>> from astroquery.sdss import SDSS
+        >>> matches = SDSS.query_specobj(plate=751, mjd=52251)
+        >>> stack = SDSS.get_spectra_stack(matches=matches)
+        >>> stack.flux.shape
+        (640, 4701)
+        """
+        if abs(dloglam - SPECTRUM_DLOGLAM) > 1e-6 * SPECTRUM_DLOGLAM:
+            # another step would need the flux to be resampled
+            raise ValueError("dloglam must be the native step of the SDSS "
+                             "spectra, {0}".format(SPECTRUM_DLOGLAM))
+        if not matches:
+            request_payload = self._args_to_payload(
+                fields=['instrument', 'run2d', 'plate', 'mjd', 'fiberID'],
+                coordinates=coordinates, radius=radius, spectro=True,
+                plate=plate, mjd=mjd, fiberID=fiberID)
+            r = commons.send_request(SDSS.QUERY_URL, request_payload, timeout,
+                                     request_type='GET')
+            matches = self._parse_result(r)
+
+        if not isinstance(matches, Table):
+            raise TypeError("Matches must be an astropy Table.")
+
+        npix = int(np.round((loglam_max - loglam_min) / dloglam)) + 1
+        loglam = loglam_min + dloglam * np.arange(npix)
+        shape = (len(matches), npix)
+        if memmap_dir is None:
+            flux = np.zeros(shape, dtype=np.float32)
+            ivar = np.zeros(shape, dtype=np.float32)
+        else:
+            # new memory-mapped files are filled with zeros
+            flux = np.lib.format.open_memmap(
+                os.path.join(memmap_dir, 'flux.npy'), mode='w+',
+                dtype=np.float32, shape=shape)
+            ivar = np.lib.format.open_memmap(
+                os.path.join(memmap_dir, 'ivar.npy'), mode='w+',
+                dtype=np.float32, shape=shape)
+
+        links = [_spectrum_link(row) for row in matches]
+
+        def load(index):
+            # a new container per spectrum, so that the downloaded file is
+            # released as soon as its row is filled
+            readable_obj = commons.FileContainer(links[index],
+                                                 encoding='binary',
+                                                 remote_timeout=timeout)
+            row_loglam, row_flux, row_ivar = _read_coadd(readable_obj)
+            pixels = np.round((row_loglam - loglam_min) / dloglam).astype(int)
+            valid = (pixels >= 0) & (pixels < npix)
+            flux[index, pixels[valid]] = row_flux[valid]
+            ivar[index, pixels[valid]] = row_ivar[valid]
+
+        parallel.parallel_map(load, range(len(links)),
+                              max_workers=max_workers)
+        if memmap_dir is not None:
+            flux.flush()
+            ivar.flush()
+
+        index = Table([matches['plate'], matches['mjd'], matches['fiberID']])
+        return SpectraStack(loglam, flux, ivar, index)
+
     def get_images_async(self, coordinates=None, radius=u.degree / 1800.,
                          matches=None, run=None, rerun=301, camcol=None,
                          field=None, band='g', timeout=TIMEOUT,
@@ -432,7 +807,10 @@ class SDSSClass(BaseQuery):
         if not isinstance(matches, Table):
             raise ValueError
 
+        # matches on the same frame share a single container, so that each
+        # frame is downloaded once
         results = []
+        containers = {}
         for row in matches:
             for b in band:
                 # Download and read in image data
@@ -442,21 +820,23 @@ class SDSSClass(BaseQuery):
                 link = linkstr.format(base=SDSS.IMAGING, run=row['run'],
                                       rerun=row['rerun'], camcol=row['camcol'],
                                       field=row['field'], band=b)
-
-                results.append(commons.FileContainer(link,
-                                                     encoding='binary',
-                                                     remote_timeout=timeout))
+                if link not in containers:
+                    containers[link] = commons.FileContainer(
+                        link, encoding='binary', remote_timeout=timeout)
+                results.append(containers[link])
 
         return results
 
     @prepend_docstr_noreturns(get_images_async.__doc__)
     def get_images(self, coordinates=None, radius=u.degree / 1800.,
                    matches=None, run=None, rerun=301, camcol=None,
-                   field=None, band='g', timeout=TIMEOUT):
+                   field=None, band='g', timeout=TIMEOUT, max_workers=None):
         """
         Returns
         -------
-        List of PyFITS HDUList objects.
+        List of PyFITS HDUList objects. Matches on the same frame share the
+        same HDUList: the distinct frames are downloaded once, by at most
+        ``max_workers`` concurrent threads.
 
         """
 
@@ -467,7 +847,53 @@ class SDSSClass(BaseQuery):
                                               band=band, timeout=timeout,
                                               get_query_payload=False)
 
-        return [obj.get_fits() for obj in readable_objs]
+        return _get_fits(readable_objs, max_workers=max_workers)
+
+    def get_images_by_match(self, matches, band='g', timeout=TIMEOUT,
+                            max_workers=None):
+        """
+        Download the frames of every row of ``matches``, each distinct frame
+        being downloaded once, concurrently.
+
+        Parameters
+        ----------
+        matches : astropy.table.Table instance
+            Result of `query_region`.
+        band : str, list
+            Could be individual band, or list of bands.
+            Options: u, g, r, i, or z
+        timeout : float, optional
+            Time limit (in seconds) for establishing successful connection with
+            remote server.  Defaults to `astroquery.sdss.SDSS.TIMEOUT`.
+        max_workers : int, optional
+            Maximum number of frames downloaded concurrently. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+
+        Returns
+        -------
+        images : `~astropy.utils.OrderedDict`
+            Maps the index of each row of ``matches`` to a dictionary of
+            PyFITS HDUList objects keyed by band. Rows on the same frame
+            share the same HDUList objects.
+
+        Examples
+        --------
+        >>> from astropy import coordinates as coords
+        >>> from astroquery.sdss import SDSS
+        >>> co = coords.ICRS('0h8m05.63s +14d50m23.3s')
+        >>> result = SDSS.query_region(co, radius='0d1m')
+        >>> images = SDSS.get_images_by_match(result, band='gr')
+        >>> images[0]['r']
+        """
+        readable_objs = self.get_images_async(matches=matches, band=band,
+                                              timeout=timeout)
+        hdulists = _get_fits(readable_objs, max_workers=max_workers)
+        bands = list(band)
+        images = OrderedDict()
+        for index in range(len(matches)):
+            row_hdulists = hdulists[index * len(bands):(index + 1) * len(bands)]
+            images[index] = OrderedDict(zip(bands, row_hdulists))
+        return images
 
     def get_spectral_template_async(self, kind='qso', timeout=TIMEOUT):
         """
@@ -502,37 +928,88 @@ class SDSSClass(BaseQuery):
 
         """
 
-        if kind == 'all':
-            indices = list(np.arange(33))
-        else:
-            indices = spec_templates[kind]
-            if type(indices) is not list:
-                indices = [indices]
-
         results = []
-        for index in indices:
-            name = str(index).zfill(3)
-            link = '%s-%s.fit' % (SDSS.TEMPLATES, name)
-            results.append(commons.FileContainer(link, 
+        for index in _template_indices(kind):
+            results.append(commons.FileContainer(_template_link(index),
                                                  remote_timeout=timeout,
                                                  encoding='binary'))
 
         return results
 
     @prepend_docstr_noreturns(get_spectral_template_async.__doc__)
-    def get_spectral_template(self, kind='qso', timeout=TIMEOUT):
+    def get_spectral_template(self, kind='qso', timeout=TIMEOUT, cache=True):
         """
         Returns
         -------
-        List of PyFITS HDUList objects.
+        List of PyFITS HDUList objects. With ``cache=True`` (the default),
+        the first call downloads all the templates concurrently (see
+        `download_spectral_templates`), and the templates are then opened
+        memory-mapped from the local copies without accessing the network.
 
         """
+        if cache:
+            paths = self.download_spectral_templates(timeout=timeout)
+            return [fits.open(paths[index], memmap=True)
+                    for index in _template_indices(kind)]
 
         readable_objs = self.get_spectral_template_async(kind=kind,
                                                          timeout=timeout)
 
         return [obj.get_fits() for obj in readable_objs]
 
+    def download_spectral_templates(self, timeout=TIMEOUT, max_workers=None,
+                                    overwrite=False):
+        """
+        Download all the spectral templates to a local directory, so that
+        `get_spectral_template` does not need to access the network. The
+        templates are downloaded concurrently, and the ones already present
+        are skipped. The directory is ``SDSS.TEMPLATE_DIR``, by default
+        ``astroquery/sdss_templates`` in the astropy cache directory.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time limit (in seconds) for establishing successful connection with
+            remote server.  Defaults to `astroquery.sdss.SDSS.TIMEOUT`.
+        max_workers : int, optional
+            Maximum number of simultaneous downloads. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+        overwrite : bool, optional
+            Download the templates again even if they are present.
+
+        Returns
+        -------
+        paths : list of str
+            The local paths of the templates, by template number.
+        """
+        template_dir = self.TEMPLATE_DIR
+        if not template_dir:
+            template_dir = os.path.join(get_cache_dir(), 'astroquery',
+                                        'sdss_templates')
+        if not os.path.isdir(template_dir):
+            os.makedirs(template_dir)
+
+        paths = [os.path.join(template_dir, os.path.basename(_template_link(i)))
+                 for i in range(NUMBER_OF_TEMPLATES)]
+        missing = [i for i in range(NUMBER_OF_TEMPLATES)
+                   if overwrite or not os.path.exists(paths[i])]
+
+        def download(index):
+            readable_obj = commons.FileContainer(_template_link(index),
+                                                 remote_timeout=timeout,
+                                                 encoding='binary')
+            content = readable_obj.get_string()
+            # write to a temporary name first so that an interrupted
+            # download does not leave a truncated template behind
+            with open(paths[index] + '.part', 'wb') as f:
+                f.write(content)
+            if os.path.exists(paths[index]):
+                os.remove(paths[index])
+            os.rename(paths[index] + '.part', paths[index])
+
+        parallel.parallel_map(download, missing, max_workers=max_workers)
+        return paths
+
     def _parse_result(self, response, verbose=False):
         """
         Parses the result and return either an `astropy.table.Table` or
@@ -553,15 +1030,12 @@ class SDSSClass(BaseQuery):
         bytecontent = (response.content.encode('ascii') 
                        if hasattr(response.content,'encode') 
                        else response.content)
-        arr = np.atleast_1d(np.genfromtxt(io.BytesIO(bytecontent),
-                            names=True, dtype=None, delimiter=b',',
-                            skip_header=1, # this may be a hack; it is necessary for tests to pass
-                            comments=b'#'))
-
-        if len(arr) == 0:
-            return None
-        else:
-            return Table(arr)
+        # columns of known types are parsed in bulk; anything else goes
+        # through the slower type inference of genfromtxt
+        table = _parse_csv_fast(bytecontent)
+        if table is not None:
+            return table
+        return _parse_csv_genfromtxt(bytecontent)
 
     def _args_to_payload(self, coordinates=None, radius=u.degree / 1800.,
                          fields=None, spectro=False,
@@ -680,3 +1154,202 @@ class SDSSClass(BaseQuery):
         return request_payload
 
 SDSS = SDSSClass()
+
+
+def _get_fits(readable_objs, max_workers=None):
+    """
+    Downloads and parses the distinct `~astroquery.utils.commons.FileContainer`
+    objects of ``readable_objs`` concurrently, and returns the HDULists in
+    the order of ``readable_objs``.
+    """
+    unique = OrderedDict()
+    for obj in readable_objs:
+        unique[id(obj)] = obj
+    hdulists = parallel.parallel_map(lambda obj: obj.get_fits(),
+                                     unique.values(), max_workers=max_workers)
+    by_id = dict(zip(unique.keys(), hdulists))
+    return [by_id[id(obj)] for obj in readable_objs]
+
+
+def _spectrum_link(row):
+    """ URL of the spectrum file of a row with the SpecObj identifiers """
+    link = ('{base}/{instrument}/spectro/redux/{run2d}/spectra'
+            '/{plate:04d}/spec-{plate:04d}-{mjd}-{fiber:04d}.fits')
+    return link.format(base=SDSS.SPECTRO_OPTICAL,
+                       instrument=row['instrument'].lower(),
+                       run2d=row['run2d'], plate=row['plate'],
+                       fiber=row['fiberID'], mjd=row['mjd'])
+
+
+def _read_coadd(readable_obj):
+    """
+    Returns the ``loglam``, ``flux`` and ``ivar`` arrays of the coadd HDU of
+    a spectrum file, without reading the other HDUs or columns.
+    """
+    hdulist = fits.open(readable_obj.get_stringio())
+    try:
+        coadd = hdulist[1].data
+        return [np.array(coadd.field(name), dtype=np.float64)
+                for name in ('loglam', 'flux', 'ivar')]
+    finally:
+        hdulist.close()
+
+
+def _template_indices(kind):
+    """ Template numbers of a kind of `spec_templates`, or of all """
+    if kind == 'all':
+        return list(range(NUMBER_OF_TEMPLATES))
+    indices = spec_templates[kind]
+    if type(indices) is not list:
+        indices = [indices]
+    return indices
+
+
+def _template_link(index):
+    return '%s-%s.fit' % (SDSS.TEMPLATES, str(index).zfill(3))
+
+
+def _crossid_sql(values, radius, fields=None, spectro=False):
+    """
+    Builds the SQL matching a list of ``(input_index,ra,dec)`` value rows
+    to their nearest object within ``radius`` arcmin.
+    """
+    if fields is None:
+        fields = list(photoobj_defs)
+        if spectro:
+            fields += specobj_defs
+    q_select = ['q.input_index']
+    for sql_field in fields:
+        if sql_field in photoobj_defs:
+            q_select.append('p.%s' % sql_field)
+        if sql_field in specobj_defs:
+            q_select.append('s.%s' % sql_field)
+    q_select.append('m.distance')
+    if spectro:
+        n_join = 'JOIN SpecObjAll AS s ON n.objID = s.bestObjID '
+        q_join = 'JOIN SpecObjAll AS s ON p.objID = s.bestObjID'
+    else:
+        n_join = ''
+        q_join = ''
+    sql = ('SELECT {select} '
+           'FROM (VALUES {values}) AS q(input_index, ra, dec) '
+           'CROSS APPLY (SELECT TOP 1 n.objID, n.distance '
+           'FROM dbo.fGetNearbyObjEq(q.ra, q.dec, {radius!r}) AS n '
+           '{n_join}ORDER BY n.distance) AS m '
+           'JOIN PhotoObjAll AS p ON p.objID = m.objID {q_join}')
+    return sql.format(select=','.join(q_select), values=','.join(values),
+                      radius=float(radius), n_join=n_join,
+                      q_join=q_join).strip()
+
+
+def _keyset_page_sql(sql, keys, last, page_size):
+    """
+    Rewrites a query built by `SDSSClass._args_to_payload` to return the
+    ``page_size`` rows following ``last`` in the order of the ``keys``
+    columns.
+
+    Parameters
+    ----------
+    sql : str
+        A ``SELECT DISTINCT ... FROM ... WHERE ...`` query, ending with its
+        WHERE clause.
+    keys : list of str
+        The columns, e.g. ``['p.objid']``, that identify a row.
+    last : list or None
+        The values of ``keys`` in the last row of the previous page, or None
+        for the first page.
+    page_size : int
+        The number of rows of a page.
+
+    Returns
+    -------
+    sql : str
+
+    Raises
+    ------
+    ValueError
+        If the query is not a ``SELECT DISTINCT`` with a WHERE clause, to
+        which the keyset condition can be appended.
+
+    >>> _keyset_page_sql('SELECT DISTINCT p.ra FROM PhotoObjAll AS p WHERE (p.run=1)',
+    ...                  ['p.objid'], [42], 10)
+    'SELECT DISTINCT TOP 10 p.ra,p.objid FROM PhotoObjAll AS p WHERE (p.run=1) AND ((p.objid > 42)) ORDER BY p.objid'
+    """
+    if (not sql.startswith('SELECT DISTINCT ') or ' FROM ' not in sql or
+            ' WHERE ' not in sql.split(' FROM ', 1)[1] or
+            ' ORDER BY ' in sql or ' GROUP BY ' in sql):
+        raise ValueError("Keyset pages need a 'SELECT DISTINCT ... FROM ... "
+                         "WHERE ...' query, got: {0}".format(sql))
+    select, rest = sql[len('SELECT DISTINCT '):].split(' FROM ', 1)
+    columns = select.strip().split(',')
+    columns += [key for key in keys if key not in columns]
+    rest = rest.strip()
+    if last is not None:
+        # (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...
+        conditions = []
+        for index in range(len(keys)):
+            terms = ['{0} = {1}'.format(keys[i], last[i])
+                     for i in range(index)]
+            terms.append('{0} > {1}'.format(keys[index], last[index]))
+            conditions.append('(' + ' AND '.join(terms) + ')')
+        rest += ' AND (' + ' OR '.join(conditions) + ')'
+    return 'SELECT DISTINCT TOP {0} {1} FROM {2} ORDER BY {3}'.format(
+        page_size, ','.join(columns), rest, ','.join(keys))
+
+
+def _parse_csv_genfromtxt(bytecontent):
+    """
+    Parses the SkyServer CSV with `numpy.genfromtxt`, inferring the type of
+    every column. Returns None if there are no rows.
+    """
+    arr = np.atleast_1d(np.genfromtxt(io.BytesIO(bytecontent),
+                        names=True, dtype=None, delimiter=b',',
+                        skip_header=1, # this may be a hack; it is necessary for tests to pass
+                        comments=b'#'))
+
+    if len(arr) == 0:
+        return None
+    else:
+        return Table(arr)
+
+
+def _parse_csv_fast(bytecontent):
+    """
+    Parses the SkyServer CSV when all its columns are listed in
+    `field_dtypes`: the values are split in a single pass and every column
+    is converted at once by numpy.
+
+    Returns
+    -------
+    table : `astropy.table.Table` or None
+        None if the content has no rows, unknown columns or values that
+        cannot be converted, in which case `_parse_csv_genfromtxt` should
+        be used instead.
+    """
+    lines = bytecontent.strip().splitlines()
+    if lines and lines[0].startswith(b'#'):
+        lines = lines[1:]
+    if len(lines) < 2:
+        return None
+    names = [str(name.strip()) for name in lines[0].decode('ascii').split(',')]
+    try:
+        dtypes = [field_dtypes[name.lower()] for name in names]
+    except KeyError:
+        return None
+    nrows = len(lines) - 1
+    values = np.array(b','.join(lines[1:]).split(b','))
+    if values.size != nrows * len(names):
+        return None
+    values = values.reshape(nrows, len(names))
+    columns = []
+    try:
+        for index, dtype in enumerate(dtypes):
+            column = np.char.strip(values[:, index])
+            if dtype == 'S':
+                width = max(1, int(np.char.str_len(column).max()))
+                columns.append(column.astype('S{0}'.format(width)))
+            else:
+                columns.append(column.astype(dtype))
+    except ValueError:
+        return None
+    return Table(columns, names=names)
@@ -0,0 +1,39 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Compares the time taken to parse a large SkyServer CSV result with the bulk
+parser and with `numpy.genfromtxt`. The rows of the test data are repeated
+to build the input. Run with::
+
+    python -m astroquery.sdss.tests.benchmark_parse_result [nrows]
+"""
+from __future__ import print_function
+import os
+import sys
+import timeit
+
+from ..core import _parse_csv_fast, _parse_csv_genfromtxt
+
+
+def make_content(filename, nrows):
+    with open(filename, 'rb') as f:
+        lines = f.read().strip().splitlines()
+    comment, header, rows = lines[0], lines[1], lines[2:]
+    rows = (rows * (nrows // len(rows) + 1))[:nrows]
+    return b'\n'.join([comment, header] + rows)
+
+
+def main(nrows=100000, repeat=3):
+    data_dir = os.path.join(os.path.dirname(__file__), 'data')
+    for filename in ('xid_im.txt', 'xid_sp.txt'):
+        content = make_content(os.path.join(data_dir, filename), nrows)
+        fast = min(timeit.repeat(lambda: _parse_csv_fast(content),
+                                 number=1, repeat=repeat))
+        slow = min(timeit.repeat(lambda: _parse_csv_genfromtxt(content),
+                                 number=1, repeat=repeat))
+        print("{0}: {1} rows  fast {2:.3f} s  genfromtxt {3:.3f} s  "
+              "speedup x{4:.1f}".format(filename, nrows, fast, slow,
+                                        slow / fast))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
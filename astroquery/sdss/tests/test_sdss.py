@@ -4,11 +4,15 @@ from ...utils.testing_tools import MockResponse
 from ...exceptions import TimeoutError
 from ...utils import commons
 from astropy import coordinates
+from astropy import units as u
+from astropy.table import Table
 from astropy.tests.helper import pytest
 from contextlib import contextmanager
 import requests
 import os
 import socket
+import re
+import numpy as np
 try:
     from urllib2 import URLError
 except ImportError:
@@ -110,10 +114,32 @@ def test_sdss_image_coord(patch_get, patch_get_readable_fileobj, coord=coords):
     img = sdss.core.SDSS.get_images(coords)
 
 
-def test_sdss_template(patch_get, patch_get_readable_fileobj):
+def test_sdss_template(patch_get, patch_get_readable_fileobj, tmpdir):
+    patch_get_readable_fileobj.setattr(sdss.core.SDSS, 'TEMPLATE_DIR',
+                                       str(tmpdir))
     template = sdss.core.SDSS.get_spectral_template('qso')
 
 
+def test_sdss_template_cache(request, tmpdir):
+    targets = []
+
+    @contextmanager
+    def get_readable_fileobj_mockreturn(filename, **kwargs):
+        targets.append(filename)
+        yield open(data_path(DATA_FILES['spectra']), 'rb')
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(commons, 'get_readable_fileobj', get_readable_fileobj_mockreturn)
+    mp.setattr(sdss.core.SDSS, 'TEMPLATE_DIR', str(tmpdir))
+    templates = sdss.core.SDSS.get_spectral_template('galaxy')
+    assert len(templates) == 3
+    # all the templates are fetched at once, each a single time
+    assert len(targets) == len(set(targets)) == 33
+    assert len(tmpdir.listdir()) == 33
+    templates = sdss.core.SDSS.get_spectral_template('all')
+    assert len(templates) == 33
+    assert len(targets) == 33
+
+
 def test_sdss_specobj(patch_get):
     xid = sdss.core.SDSS.query_specobj(plate=2340)
 
@@ -135,3 +161,186 @@ def test_spectra_timeout(patch_get, patch_get_readable_fileobj_slow):
 def test_images_timeout(patch_get, patch_get_readable_fileobj_slow):
     with pytest.raises(TimeoutError):
         img = sdss.core.SDSS.get_images(run=1904, camcol=3, field=164)
+
+
+@pytest.mark.parametrize(('filename'), ['xid_im.txt', 'xid_sp.txt'])
+def test_parse_csv_fast(filename):
+    content = open(data_path(filename), 'rb').read()
+    fast = sdss.core._parse_csv_fast(content)
+    slow = sdss.core._parse_csv_genfromtxt(content)
+    assert fast.colnames == slow.colnames
+    assert len(fast) == len(slow)
+    for name in ['ra', 'dec', 'objid', 'run', 'rerun', 'camcol', 'field']:
+        assert list(fast[name]) == list(slow[name])
+    assert fast['objid'].dtype.kind == 'i'
+
+
+def test_parse_csv_fast_fallback():
+    # unknown columns are left to genfromtxt
+    content = b'#Table1\nra,dec,petroMag_r\n2.0,14.8,17.5\n'
+    assert sdss.core._parse_csv_fast(content) is None
+    result = sdss.core.SDSS._parse_result(MockResponse(content))
+    assert list(result['petroMag_r']) == [17.5]
+    # so are empty results
+    assert sdss.core._parse_csv_fast(b'#Table1\nra,dec\n') is None
+
+
+PAGED_ROWS = [dict(ra=2.0 + 0.001 * i, dec=14.8, objid=1237653651835781000 + i,
+                   run=1904, rerun=301, camcol=3, field=163)
+              for i in range(25)]
+
+
+def get_pages_mockreturn(url, params=None, timeout=10, **kwargs):
+    # serves PAGED_ROWS according to the keyset conditions of the query
+    sql = params['cmd']
+    if sql.startswith('SELECT COUNT(*)'):
+        return MockResponse('#Table1\nn\n{0}\n'.format(len(PAGED_ROWS)))
+    top = re.search(r'TOP (\d+) (\S+) FROM', sql)
+    columns = [column.split('.')[1] for column in top.group(2).split(',')]
+    rows = PAGED_ROWS
+    after = re.search(r'p\.objid > (\d+)', sql)
+    if after:
+        rows = [row for row in rows if row['objid'] > int(after.group(1))]
+    lines = ['#Table1', ','.join(columns)]
+    lines += [','.join([str(row[column]) for column in columns])
+              for row in rows[:int(top.group(1))]]
+    return MockResponse('\n'.join(lines) + '\n')
+
+
+@pytest.fixture
+def patch_get_pages(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'get', get_pages_mockreturn)
+    return mp
+
+
+def test_keyset_page_sql():
+    sql = sdss.core.SDSS._args_to_payload(run=1904, spectro=True)['cmd']
+    page_sql = sdss.core._keyset_page_sql(sql, ['p.objid', 's.specobjid'], [5, 7], 100)
+    assert page_sql.startswith('SELECT DISTINCT TOP 100 ')
+    assert page_sql.endswith('AND ((p.objid > 5) OR (p.objid = 5 AND s.specobjid > 7)) '
+                             'ORDER BY p.objid,s.specobjid')
+    with pytest.raises(ValueError):
+        sdss.core._keyset_page_sql('SELECT DISTINCT p.ra FROM PhotoObjAll AS p',
+                                   ['p.objid'], None, 100)
+
+
+def test_iter_query_pages(patch_get_pages):
+    pages = list(sdss.core.SDSS.iter_query_pages(run=1904, page_size=10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    objids = [objid for page in pages for objid in page['objid']]
+    assert objids == [row['objid'] for row in PAGED_ROWS]
+    # the key is not returned when it was not requested
+    pages = list(sdss.core.SDSS.iter_query_pages(run=1904, fields=['ra', 'dec'],
+                                                 page_size=5))
+    assert len(pages) == 5
+    assert pages[0].colnames == ['ra', 'dec']
+    # the rows repeating the requested values across pages are dropped,
+    # as by the DISTINCT of the unpaginated query
+    pages = list(sdss.core.SDSS.iter_query_pages(run=1904, fields=['run', 'camcol'],
+                                                 page_size=10))
+    assert len(pages) == 1
+    assert pages[0].colnames == ['run', 'camcol']
+    assert len(pages[0]) == 1
+
+
+def test_query_paginated(patch_get_pages):
+    result = sdss.core.SDSS.query_paginated(run=1904, page_size=10)
+    assert len(result) == 25
+    assert list(result['objid']) == [row['objid'] for row in PAGED_ROWS]
+
+
+def post_crossid_mockreturn(url, data=None, timeout=10, **kwargs):
+    # every position matches an object at its own coordinates, the odd
+    # ones twice (e.g. an object with two spectra)
+    values = re.search(r'VALUES (.*?) AS q', data['cmd']).group(1)
+    lines = ['#Table1', 'input_index,ra,dec,objid,run,rerun,camcol,field,distance']
+    for index, ra, dec in re.findall(r'\((\d+),([-\d.]+),([-\d.]+)\)', values):
+        for copy in range(1 + int(index) % 2):
+            lines.append('{0},{1},{2},{3},1904,301,3,163,{4}'.format(
+                index, ra, dec, 1237653651835781000 + int(index), 0.01 * (2 - copy)))
+    return MockResponse('\n'.join(lines) + '\n')
+
+
+def test_query_crossid_payload():
+    targets = Table([[10., 20., 30.], [-1., 0., 1.]], names=['ra', 'dec'])
+    payloads = sdss.core.SDSS.query_crossid(targets, radius=2 * u.arcsec,
+                                            chunk_size=2, get_query_payload=True)
+    assert len(payloads) == 2
+    sql = payloads[0]['cmd']
+    assert 'VALUES (0,10.0000000000,-1.0000000000),(1,20.0000000000,0.0000000000)' in sql
+    assert 'dbo.fGetNearbyObjEq(q.ra, q.dec, 0.0333' in sql
+    assert 'TOP 1' in sql
+
+
+def test_query_crossid(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_crossid_mockreturn)
+    # the long SQL of the chunks is never sent in a URL
+    mp.setattr(requests, 'get', None)
+    targets = Table([[2.0 + i for i in range(7)], [14.8 - i for i in range(7)]],
+                    names=['ra', 'dec'])
+    result = sdss.core.SDSS.query_crossid(targets, chunk_size=3)
+    assert list(result['input_index']) == list(range(7))
+    assert list(result['ra']) == list(targets['ra'])
+    # the nearest of the duplicated matches is kept
+    np.testing.assert_allclose(result['distance'], [0.02, 0.01] * 3 + [0.02])
+
+
+def test_sdss_image_dedupe(patch_get, request, coords=coords):
+    targets = []
+
+    @contextmanager
+    def get_readable_fileobj_mockreturn(filename, **kwargs):
+        targets.append(filename)
+        yield open(data_path(DATA_FILES['images']), 'rb')
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(commons, 'get_readable_fileobj', get_readable_fileobj_mockreturn)
+    xid = sdss.core.SDSS.query_region(coords)
+    frames = set([(row['run'], row['camcol'], row['field']) for row in xid])
+    imgs = sdss.core.SDSS.get_images(matches=xid, band='gr')
+    assert len(imgs) == 2 * len(xid)
+    assert len(targets) == len(set(targets)) == 2 * len(frames)
+    images = sdss.core.SDSS.get_images_by_match(xid, band='gr')
+    assert list(images.keys()) == list(range(len(xid)))
+    assert list(images[0].keys()) == ['g', 'r']
+    # rows on the same frame share the same HDUList
+    same_frame = [index for index, row in enumerate(xid)
+                  if (row['run'], row['camcol'], row['field']) ==
+                  (xid[0]['run'], xid[0]['camcol'], xid[0]['field'])]
+    assert len(same_frame) > 1
+    assert images[same_frame[1]]['g'] is images[same_frame[0]]['g']
+
+
+def test_sdss_spectra_stack(patch_get, request, tmpdir):
+    from astropy.io import fits
+    coadd = np.zeros(100, dtype=[('flux', 'f4'), ('loglam', 'f4'),
+                                 ('ivar', 'f4'), ('and_mask', 'i4')])
+    coadd['loglam'] = 3.6 + 1e-4 * np.arange(100)
+    coadd['flux'] = np.arange(100)
+    coadd['ivar'] = 1
+    filename = str(tmpdir.join('spec.fits'))
+    fits.HDUList([fits.PrimaryHDU(),
+                  fits.BinTableHDU(coadd)]).writeto(filename)
+
+    @contextmanager
+    def get_readable_fileobj_mockreturn(filename_, **kwargs):
+        yield open(filename, 'rb')
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(commons, 'get_readable_fileobj', get_readable_fileobj_mockreturn)
+    xid = sdss.core.SDSS.query_region(coords, spectro=True)
+    stack = sdss.core.SDSS.get_spectra_stack(matches=xid, loglam_min=3.59,
+                                             loglam_max=3.62,
+                                             memmap_dir=str(tmpdir))
+    assert stack.flux.shape == stack.ivar.shape == (len(xid), 301)
+    assert len(stack.loglam) == 301
+    np.testing.assert_allclose(stack.flux[0, 100:200], np.arange(100))
+    assert stack.flux[0, :100].sum() == stack.flux[0, 200:].sum() == 0
+    assert stack.ivar[0].sum() == 100
+    assert list(stack.index['plate']) == list(xid['plate'])
+    assert list(stack.index.colnames) == ['plate', 'mjd', 'fiberID']
+    saved = np.load(str(tmpdir.join('flux.npy')))
+    np.testing.assert_allclose(saved, stack.flux)
+    # the spectra are not resampled to another step
+    with pytest.raises(ValueError):
+        sdss.core.SDSS.get_spectra_stack(matches=xid, dloglam=2e-4)
@@ -4,9 +4,9 @@ import os
 import io
 import struct
 import requests
-from astropy.table import Table
 import astropy.io.fits as fits
-import numpy as np
+
+from ..utils.ipac import read_ipac_table
 
 
 __all__ = ['query', 'save_file', 'get_file']
@@ -129,22 +129,7 @@ def query(coord=None, ra=None, dec=None, size=None, naifid=None, pid=None,
         return response
     response.raise_for_status()
     # Parse output
-    # requests returns unicde strings, encode back to ascii
-    # because of '|foo|bar|' delimeters, remove first and last empty columns
-    raw_data = [line for line in response.text.split('\n')]
-    field_widths = [len(s) + 1 for s in raw_data[0].split('|')][1:-1]
-    col_names = [s.strip() for s in raw_data[0].split('|')][1:-1]
-    type_names = [s.strip() for s in raw_data[1].split('|')][1:-1]
-    cs = [0]+np.cumsum(field_widths).tolist()
-    def parse_line(line, cs=cs):
-        return [line[a:b] for a,b in zip(cs[:-1],cs[1:])]
-    data = [parse_line(row) for row in raw_data[4:-1]]
-    # Parse type names
-    dtypes = _map_dtypes(type_names, field_widths)
-    # To table
-    # transpose data for appropriate table instance handling
-    t = Table(zip(*data), names=col_names, dtypes=dtypes)
-    return t
+    return read_ipac_table(response.content)
 
 
 def save_file(url, out_dir='sha_tmp/', out_name=None):
@@ -230,32 +215,3 @@ def get_file(url):
     else:
         raise Exception('Unknown content type: {0}.'.format(content_type))
     return obj
-
-
-def _map_dtypes(type_names, field_widths):
-    """
-    Create dtype string based on column lengths and field type names.
-
-    Parameters
-    ----------
-    type_names : list
-        List of type names from file header
-    field_widths : list
-        List of field width values
-
-    Returns
-    -------
-    dtypes : list
-        List of dtype for each column in data
-    """
-    dtypes = []
-    for i, name in enumerate(type_names):
-        if name == 'int':
-            dtypes.append('i8')
-        elif name == 'double':
-            dtypes.append('f8')
-        elif name == 'char':
-            dtypes.append('a{0}'.format(field_widths[i]))
-        else:
-            raise ValueError('Unexpected type name: {0}.'.format(name))
-    return dtypes
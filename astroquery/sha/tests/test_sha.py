@@ -43,6 +43,9 @@ def patch_get(request):
 def test_pos_t(patch_get):
     # Example queries for SHA API help page
     pos_t = sha.query(ra=163.6136, dec=-11.784, size=0.5)
+    assert pos_t['reqkey'].dtype.kind == 'i'
+    assert pos_t['ra'].dtype.kind == 'f'
+    assert pos_t['modedisplayname'][0] == b'MIPS Scan'
 
 def test_nid_t(patch_get):
     nid_t = sha.query(naifid=2003226)
@@ -15,6 +15,14 @@ SIMBAD_TIMEOUT = ConfigurationItem('timeout', 60, 'time limit for connecting to
 # O defaults to the maximum limit
 ROW_LIMIT = ConfigurationItem('row_limit', 0, 'maximum number of rows that will be fetched from the result.')
 
-from .core import Simbad,SimbadClass
+OBJECTS_PER_QUERY = ConfigurationItem('objects_per_query', 500,
+                                      'maximum number of identifiers sent in '
+                                      'a single script by query_objects.')
 
-__all__ = ['Simbad','SimbadClass']
+POSITIONS_PER_QUERY = ConfigurationItem('positions_per_query', 200,
+                                        'maximum number of positions sent in '
+                                        'a single script by query_regions.')
+
+from .core import Simbad,SimbadClass,SimbadSettings
+
+__all__ = ['Simbad','SimbadClass','SimbadSettings']
@@ -7,24 +7,63 @@ import re
 import json
 import os
 from collections import namedtuple
-import tempfile
 import warnings
-from ..query import BaseQuery
+from ..query import BaseQuery, accepts_settings
 from ..utils.class_or_instance import property_class_or_instance
-from ..utils import commons
+from ..utils import commons, parallel, tilecache
+from ..utils.commons import ObjectError
+from ..extern.six import BytesIO
+import numpy as np
 import astropy.units as u
 from astropy.utils.data import get_pkg_data_filename
 import astropy.coordinates as coord
-from astropy.table import Table
+from astropy.table import Table, MaskedColumn, vstack
 import copy
 try:
     import astropy.io.vo.table as votable
 except ImportError:
     import astropy.io.votable as votable
-from . import SIMBAD_SERVER, SIMBAD_TIMEOUT, ROW_LIMIT
-from ..exceptions import TableParseError
-
-__all__ = ['Simbad','SimbadClass']
+from . import (SIMBAD_SERVER, SIMBAD_TIMEOUT, ROW_LIMIT, OBJECTS_PER_QUERY,
+               POSITIONS_PER_QUERY)
+from ..exceptions import TableParseError, RemoteServiceError
+
+__all__ = ['Simbad','SimbadClass','SimbadSettings']
+
+
+# columns of the TAP basic table corresponding to the VOTable fields (without
+# their options), used by the TAP queries
+tap_columns = {
+    'main_id': ['main_id'],
+    'coordinates': ['ra', 'dec', 'coo_err_maja', 'coo_err_mina',
+                    'coo_err_angle', 'coo_qual', 'coo_wavelength',
+                    'coo_bibcode'],
+    'ra': ['ra'], 'dec': ['dec'],
+    'coo_err_maja': ['coo_err_maja'], 'coo_err_mina': ['coo_err_mina'],
+    'coo_err_angle': ['coo_err_angle'], 'coo_qual': ['coo_qual'],
+    'coo_wavelength': ['coo_wavelength'], 'coo_bibcode': ['coo_bibcode'],
+    'otype': ['otype'],
+    'pm': ['pmra', 'pmdec', 'pm_err_maja', 'pm_err_mina', 'pm_err_angle',
+           'pm_qual', 'pm_bibcode'],
+    'pmra': ['pmra'], 'pmdec': ['pmdec'], 'pm_err_maja': ['pm_err_maja'],
+    'pm_err_mina': ['pm_err_mina'], 'pm_err_angle': ['pm_err_angle'],
+    'pm_qual': ['pm_qual'], 'pm_bibcode': ['pm_bibcode'],
+    'parallax': ['plx_value', 'plx_err', 'plx_qual', 'plx_bibcode'],
+    'plx': ['plx_value'], 'plx_error': ['plx_err'], 'plx_qual': ['plx_qual'],
+    'plx_bibcode': ['plx_bibcode'],
+    'velocity': ['rvz_type', 'rvz_radvel', 'rvz_err', 'rvz_qual',
+                 'rvz_wavelength', 'rvz_bibcode'],
+    'rv_value': ['rvz_radvel'], 'z_value': ['rvz_redshift'],
+    'rvz_type': ['rvz_type'], 'rvz_radvel': ['rvz_radvel'],
+    'rvz_error': ['rvz_err'], 'rvz_qual': ['rvz_qual'],
+    'rvz_wavelength': ['rvz_wavelength'], 'rvz_bibcode': ['rvz_bibcode'],
+    'sp': ['sp_type'], 'sp_qual': ['sp_qual'], 'sp_bibcode': ['sp_bibcode'],
+    'morphtype': ['morph_type', 'morph_qual', 'morph_bibcode'],
+    'dimensions': ['galdim_majaxis', 'galdim_minaxis', 'galdim_angle',
+                   'galdim_qual', 'galdim_wavelength', 'galdim_bibcode'],
+    'dim_majaxis': ['galdim_majaxis'], 'dim_minaxis': ['galdim_minaxis'],
+    'dim_angle': ['galdim_angle'], 'dim_qual': ['galdim_qual'],
+    'dim_wavelength': ['galdim_wavelength'], 'dim_bibcode': ['galdim_bibcode'],
+}
 
 
 def validate_epoch(func):
@@ -82,11 +121,62 @@ def strip_field(f, keep_filters=False):
     # the overall else (default option)
     return f
 
+def _add_votable_fields(fields, new_fields):
+    """
+    Returns a new list of VOTable fields with ``new_fields`` appended to
+    ``fields``, after checking that they exist and are not already present.
+    """
+    dict_file = get_pkg_data_filename(os.path.join('data', 'votable_fields_dict.json'))
+
+    with open(dict_file, "r") as f:
+        fields_dict = json.load(f)
+        fields_dict = dict(
+                           ((strip_field(f) if '(' in f else f, fields_dict[f])
+                            for f in fields_dict)
+                           )
+    fields = list(fields)
+    for field in new_fields:
+        sf = strip_field(field)
+        if sf not in fields_dict:
+            raise KeyError("{field}: no such field".format(field=field))
+        elif sf in [strip_field(f,keep_filters=True) for f in fields]:
+            errmsg = "{field}: field already present.  ".format(field=field)
+            errmsg += ("Fields ra,dec,id,otype, and bibcodelist can only "
+                       "be specified once.  To change their options, "
+                       "first remove the existing entry, then add a new "
+                       "one.")
+            raise KeyError(errmsg)
+        else:
+            fields.append(field)
+    return fields
+
+
+class SimbadSettings(namedtuple('SimbadSettings',
+                                ('votable_fields', 'row_limit', 'timeout'))):
+    """
+    Immutable settings of the SIMBAD queries. They can be passed to the query
+    methods of `SimbadClass` with the ``settings`` keyword, instead of
+    configuring the shared `Simbad` instance, which is then safe to use from
+    several threads. Use `SimbadClass.get_settings` to get the settings of an
+    instance, and `add_votable_fields` or ``_replace`` to derive new ones.
+    """
+    __slots__ = ()
+
+    def add_votable_fields(self, *args):
+        """
+        Returns new settings with the VOTable fields added (see
+        `SimbadClass.add_votable_fields`).
+        """
+        return self._replace(votable_fields=tuple(
+            _add_votable_fields(self.votable_fields, args)))
+
+
 class SimbadClass(BaseQuery):
     """
     The class for querying the Simbad web service.
     """
     SIMBAD_URL = 'http://' + SIMBAD_SERVER() + '/simbad/sim-script'
+    TAP_URL = 'http://' + SIMBAD_SERVER() + '/simbad/sim-tap/sync'
     TIMEOUT = SIMBAD_TIMEOUT()
     WILDCARDS = {
                 '*': 'Any string of characters (including an empty one)',
@@ -110,6 +200,8 @@ class SimbadClass(BaseQuery):
     }
 
     ROW_LIMIT = ROW_LIMIT()
+    OBJECTS_PER_QUERY = OBJECTS_PER_QUERY()
+    POSITIONS_PER_QUERY = POSITIONS_PER_QUERY()
 
     # also find a way to fetch the votable fields table from <http://simbad.u-strasbg.fr/simbad/sim-help?Page=sim-fscript#VotableFields>
     # tried something for this in this ipython nb
@@ -119,6 +211,33 @@ class SimbadClass(BaseQuery):
     def __init__(self):
         self._VOTABLE_FIELDS = copy.copy(self._VOTABLE_FIELDS)
 
+    def get_settings(self):
+        """
+        Returns the current VOTable fields, row limit and timeout as an
+        immutable `SimbadSettings`, which can be passed to the queries with
+        the ``settings`` keyword.
+
+        Examples
+        --------
+        >>> from astroquery.simbad import Simbad
+        >>> settings = Simbad.get_settings().add_votable_fields('otype')
+        >>> settings = settings._replace(row_limit=10)
+        >>> result = Simbad.query_object('m1', settings=settings)
+        """
+        return SimbadSettings(tuple(self._VOTABLE_FIELDS), self.ROW_LIMIT,
+                              self.TIMEOUT)
+
+    def _from_settings(self, settings):
+        """ Returns a new instance configured from a `SimbadSettings` """
+        instance = self.__class__()
+        for name in ('SIMBAD_URL', 'TAP_URL', 'OBJECTS_PER_QUERY',
+                     'POSITIONS_PER_QUERY'):
+            setattr(instance, name, getattr(self, name))
+        instance._VOTABLE_FIELDS = list(settings.votable_fields)
+        instance.ROW_LIMIT = settings.row_limit
+        instance.TIMEOUT = settings.timeout
+        return instance
+
     def list_wildcards(self):
         """
         Displays the available wildcards that may be used in Simbad queries and
@@ -217,27 +336,9 @@ class SimbadClass(BaseQuery):
         ----------
         list of field_names
         """
-        dict_file = get_pkg_data_filename(os.path.join('data', 'votable_fields_dict.json'))
-
-        with open(dict_file, "r") as f:
-            fields_dict = json.load(f)
-            fields_dict = dict(
-                               ((strip_field(f) if '(' in f else f, fields_dict[f])
-                                for f in fields_dict)
-                               )
-        for field in args:
-            sf = strip_field(field)
-            if sf not in fields_dict:
-                raise KeyError("{field}: no such field".format(field=field))
-            elif sf in [strip_field(f,keep_filters=True) for f in Simbad._VOTABLE_FIELDS]:
-                errmsg = "{field}: field already present.  ".format(field=field)
-                errmsg += ("Fields ra,dec,id,otype, and bibcodelist can only "
-                           "be specified once.  To change their options, "
-                           "first remove the existing entry, then add a new "
-                           "one.")
-                raise KeyError(errmsg)
-            else:
-                self._VOTABLE_FIELDS.append(field)
+        # the new list replaces the current one at once, so that other
+        # threads never see a partially updated list
+        self._VOTABLE_FIELDS = _add_votable_fields(self._VOTABLE_FIELDS, args)
 
     def remove_votable_fields(self, *args, **kwargs):
         """
@@ -260,9 +361,11 @@ class SimbadClass(BaseQuery):
             sfields = self._VOTABLE_FIELDS
         absent_fields = set(sargs) - set(sfields)
 
+        fields = list(self._VOTABLE_FIELDS)
         for b,f in list(zip(sfields, self._VOTABLE_FIELDS)):
             if b in sargs:
-                self._VOTABLE_FIELDS.remove(f)
+                fields.remove(f)
+        self._VOTABLE_FIELDS = fields
 
         for field in absent_fields:
             warnings.warn("{field}: this field is not set".format(field=field))
@@ -278,6 +381,7 @@ class SimbadClass(BaseQuery):
         """
         self._VOTABLE_FIELDS = ['main_id', 'coordinates']
 
+    @accepts_settings
     def query_criteria(self, *args, **kwargs):
         """
         Query SIMBAD based on any criteria.
@@ -290,6 +394,13 @@ class SimbadClass(BaseQuery):
         kwargs:
             Keyword / value pairs passed to SIMBAD's script engine
             (e.g., {'otype':'SNR'} will be rendered as otype=SNR)
+        stripes : int, optional
+            If larger than 1, the sky is split in this number of declination
+            stripes containing about the same area, and one script per stripe
+            is run concurrently (see `query_catalog`). Defaults to 1.
+        max_workers : int, optional
+            Maximum number of stripes queried simultaneously. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
 
         Returns
         -------
@@ -297,9 +408,15 @@ class SimbadClass(BaseQuery):
             The results of the query as an `astropy.table.Table`.
         """
         verbose = kwargs.pop('verbose') if 'verbose' in kwargs else False
+        stripes = kwargs.pop('stripes') if 'stripes' in kwargs else 1
+        max_workers = kwargs.pop('max_workers') if 'max_workers' in kwargs else None
+        if stripes > 1:
+            return self._query_stripes(list(args), kwargs, stripes,
+                                       max_workers, verbose)
         result = self.query_criteria_async(*args,**kwargs)
         return self._parse_result(result, verbose=verbose)
 
+    @accepts_settings
     def query_criteria_async(self, *args, **kwargs):
         """
         Query SIMBAD based on any criteria.
@@ -323,6 +440,7 @@ class SimbadClass(BaseQuery):
                                 self.TIMEOUT)
         return response
 
+    @accepts_settings
     def query_object(self, object_name, wildcard=False, verbose=False):
         """
         Queries Simbad for the given object and returns the result as an
@@ -345,6 +463,7 @@ class SimbadClass(BaseQuery):
         result = self.query_object_async(object_name, wildcard=wildcard)
         return self._parse_result(result, verbose=verbose)
 
+    @accepts_settings
     def query_object_async(self, object_name, wildcard=False):
         """
         Serves the same function as `astoquery.simbad.Simbad.query_object`, but
@@ -370,26 +489,82 @@ class SimbadClass(BaseQuery):
         return response
 
 
-    def query_objects(self, object_names, wildcard=False, verbose=False):
+    @accepts_settings
+    def query_objects(self, object_names, wildcard=False, verbose=False,
+                      chunk_size=None, max_workers=None):
         """
         Queries Simbad for the specified list of objects and returns the results
         as an `astropy.table.Table`. Object names may be specified with
         wildcards if desired.
 
+        The names are sent in scripts of at most ``chunk_size`` identifiers,
+        which are run concurrently, and the results are concatenated in the
+        order of ``object_names``.
+
         Parameters
         ----------
         object_names : sequence of strs
             names of objects to be queried
         wildcard : boolean, optional
             When `True`, the names may have wildcards in them.
+        chunk_size : int, optional
+            Maximum number of names per script. Defaults to
+            `astroquery.simbad.OBJECTS_PER_QUERY`.
+        max_workers : int, optional
+            Maximum number of scripts run simultaneously. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
 
         Returns
         -------
         `astropy.table.Table`
-            The results of the query as an `astropy.table.Table`.
+            The results of the query as an `astropy.table.Table`, or `None`
+            if no object was found. The ``INPUT_INDEX`` column gives the
+            position in ``object_names`` of the name of each row, found from
+            the identifier typed for the row (the ``typed_id`` VOTable field,
+            requested for this and removed unless it was among the VOTable
+            fields). It is masked, with a warning, for the rows that cannot
+            be mapped. The ``errors`` attribute of the table is a list of
+            ``ObjectError(index, name, msg)`` for the names that were
+            rejected by SIMBAD.
         """
-        return self.query_object('\n'.join(object_names), wildcard)
+        object_names = list(object_names)
+        if chunk_size is None:
+            chunk_size = self.OBJECTS_PER_QUERY
+        if not verbose:
+            commons.suppress_vo_warnings()
+        typed_id = 'typed_id' in self.get_votable_fields()
+        query = self
+        if not typed_id:
+            query = self._from_settings(
+                self.get_settings().add_votable_fields('typed_id'))
+
+        def query_chunk(start):
+            names = object_names[start:start + chunk_size]
+            request_payload = query._args_to_payload('\n'.join(names),
+                                                     wildcard=wildcard,
+                                                     caller='query_object_async')
+            response = commons.send_request(query.SIMBAD_URL, request_payload,
+                                            query.TIMEOUT)
+            table, errors = _parse_objects_result(response,
+                                                  request_payload['script'],
+                                                  names, start, wildcard)
+            if (table is not None and not typed_id and
+                    'TYPED_ID' in table.colnames):
+                table.remove_column('TYPED_ID')
+            return table, errors
+
+        results = parallel.parallel_map(query_chunk,
+                                        range(0, len(object_names), chunk_size),
+                                        max_workers=max_workers)
+        tables = [table for table, errors in results if table is not None]
+        errors = [error for table, errors in results for error in errors]
+        if len(tables) == 0:
+            return None
+        result = tables[0] if len(tables) == 1 else vstack(tables)
+        result.errors = errors
+        return result
 
+    @accepts_settings
     def query_objects_async(self, object_names, wildcard=False):
         """
         Same as `astoquery.simbad.Simbad.query_objects`, but
@@ -409,6 +584,7 @@ class SimbadClass(BaseQuery):
         """
         return self.query_object_async('\n'.join(object_names), wildcard)
 
+    @accepts_settings
     def query_region(self, coordinates, radius=None,
                      equinox=None, epoch=None, verbose=False):
         """
@@ -440,6 +616,7 @@ class SimbadClass(BaseQuery):
                                         equinox=equinox, epoch=epoch)
         return self._parse_result(result, verbose=verbose)
 
+    @accepts_settings
     def query_region_async(self, coordinates, radius=None, equinox=None,
                            epoch=None):
         """
@@ -472,24 +649,116 @@ class SimbadClass(BaseQuery):
                                 self.TIMEOUT)
         return response
 
-    def query_catalog(self, catalog, verbose=False):
+    @accepts_settings
+    def query_regions(self, coordinates, radius, chunk_size=None,
+                      max_workers=None, verbose=False):
+        """
+        Queries around many positions at once. The positions are sent as
+        ``query coo`` commands in scripts of at most ``chunk_size`` positions,
+        which are run concurrently, and the rows of every script are split
+        back to the positions they are close to.
+
+        Parameters
+        ----------
+        coordinates : `astropy.coordinates` or `astropy.table.Table`
+            The positions, either as a coordinates object holding an array of
+            positions or as a table with ``ra`` and ``dec`` columns (in
+            degrees unless the columns have units).
+        radius : str/`astropy.units.Quantity`
+            the radius of the regions.
+        chunk_size : int, optional
+            Maximum number of positions per script. Defaults to
+            `astroquery.simbad.POSITIONS_PER_QUERY`.
+        max_workers : int, optional
+            Maximum number of scripts run simultaneously. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+
+        Returns
+        -------
+        `RegionTables`
+            A list of one table per position, `None` where no object was
+            found. The rows of objects close to several positions appear once
+            in each of their tables. The ``errors`` attribute is a list of
+            ``ObjectError(index, name, msg)`` for the positions rejected by
+            SIMBAD, named by their decimal coordinates.
+        """
+        ra, dec = commons.coord_array_to_radec(coordinates)
+        if chunk_size is None:
+            chunk_size = self.POSITIONS_PER_QUERY
+        radius_deg = commons.radius_to_unit(radius, 'degree')
+        # the decimal positions of the rows are needed to split the results
+        fields = self.get_votable_fields()
+        extra_fields = []
+        if not ('ra(d)' in fields and 'dec(d)' in fields):
+            if [f for f in fields if strip_field(f) in ('ra', 'dec')]:
+                raise ValueError("query_regions needs the 'ra(d)' and "
+                                 "'dec(d)' VOTable fields; remove the other "
+                                 "ra and dec fields first.")
+            extra_fields = ['ra(d)', 'dec(d)']
+        # vectorized formatting of the query coo commands
+        commands = np.char.add(np.char.mod('query coo %.8f', ra),
+                               np.char.mod(' %+.8f radius=' +
+                                           _parse_radius(radius) +
+                                           ' frame=ICRS', dec)).tolist()
+        if not verbose:
+            commons.suppress_vo_warnings()
+
+        def query_chunk(start):
+            script = "\n".join([
+                "set limit " + str(self.ROW_LIMIT) if self.ROW_LIMIT > 0 else "",
+                "votable {" + ','.join(fields + extra_fields) + "}",
+                "votable open"] + commands[start:start + chunk_size] +
+                ["votable close"])
+            response = commons.send_request(self.SIMBAD_URL,
+                                            dict(script=script), self.TIMEOUT)
+            return _split_regions_result(response, script,
+                                         ra[start:start + chunk_size],
+                                         dec[start:start + chunk_size],
+                                         radius_deg, extra_fields, start)
+
+        results = parallel.parallel_map(query_chunk,
+                                        range(0, len(commands), chunk_size),
+                                        max_workers=max_workers)
+        return RegionTables([table for chunk, errors in results
+                             for table in chunk],
+                            [error for chunk, errors in results for error in errors])
+
+    @accepts_settings
+    def query_catalog(self, catalog, verbose=False, stripes=1,
+                      max_workers=None):
         """
         Queries a whole catalog. Results may be very large -number of rows
         should be controlled by configuring `astroquery.simbad.ROW_LIMIT`.
 
+        Large catalogs can be retrieved in pages: with ``stripes`` larger
+        than 1, the sky is split in declination stripes containing about the
+        same area, and a ``query sample`` script restricted to each stripe is
+        run concurrently. The results are concatenated from south to north.
+        ``ROW_LIMIT`` then applies to every stripe, and objects without
+        coordinates are not returned.
+
         Parameters
         ----------
         catalog : str
             the name of the catalog.
+        stripes : int, optional
+            Number of declination stripes. Defaults to 1, a single script.
+        max_workers : int, optional
+            Maximum number of stripes queried simultaneously. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
 
         Returns
         -------
         `astropy.table.Table`
             The results of the query as an `astropy.table.Table`.
         """
+        if stripes > 1:
+            return self._query_stripes(["cat='{0}'".format(catalog)], {},
+                                       stripes, max_workers, verbose)
         result = self.query_catalog_async(catalog)
         return self._parse_result(result, verbose=verbose)
 
+    @accepts_settings
     def query_catalog_async(self, catalog):
         """
         Serves the same function as `astoquery.simbad.Simbad.query_catalog`, but
@@ -512,6 +781,38 @@ class SimbadClass(BaseQuery):
                                 self.TIMEOUT)
         return response
 
+    def _query_stripes(self, args, kwargs, stripes, max_workers, verbose):
+        """
+        Runs a ``query sample`` script on the criteria ``args`` and
+        ``kwargs`` (see `query_criteria`) for each declination stripe, and
+        stacks the results.
+        """
+        # equal-area stripes: uniform in sin(dec)
+        bounds = np.degrees(np.arcsin(np.linspace(-1, 1, stripes + 1)))
+        if not verbose:
+            commons.suppress_vo_warnings()
+
+        def query_stripe(index):
+            # the northernmost stripe includes the pole
+            stripe = "dec >= {0:.6f} & dec {1} {2:.6f}".format(
+                bounds[index], '<=' if index == stripes - 1 else '<',
+                bounds[index + 1])
+            request_payload = self._args_to_payload(
+                *(args + [stripe]), caller='query_criteria_async', **kwargs)
+            response = commons.send_request(self.SIMBAD_URL, request_payload,
+                                            self.TIMEOUT)
+            return _parse_sample_result(response)
+
+        results = parallel.parallel_map(query_stripe, range(stripes),
+                                        max_workers=max_workers)
+        tables = [table for table, errors in results if table is not None]
+        if len(tables) == 0:
+            return None
+        result = tables[0] if len(tables) == 1 else vstack(tables)
+        result.errors = [error for table, errors in results for error in errors]
+        return result
+
+    @accepts_settings
     def query_bibobj(self, bibcode, verbose=False):
         """
         Query all the objects that are contained in the article specified by
@@ -531,6 +832,7 @@ class SimbadClass(BaseQuery):
         result = self.query_bibobj_async(bibcode)
         return self._parse_result(result, verbose=verbose)
 
+    @accepts_settings
     def query_bibobj_async(self, bibcode):
         """
         Serves the same function as `astoquery.simbad.Simbad.query_bibobj`, but
@@ -553,6 +855,7 @@ class SimbadClass(BaseQuery):
                                 self.TIMEOUT)
         return response
 
+    @accepts_settings
     def query_bibcode(self, bibcode, wildcard=False, verbose=False):
         """
         Queries the references corresponding to a given bibcode, and returns
@@ -576,6 +879,7 @@ class SimbadClass(BaseQuery):
         result = self.query_bibcode_async(bibcode, wildcard=wildcard)
         return self._parse_result(result, verbose=verbose)
 
+    @accepts_settings
     def query_bibcode_async(self, bibcode, wildcard=False):
         """
         Serves the same function as `astoquery.simbad.Simbad.query_bibcode`, but
@@ -601,6 +905,153 @@ class SimbadClass(BaseQuery):
                                         self.TIMEOUT)
         return response
 
+    @accepts_settings
+    def iter_query_bibcode(self, bibcode, wildcard=False):
+        """
+        Same as `astroquery.simbad.Simbad.query_bibcode`, but yields the
+        references one by one instead of building a table, which is lighter
+        for wildcard queries with many results.
+
+        Parameters
+        ----------
+        bibcode : str
+            the bibcode of the article
+        wildcard : boolean, optional
+            When it is set to `True` it implies that the object is specified
+            with wildcards. Defaults to `False`.
+
+        Returns
+        -------
+        generator of str
+            The references.
+        """
+        response = self.query_bibcode_async(bibcode, wildcard=wildcard)
+        result = SimbadResult(response.content)
+        bibcode_match = bibcode_regex.search(result.script)
+        return _iter_bibcode_references(result.data, bibcode_match.group(2))
+
+    @accepts_settings
+    def query_tap(self, query, upload=None, upload_name='upload',
+                  verbose=False):
+        """
+        Runs an ADQL query on the SIMBAD TAP service (synchronously), and
+        returns the result as an `astropy.table.Table`.
+
+        Parameters
+        ----------
+        query : str
+            The ADQL query.
+        upload : `astropy.table.Table`, optional
+            A table sent along with the query as a VOTable, which the query
+            refers to as ``TAP_UPLOAD.<upload_name>``.
+        upload_name : str, optional
+            The name of the uploaded table. Defaults to ``upload``.
+
+        Returns
+        -------
+        `astropy.table.Table`
+            The results of the query as an `astropy.table.Table`.
+        """
+        request_payload = dict(REQUEST='doQuery', LANG='ADQL',
+                               FORMAT='votable', QUERY=query)
+        if self.ROW_LIMIT > 0:
+            request_payload['MAXREC'] = self.ROW_LIMIT
+        files = None
+        if upload is not None:
+            request_payload['UPLOAD'] = '{0},param:{0}'.format(upload_name)
+            files = {upload_name: (upload_name + '.xml',
+                                   _table_to_votable(upload))}
+        response = commons.send_request(self.TAP_URL, request_payload,
+                                        self.TIMEOUT, files=files)
+        return _parse_tap_result(response, verbose=verbose)
+
+    @accepts_settings
+    def query_objects_tap(self, object_names, verbose=False):
+        """
+        Queries many identifiers at once through the SIMBAD TAP service: the
+        names are uploaded as a VOTable and joined with the ``ident`` table in
+        a single query. The names must be written as in SIMBAD (e.g.
+        ``"M   1"`` rather than ``"m1"``), wildcards are not supported. The
+        columns returned are those of the VOTable fields (see
+        `get_votable_fields`) that have an equivalent in the TAP ``basic``
+        table.
+
+        Parameters
+        ----------
+        object_names : sequence of strs
+            names of objects to be queried
+
+        Returns
+        -------
+        `astropy.table.Table`
+            The results of the query, with an ``input_index`` column giving
+            the position in ``object_names`` of the name of each row.
+        """
+        upload = Table([np.arange(len(object_names)),
+                        np.array(list(object_names), dtype=bytes)],
+                       names=['input_index', 'id'])
+        query = ("SELECT u.input_index, {columns} "
+                 "FROM TAP_UPLOAD.upload AS u "
+                 "JOIN ident AS i ON i.id = u.id "
+                 "JOIN basic AS b ON b.oid = i.oidref "
+                 "ORDER BY u.input_index")
+        query = query.format(columns=', '.join(self._tap_columns()))
+        return self.query_tap(query, upload=upload, verbose=verbose)
+
+    @accepts_settings
+    def query_regions_tap(self, coordinates, radius, verbose=False):
+        """
+        Queries around many positions at once through the SIMBAD TAP service:
+        the positions are uploaded as a VOTable and crossmatched with the
+        ``basic`` table in a single query. The columns returned are those of
+        the VOTable fields (see `get_votable_fields`) that have an equivalent
+        in the TAP ``basic`` table.
+
+        Parameters
+        ----------
+        coordinates : `astropy.coordinates` or `astropy.table.Table`
+            The positions, either as a coordinates object holding an array of
+            positions or as a table with ``ra`` and ``dec`` columns (in
+            degrees unless the columns have units).
+        radius : str/`astropy.units.Quantity`
+            the radius of the regions.
+
+        Returns
+        -------
+        `astropy.table.Table`
+            The results of the query, sorted by position and distance, with
+            an ``input_index`` column giving the position in ``coordinates``
+            of the center of each match and its ``distance`` in degrees.
+        """
+        ra, dec = commons.coord_array_to_radec(coordinates)
+        upload = Table([np.arange(len(ra)), ra, dec],
+                       names=['input_index', 'ra', 'dec'])
+        query = ("SELECT u.input_index, "
+                 "DISTANCE(POINT('ICRS', u.ra, u.dec), "
+                 "POINT('ICRS', b.ra, b.dec)) AS distance, {columns} "
+                 "FROM TAP_UPLOAD.upload AS u "
+                 "JOIN basic AS b ON 1 = CONTAINS(POINT('ICRS', b.ra, b.dec), "
+                 "CIRCLE('ICRS', u.ra, u.dec, {radius:.10f})) "
+                 "ORDER BY u.input_index, distance")
+        query = query.format(columns=', '.join(self._tap_columns()),
+                             radius=commons.radius_to_unit(radius, 'degree'))
+        return self.query_tap(query, upload=upload, verbose=verbose)
+
+    def _tap_columns(self):
+        """
+        Returns the columns of the TAP ``basic`` table (as ``b.<column>``)
+        corresponding to the VOTable fields.
+        """
+        columns = []
+        for field in self.get_votable_fields():
+            name = strip_field(field)
+            if name not in tap_columns:
+                raise ValueError("{0}: this field has no equivalent in the "
+                                 "TAP basic table".format(field))
+            columns += ['b.' + column for column in tap_columns[name]
+                        if 'b.' + column not in columns]
+        return columns
+
     @validate_epoch
     @validate_equinox
     def _args_to_payload(self, *args, **kwargs):
@@ -654,7 +1105,7 @@ class SimbadClass(BaseQuery):
                 present_keys.append(k)
             # need ampersands to join args
             args_str = '&'.join([str(val) for val in args])
-            args_str += " & " if len(args) > 0 else ""
+            args_str += " & " if len(args) > 0 and len(present_keys) > 0 else ""
         else:
             args_str = ' '.join([str(val) for val in args])
         kwargs_str = ' '.join("{key}={value}".format(key=key, value=kwargs[key]) for
@@ -735,10 +1186,24 @@ def _parse_radius(radius):
     except (u.UnitsException, coord.errors.UnitsError, AttributeError):
         raise ValueError("Radius specified incorrectly")
 
+section_regex = re.compile(r'(?m)^::(?P<section>\w*):*[^\n]*$')
 error_regex = re.compile(r'(?ms)\[(?P<line>\d+)\]\s?(?P<msg>.+?)(\[|\Z)')
 bibcode_regex = re.compile(r'query\s+bibcode\s+(wildcard)?\s+([\w]*)')
 
 SimbadError = namedtuple('SimbadError', ('line', 'msg'))
+
+
+class RegionTables(list):
+    """
+    The list of tables returned by `SimbadClass.query_regions`, one per
+    position. The ``errors`` attribute is a list of `ObjectError` for the
+    positions rejected by SIMBAD.
+    """
+    def __init__(self, tables=(), errors=None):
+        super(RegionTables, self).__init__(tables)
+        self.errors = [] if errors is None else list(errors)
+
+
 VersionInfo = namedtuple('VersionInfo', ('major', 'minor', 'micro', 'patch'))
 
 
@@ -756,15 +1221,17 @@ class SimbadResult(object):
         self.__split_sections()
         self.__parse_console_section()
         self.__warn()
-        self.__file = None
 
     def __split_sections(self):
-        for section in self.__sections:
-            match = re.search(r'(?ims)^::%s:+?$(?P<content>.*?)(^::|\Z)' %
-                             section, self.__txt)
-            if match:
-                self.__indexes[section] = (match.start('content'),
-                              match.end('content'))
+        # a single pass over the text records where every section starts and
+        # ends; a section runs until the next line starting with '::'
+        headers = list(section_regex.finditer(self.__txt))
+        for header, next_header in zip(headers, headers[1:] + [None]):
+            section = header.group('section').lower()
+            if section in self.__sections and section not in self.__indexes:
+                end = (next_header.start() if next_header is not None
+                       else len(self.__txt))
+                self.__indexes[section] = (header.end(), end)
 
     def __parse_console_section(self):
         if self.console is None:
@@ -828,28 +1295,224 @@ class SimbadResult(object):
 
     @property
     def table(self):
-        if self.__file is None:
-            self.__file = tempfile.NamedTemporaryFile()
-            self.__file.write(self.data.encode('utf-8'))
-            self.__file.flush()
+        if self.__table is None:
             # if bibcode query then first create table from raw data
             bibcode_match = bibcode_regex.search(self.script)
             if bibcode_match:
                 self.__table = _create_bibcode_table(self.data, bibcode_match.group(2))
             else:
-                self.__table = votable.parse_single_table(self.__file, pedantic=False).to_table()
+                # parse the VOTable from memory rather than a temporary file
+                data = self.data
+                if not isinstance(data, bytes):
+                    data = data.encode('utf-8')
+                self.__table = votable.parse_single_table(BytesIO(data),
+                                                          pedantic=False).to_table()
         return self.__table
 
 Simbad = SimbadClass()
 
 
-def _create_bibcode_table(data, splitter):
-    ref_list = [splitter + ref for ref in data.split(splitter)][2:]
-    max_len = max([len(r) for r in ref_list])
-    table = Table(names=['References'], dtypes=['S%i' % max_len])
-    for ref in ref_list:
-        if hasattr(ref,'decode'):
-            table.add_row([ref.decode('utf-8')])
+def _table_to_votable(table):
+    """ Serializes a table as VOTable bytes """
+    output = BytesIO()
+    votable.from_table(table).to_xml(output)
+    return output.getvalue()
+
+
+def _parse_tap_result(response, verbose=False):
+    """
+    Parses the VOTable returned by a TAP query, raising
+    `~astroquery.exceptions.RemoteServiceError` if the query failed.
+    """
+    if not verbose:
+        commons.suppress_vo_warnings()
+    try:
+        result = votable.parse(BytesIO(response.content), pedantic=False)
+    except Exception as ex:
+        raise TableParseError("Failed to parse SIMBAD TAP result!\n"
+                              "Exception: " + str(ex))
+    infos = list(result.infos)
+    for resource in result.resources:
+        infos += list(resource.infos)
+    for info in infos:
+        if info.name == 'QUERY_STATUS' and info.value == 'ERROR':
+            raise RemoteServiceError("SIMBAD TAP query failed: " +
+                                     str(getattr(info, 'content', '')))
+    return result.get_first_table().to_table()
+
+
+def _parse_sample_result(response):
+    """
+    Parses the result of a ``query sample`` or ``query coo`` script. Returns
+    the table, or `None` if no object matched, and the list of
+    `SimbadError`.
+    """
+    result = SimbadResult(response.content)
+    try:
+        return result.table, result.errors
+    except Exception as ex:
+        if result.errors:
+            # SIMBAD does not write a table if no object matched
+            return None, result.errors
+        raise TableParseError("Failed to parse SIMBAD result!\n"
+                              "Exception: " + str(ex))
+
+
+def _split_regions_result(response, script, ra, dec, radius, extra_fields,
+                          start):
+    """
+    Splits the result of a script of ``query coo`` commands into one table
+    per position, using the ``RA_d`` and ``DEC_d`` columns of the rows. The
+    columns of ``extra_fields`` are removed afterwards. Returns the tables
+    and the list of `ObjectError` of the positions, the first of which is
+    at index ``start`` of the complete list of positions.
+    """
+    table, errors = _parse_sample_result(response)
+    names = ['{0:.6f} {1:+.6f}'.format(position_ra, position_dec)
+             for position_ra, position_dec in zip(ra, dec)]
+    errors = _object_errors(script, errors, names, start, command='query coo')
+    if table is None:
+        return [None] * len(ra), errors
+    # SIMBAD writes the rows of every query in the same table, so an object
+    # in several overlapping regions comes once per region
+    table = _unique_rows(table)
+    row_ra = np.asarray(table['RA_d'], dtype=float)
+    row_dec = np.asarray(table['DEC_d'], dtype=float)
+    if extra_fields:
+        table.remove_columns(['RA_d', 'DEC_d'])
+    tables = []
+    for position_ra, position_dec in zip(ra, dec):
+        mask = tilecache.region_mask(row_ra, row_dec, position_ra,
+                                     position_dec, radius=radius)
+        tables.append(table[mask] if mask.any() else None)
+    return tables, errors
+
+
+def _unique_rows(table):
+    """
+    The table without the rows repeating the ``MAIN_ID`` of an earlier row,
+    or the whole of an earlier row if there is no ``MAIN_ID`` column.
+    """
+    names = ['MAIN_ID'] if 'MAIN_ID' in table.colnames else table.colnames
+    seen = set()
+    keep = []
+    for index, key in enumerate(zip(*[np.asarray(table[name])
+                                      for name in names])):
+        if key not in seen:
+            seen.add(key)
+            keep.append(index)
+    if len(keep) == len(table):
+        return table
+    return table[keep]
+
+
+def _object_errors(script, errors, names, start, command='query id'):
+    """
+    Maps the errors of a ``query id`` script (or of the ``command`` lines of
+    another script) to `ObjectError`, using the position of the names in the
+    script. ``start`` is the index of the first name in the complete list of
+    names.
+    """
+    lines = script.split('\n')
+    # script line numbers start at 1
+    first_line = [i for i, line in enumerate(lines)
+                  if line.startswith(command)][0] + 1
+    result = []
+    for error in errors:
+        position = error.line - first_line
+        if 0 <= position < len(names):
+            result.append(ObjectError(start + position, names[position],
+                                      error.msg))
         else:
-            table.add_row([ref])
-    return table
+            result.append(ObjectError(None, None, error.msg))
+    return result
+
+
+def _parse_objects_result(response, script, names, start, wildcard):
+    """
+    Parses the result of a ``query id`` script on ``names`` and adds the
+    ``INPUT_INDEX`` column. Returns the table, or `None` if none of the names
+    was found, and the list of `ObjectError`.
+    """
+    try:
+        result = SimbadResult(response.content)
+        errors = _object_errors(script, result.errors, names, start)
+        failed = set([error.index for error in errors])
+        found = [start + i for i in range(len(names)) if start + i not in failed]
+        if len(found) == 0:
+            return None, errors
+        table = result.table
+    except Exception as ex:
+        raise TableParseError("Failed to parse SIMBAD result for the names "
+                              "{0} to {1}!\nException: {2}"
+                              .format(start, start + len(names) - 1, ex))
+    table.add_column(_input_index(table, names, start, found, wildcard))
+    return table, errors
+
+
+def _normalize_id(identifier):
+    """ An identifier with its blanks collapsed, in lower case """
+    if hasattr(identifier, 'decode'):
+        identifier = identifier.decode('utf-8')
+    return ' '.join(identifier.split()).lower()
+
+
+def _input_index(table, names, start, found, wildcard):
+    """
+    The ``INPUT_INDEX`` column of the result of a ``query id`` script. The
+    rows are mapped to ``names`` by their ``TYPED_ID``; without it, the rows
+    are taken in the order of the ``found`` names if there is one row per
+    name. The rows that cannot be mapped are masked, with a warning.
+    """
+    index = np.zeros(len(table), dtype=int)
+    mask = np.ones(len(table), dtype=bool)
+    if 'TYPED_ID' in table.colnames:
+        positions = {}
+        for i, name in enumerate(names):
+            positions.setdefault(_normalize_id(name), []).append(start + i)
+        # a name given several times gets its rows in turn
+        used = {}
+        for row, typed in enumerate(table['TYPED_ID']):
+            key = _normalize_id(typed)
+            if key in positions:
+                count = used.get(key, 0)
+                index[row] = positions[key][min(count, len(positions[key]) - 1)]
+                mask[row] = False
+                used[key] = count + 1
+    elif not wildcard and len(table) == len(found):
+        index[:] = found
+        mask[:] = False
+    if mask.any():
+        warnings.warn("{0} rows of the SIMBAD result for the names {1} to {2} "
+                      "could not be mapped to their names: their INPUT_INDEX "
+                      "is masked.".format(mask.sum(), start,
+                                          start + len(names) - 1))
+    return MaskedColumn(name='INPUT_INDEX', data=index, mask=mask)
+
+
+def _iter_bibcode_references(data, splitter):
+    """
+    Yields the references of the data section of a bibcode query, i.e. the
+    items of ``[splitter + ref for ref in data.split(splitter)][2:]``,
+    scanning the text instead of building the list.
+    """
+    if not splitter:
+        raise ValueError("empty separator")
+    start = data.find(splitter)
+    if start >= 0:
+        start = data.find(splitter, start + len(splitter))
+    while start >= 0:
+        end = data.find(splitter, start + len(splitter))
+        ref = data[start:end] if end >= 0 else data[start:]
+        if hasattr(ref, 'decode'):
+            ref = ref.decode('utf-8')
+        yield ref
+        start = end
+
+
+def _create_bibcode_table(data, splitter):
+    ref_list = list(_iter_bibcode_references(data, splitter))
+    max_len = max([len(r) for r in ref_list] + [1])
+    # build the column at once rather than adding the rows one by one
+    column = np.array(ref_list, dtype='S%i' % max_len)
+    return Table([column], names=['References'])
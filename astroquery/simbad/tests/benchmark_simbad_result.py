@@ -0,0 +1,59 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Compares the time taken by `~astroquery.simbad.core.SimbadResult` to split and
+parse large catalog and bibobj responses with the previous approach, which
+searched every section with its own regular expression and parsed the VOTable
+from a temporary file. The rows of the test data are repeated to build the
+input. Run with::
+
+    python -m astroquery.simbad.tests.benchmark_simbad_result [nrows]
+"""
+from __future__ import print_function
+import os
+import re
+import sys
+import tempfile
+import timeit
+
+from ..core import SimbadResult, votable
+from ...utils import commons
+
+
+def make_content(filename, nrows):
+    with open(filename, 'r') as f:
+        content = f.read()
+    rows = re.findall(r'(?m)^<TR>.*</TR>$', content)
+    rows = (rows * (nrows // len(rows) + 1))[:nrows]
+    start = content.index(rows[0])
+    end = content.rindex('</TR>') + len('</TR>')
+    return content[:start] + '\n'.join(rows) + content[end:]
+
+
+def legacy_parse(content):
+    sections = {}
+    for section in ('script', 'console', 'error', 'data'):
+        match = re.search(r'(?ims)^::%s:+?$(?P<content>.*?)(^::|\Z)' %
+                          section, content)
+        if match:
+            sections[section] = match.group('content').strip()
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(sections['data'].encode('utf-8'))
+        f.flush()
+        return votable.parse_single_table(f.name, pedantic=False).to_table()
+
+
+def main(nrows=100000, repeat=3):
+    commons.suppress_vo_warnings()
+    data_dir = os.path.join(os.path.dirname(__file__), 'data')
+    for filename in ('query_cat.data', 'query_bibobj.data'):
+        content = make_content(os.path.join(data_dir, filename), nrows)
+        new = min(timeit.repeat(lambda: SimbadResult(content).table,
+                                number=1, repeat=repeat))
+        old = min(timeit.repeat(lambda: legacy_parse(content),
+                                number=1, repeat=repeat))
+        print("{0}: {1} rows  single pass {2:.3f} s  previous {3:.3f} s  "
+              "speedup x{4:.2f}".format(filename, nrows, new, old, old / new))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
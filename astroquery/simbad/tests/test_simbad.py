@@ -6,9 +6,11 @@ from astropy.tests.helper import pytest
 import astropy.coordinates as coord
 import astropy.units as u
 from astropy.table import Table
+import numpy as np
 import sys
 import os
 import re
+import warnings
 import requests
 from ...exceptions import TableParseError
 from distutils.version import LooseVersion
@@ -334,3 +336,331 @@ def test_regression_votablesettings2():
     assert simbad.core.Simbad.get_votable_fields() == ['main_id', 'coordinates', 'fluxdata(J)', 'fluxdata(H)', 'fluxdata(K)']
     simbad.core.Simbad.remove_votable_fields('fluxdata',strip_params=True)
     assert simbad.core.Simbad.get_votable_fields() == ['main_id','coordinates']
+
+
+def post_objects_mockreturn(url, data, timeout, **kwargs):
+    # every name gets the m1 row, 'twin' gets two rows and 'bad' raises an
+    # error; the rows carry the typed identifier when it is requested
+    response = MockResponseSimbad(data['script'], **kwargs)
+    lines = data['script'].split('\n')
+    first = [i for i, line in enumerate(lines) if line.startswith('query id')][0]
+    last = lines.index('votable close')
+    names = [line.strip() for line in
+             [lines[first][len('query id'):]] + lines[first + 1:last]]
+    content = response.content
+    start = content.index('<TR>')
+    end = content.index('</TR>') + len('</TR>')
+    row = content[start:end]
+    typed_id = 'typed_id' in data['script']
+    if typed_id:
+        content = content.replace('<DATA>', '<FIELD ID="TYPED_ID" name="TYPED_ID" '
+                                  'datatype="char" arraysize="*"/>\n<DATA>')
+        start = content.index('<TR>')
+        end = content.index('</TR>') + len('</TR>')
+    rows = []
+    for name in names:
+        if name == 'bad':
+            continue
+        for copy in range(2 if name == 'twin' else 1):
+            rows.append(row.replace('</TR>', '<TD>{0}</TD></TR>'.format(name))
+                        if typed_id else row)
+    content = content[:start] + '\n'.join(rows) + content[end:]
+    errors = ["[{0}] Identifier not found in the database : bad".format(i + 1)
+              for i, line in enumerate(lines) if line.split()[-1:] == ['bad']]
+    if errors:
+        content = content.replace(
+            '::data::', '::error::::::\n\n' + '\n'.join(errors) +
+            '\n\n::data::')
+    response.content = content
+    return response
+
+
+def test_query_objects_chunks(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_objects_mockreturn)
+    result = simbad.core.Simbad.query_objects(['m1', 'bad', 'm1', 'm1'],
+                                              chunk_size=2)
+    assert isinstance(result, Table)
+    assert list(result['INPUT_INDEX']) == [0, 2, 3]
+    assert 'TYPED_ID' not in result.colnames
+    assert [(error.index, error.name) for error in result.errors] == [(1, 'bad')]
+    assert simbad.core.Simbad.query_objects(['bad'], chunk_size=2) is None
+    # the rows of a name matching two objects keep their input index
+    result = simbad.core.Simbad.query_objects(['m1', 'bad', 'twin', 'm1'],
+                                              chunk_size=2)
+    assert list(result['INPUT_INDEX']) == [0, 2, 2, 3]
+    assert not result['INPUT_INDEX'].mask.any()
+
+
+def test_input_index_fallback():
+    table = Table([['M 1', 'M 1', 'M 1']], names=['MAIN_ID'])
+    # one row per name found: the rows are in the order of the names
+    index = simbad.core._input_index(table, ['m1', 'bad', 'm2', 'm3'], 10,
+                                     [10, 12, 13], False)
+    assert list(index) == [10, 12, 13]
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always')
+        index = simbad.core._input_index(table, ['m1', 'm2'], 0, [0, 1], False)
+    assert index.mask.all()
+    assert 'INPUT_INDEX' in str(w[0].message)
+
+
+REGIONS_RESULT = """::script::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+{script}
+
+::console:::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+C.D.S.  -  SIMBAD4 rel 1.207  -  2013.06.28CEST05:56:24
+total execution time: 0.143 secs
+simbatch done
+
+::data::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+<?xml version="1.0" encoding="UTF-8"?>
+<VOTABLE xmlns="http://www.ivoa.net/xml/VOTable/v1.2" version="1.2">
+<RESOURCE name="Simbad query" type="results">
+<TABLE ID="SimbadScript" name="default">
+<FIELD ID="MAIN_ID" name="MAIN_ID" datatype="char" arraysize="*"/>
+<FIELD ID="RA_d" name="RA_d" datatype="double" unit="deg"/>
+<FIELD ID="DEC_d" name="DEC_d" datatype="double" unit="deg"/>
+<DATA><TABLEDATA>
+<TR><TD>near 0 and 1</TD><TD>10.0</TD><TD>20.0005</TD></TR>
+<TR><TD>near 2</TD><TD>200.0</TD><TD>-30.001</TD></TR>
+<TR><TD>far</TD><TD>50.0</TD><TD>50.0</TD></TR>
+</TABLEDATA></DATA>
+</TABLE>
+</RESOURCE>
+</VOTABLE>
+"""
+
+
+def post_regions_mockreturn(url, data, timeout, **kwargs):
+    return MockResponse(REGIONS_RESULT.format(script=data['script']))
+
+
+def test_query_regions(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_regions_mockreturn)
+    targets = Table([[10., 10., 200., 100.], [20., 20.001, -30., 0.]],
+                    names=['ra', 'dec'])
+    result = simbad.core.Simbad.query_regions(targets, radius='0d0m10s',
+                                              chunk_size=2)
+    assert len(result) == 4
+    assert list(result[0]['MAIN_ID']) == ['near 0 and 1']
+    assert list(result[1]['MAIN_ID']) == ['near 0 and 1']
+    assert list(result[2]['MAIN_ID']) == ['near 2']
+    assert result[3] is None
+    assert result.errors == []
+    # the positions added for the split are not returned
+    assert 'RA_d' not in result[0].colnames
+
+
+def test_region_tables_errors():
+    first = simbad.core.RegionTables()
+    first.errors.append(simbad.core.ObjectError(0, 'a', 'msg'))
+    assert simbad.core.RegionTables().errors == []
+
+
+def post_regions_overlap_mockreturn(url, data, timeout, **kwargs):
+    # SIMBAD writes the rows of every query coo in the same table: the
+    # object close to the first two positions comes once per query, and
+    # the last position of the script is rejected
+    lines = data['script'].split('\n')
+    content = REGIONS_RESULT.format(script=data['script'])
+    row = '<TR><TD>near 0 and 1</TD><TD>10.0</TD><TD>20.0005</TD></TR>\n'
+    content = content.replace(row, row * 2)
+    bad = [i + 1 for i, line in enumerate(lines) if line.startswith('query coo 100.')]
+    if bad:
+        content = content.replace(
+            '::data::', '::error::::::\n\n[{0}] Incorrect coordinates\n\n'
+            '::data::'.format(bad[0]))
+    return MockResponse(content)
+
+
+def test_query_regions_overlap(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_regions_overlap_mockreturn)
+    targets = Table([[10., 10., 200., 100.], [20., 20.001, -30., 0.]],
+                    names=['ra', 'dec'])
+    result = simbad.core.Simbad.query_regions(targets, radius='0d0m10s')
+    assert list(result[0]['MAIN_ID']) == ['near 0 and 1']
+    assert list(result[1]['MAIN_ID']) == ['near 0 and 1']
+    assert list(result[2]['MAIN_ID']) == ['near 2']
+    assert result[3] is None
+    assert [(error.index, error.name) for error in result.errors] == \
+        [(3, '100.000000 +0.000000')]
+
+
+def test_query_regions_script(request):
+    scripts = []
+
+    def post_mockreturn(url, data, timeout, **kwargs):
+        scripts.append(data['script'])
+        return post_regions_mockreturn(url, data, timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_mockreturn)
+    targets = Table([[10., 200.], [20., -30.]], names=['ra', 'dec'])
+    simbad.core.Simbad.query_regions(targets, radius=2 * u.arcmin)
+    assert scripts == ["\nvotable {main_id,coordinates,ra(d),dec(d)}\n"
+                       "votable open\n"
+                       "query coo 10.00000000 +20.00000000 radius=2.0m frame=ICRS\n"
+                       "query coo 200.00000000 -30.00000000 radius=2.0m frame=ICRS\n"
+                       "votable close"]
+
+
+def test_simbad_result_sections():
+    content = open(data_path(DATA_FILES['error']), 'r').read()
+    result = simbad.core.SimbadResult(content)
+    assert result.script.splitlines()[0] == 'votable {main_id,coordinates}'
+    assert result.console.startswith('C.D.S.')
+    assert result.exectime == 48.562
+    assert [error.line for error in result.errors] == [3, 4]
+    assert result.data.startswith('<?xml')
+    content = open(data_path(DATA_FILES['id']), 'r').read()
+    result = simbad.core.SimbadResult(content)
+    assert result.error_raw is None
+    assert len(result.table) == 1
+
+
+def test_iter_query_bibcode(patch_post):
+    table = simbad.core.Simbad.query_bibcode("2006ApJ*", wildcard=True)
+    references = list(simbad.core.Simbad.iter_query_bibcode("2006ApJ*",
+                                                            wildcard=True))
+    assert len(references) == len(table) > 0
+    assert [ref.decode('utf-8') if isinstance(ref, bytes) else ref
+            for ref in table['References']] == references
+    assert len(simbad.core._create_bibcode_table('no reference', '2006ApJ')) == 0
+
+
+def test_query_catalog_stripes(request):
+    scripts = []
+
+    def post_mockreturn(url, data, timeout, **kwargs):
+        scripts.append(data['script'])
+        return MockResponseSimbad(data['script'], **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_mockreturn)
+    single = simbad.core.Simbad.query_criteria(otype='SNR')
+    del scripts[:]
+    result = simbad.core.Simbad.query_catalog('NGC', stripes=3)
+    assert len(result) == 3 * len(single)
+    assert all(['query sample' in script for script in scripts])
+    assert sorted([re.search(r'dec >= (\S+) & dec (<=?) (\S+)', script).groups()
+                   for script in scripts]) == [
+        ('-19.471221', '<', '19.471221'),
+        ('-90.000000', '<', '-19.471221'),
+        ('19.471221', '<=', '90.000000')]
+    assert sorted(scripts) == sorted(
+        ["\nvotable {" + votable_fields + "}\n"
+         "votable open\n"
+         "query sample  cat='NGC'&" + stripe + "  \n"
+         "votable close"
+         for stripe in ["dec >= -90.000000 & dec < -19.471221",
+                        "dec >= -19.471221 & dec < 19.471221",
+                        "dec >= 19.471221 & dec <= 90.000000"]])
+    del scripts[:]
+    result = simbad.core.Simbad.query_criteria(otype='SNR', stripes=2)
+    assert len(result) == 2 * len(single)
+    assert len(scripts) == 2 and all(['otype=SNR' in script for script in scripts])
+
+
+# a minimal stand-in of the SIMBAD TAP service, evaluating the crossmatch
+# queries of SimbadClass on a few objects
+TAP_BASIC = Table([[1, 2, 3], [b'M   1', b'M  31', b'NGC  7000'],
+                   [83.633, 10.685, 314.75], [22.014, 41.269, 44.333],
+                   [b'SNR', b'G', b'HII']],
+                  names=['oid', 'main_id', 'ra', 'dec', 'otype'])
+TAP_IDENT = {b'M   1': 1, b'NAME Crab Nebula': 1, b'M  31': 2, b'NGC  7000': 3}
+
+
+def post_tap_mockreturn(url, data, timeout, files=None, **kwargs):
+    from astropy.io import votable as vo
+    from ...extern.six import BytesIO
+    assert url == simbad.core.Simbad.TAP_URL
+    assert data['REQUEST'] == 'doQuery' and data['LANG'] == 'ADQL'
+    name = data['UPLOAD'].split(',')[0]
+    upload = vo.parse(BytesIO(files[name][1])).get_first_table().to_table()
+    query = data['QUERY']
+    columns = re.findall(r'b\.(\w+)', query.split('FROM')[0])
+    rows = []
+    if 'JOIN ident' in query:
+        for index, ident in zip(upload['input_index'], upload['id']):
+            if not isinstance(ident, bytes):
+                ident = ident.encode('ascii')
+            oid = TAP_IDENT.get(ident)
+            if oid is not None:
+                row = TAP_BASIC[TAP_BASIC['oid'] == oid][0]
+                rows.append([index] + [row[c] for c in columns])
+    else:
+        radius = float(re.search(r'u\.dec, ([\d.]+)\)\)', query).group(1))
+        for index, ra, dec in zip(upload['input_index'], upload['ra'],
+                                  upload['dec']):
+            for row in TAP_BASIC:
+                distance = float(np.degrees(np.arccos(min(1., (
+                    np.sin(np.radians(dec)) * np.sin(np.radians(row['dec'])) +
+                    np.cos(np.radians(dec)) * np.cos(np.radians(row['dec'])) *
+                    np.cos(np.radians(ra - row['ra'])))))))
+                if distance <= radius:
+                    rows.append([index, distance] + [row[c] for c in columns])
+    names = ['input_index'] + (['distance'] if 'CONTAINS' in query else []) + columns
+    result = Table([list(column) for column in zip(*rows)], names=names)
+    output = BytesIO()
+    vo.from_table(result).to_xml(output)
+    return MockResponse(output.getvalue())
+
+
+def test_query_objects_tap(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_tap_mockreturn)
+    result = simbad.core.Simbad.query_objects_tap(['NGC  7000', 'nothing',
+                                                   'NAME Crab Nebula'])
+    assert list(result['input_index']) == [0, 2]
+    assert [str(name.decode('ascii') if isinstance(name, bytes) else name)
+            for name in result['main_id']] == ['NGC  7000', 'M   1']
+    assert result.colnames[:4] == ['input_index', 'main_id', 'ra', 'dec']
+
+
+def test_query_regions_tap(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_tap_mockreturn)
+    targets = Table([[10.68, 83.63, 0.], [41.27, 22.01, 0.]],
+                    names=['ra', 'dec'])
+    result = simbad.core.Simbad.query_regions_tap(targets, radius='0d1m0s')
+    assert list(result['input_index']) == [0, 1]
+    assert all(result['distance'] < 1 / 60.)
+
+
+def test_tap_columns():
+    S = simbad.core.Simbad()
+    S.add_votable_fields('otype', 'pm', 'pmra')
+    assert S._tap_columns() == ['b.main_id', 'b.ra', 'b.dec', 'b.coo_err_maja',
+                                'b.coo_err_mina', 'b.coo_err_angle',
+                                'b.coo_qual', 'b.coo_wavelength',
+                                'b.coo_bibcode', 'b.otype', 'b.pmra',
+                                'b.pmdec', 'b.pm_err_maja', 'b.pm_err_mina',
+                                'b.pm_err_angle', 'b.pm_qual', 'b.pm_bibcode']
+    S.add_votable_fields('flux(V)')
+    with pytest.raises(ValueError):
+        S._tap_columns()
+
+
+def test_query_settings(request):
+    scripts = []
+
+    def post_mockreturn(url, data, timeout, **kwargs):
+        scripts.append(data['script'])
+        return MockResponseSimbad(data['script'], **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_mockreturn)
+    settings = simbad.core.Simbad.get_settings().add_votable_fields('otype')
+    settings = settings._replace(row_limit=10)
+    assert settings.votable_fields == ('main_id', 'coordinates', 'otype')
+    with pytest.raises(KeyError):
+        settings.add_votable_fields('otype')
+    result = simbad.core.Simbad.query_object('m1', settings=settings)
+    assert isinstance(result, Table)
+    assert scripts[0].startswith("set limit 10\nvotable {main_id,coordinates,otype}")
+    # the shared instance is left untouched
+    assert simbad.core.Simbad.get_votable_fields() == ['main_id', 'coordinates']
+    assert simbad.core.Simbad.ROW_LIMIT == 0
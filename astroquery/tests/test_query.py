@@ -0,0 +1,50 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import threading
+from collections import namedtuple
+
+from ..query import BaseQuery, suspend_cache, accepts_settings, _cache_suspended
+
+DummySettings = namedtuple('DummySettings', ('value',))
+
+
+class DummyQuery(BaseQuery):
+    value = 1
+
+    def get_settings(self):
+        return DummySettings(self.value)
+
+    def _from_settings(self, settings):
+        instance = self.__class__()
+        instance.value = settings.value
+        return instance
+
+    @accepts_settings
+    def query(self):
+        return self.value
+
+
+def test_suspend_cache_thread_local():
+    query = DummyQuery()
+    other_thread = []
+
+    def check():
+        other_thread.append(_cache_suspended(query))
+    assert not _cache_suspended(query)
+    with suspend_cache(query):
+        with suspend_cache(query):
+            assert _cache_suspended(query)
+        # still suspended by the outer context
+        assert _cache_suspended(query)
+        thread = threading.Thread(target=check)
+        thread.start()
+        thread.join()
+    assert other_thread == [False]
+    assert not _cache_suspended(query)
+    assert query._cache_active
+
+
+def test_accepts_settings():
+    query = DummyQuery()
+    assert query.query() == 1
+    assert query.query(settings=DummySettings(2)) == 2
+    assert query.value == 1
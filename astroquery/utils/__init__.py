@@ -9,5 +9,8 @@ from .download_file_list import *
 from .class_or_instance import *
 from .commons import *
 from .process_asyncs import async_to_sync
+from .parallel import *
+from .tilecache import *
+from .ipac import *
 from .docstr_chompers import prepend_docstr_noreturns
 from .testing_tools import turn_off_internet,turn_on_internet
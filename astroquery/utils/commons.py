@@ -10,6 +10,7 @@ import warnings
 import os
 import shutil
 import socket
+from collections import namedtuple
 
 try:
     from urllib2 import URLError
@@ -17,8 +18,10 @@ except ImportError:
     # Python 3
     from urllib.error import URLError
 
+import numpy as np
 import astropy.units as u
 from astropy import coordinates as coord
+from astropy.table import Table
 from astropy.utils import OrderedDict
 import astropy.utils.data as aud
 from astropy.io import fits,votable
@@ -38,6 +41,7 @@ __all__ = ['send_request',
            'parse_coordinates',
            'parse_radius',
            'TableList',
+           'ObjectError',
            'suppress_vo_warnings',
            'validate_email']
 
@@ -213,6 +217,37 @@ def coord_to_radec(coordinate):
     dec = coordinate.fk5.dec.degree
     return ra,dec
 
+def coord_array_to_radec(coordinates):
+    """
+    Returns the ICRS right ascensions and declinations, in degrees, of a
+    table with ``ra`` and ``dec`` columns or an `astropy.coordinates`
+    object, which may hold an array of positions.
+
+    Returns
+    -------
+    ra, dec : `numpy.ndarray`
+        At least one-dimensional arrays, in degrees.
+    """
+    if isinstance(coordinates, Table):
+        if 'ra' not in coordinates.colnames or 'dec' not in coordinates.colnames:
+            raise ValueError("Table must contain 'ra' and 'dec' columns!")
+        radec = []
+        for name in ('ra', 'dec'):
+            column = coordinates[name]
+            values = np.asarray(column, dtype=float)
+            if column.unit is not None:
+                values = (values * u.Unit(column.unit)).to(u.degree).value
+            radec.append(values)
+        ra, dec = radec
+    elif isinstance(coordinates, coord.SphericalCoordinatesBase):
+        ra = coordinates.icrs.ra.degree
+        dec = coordinates.icrs.dec.degree
+    else:
+        raise TypeError("coordinates must be a table or an astropy "
+                        "coordinates object")
+    return np.atleast_1d(ra), np.atleast_1d(dec)
+
+
 class TableList(list):
 
     """
@@ -303,6 +338,13 @@ class TableList(list):
         self.print_table_list()
 
 
+# An input of a batch query that failed: its position ``index`` in the input
+# (`None` if it is unknown), its ``name`` and the error message ``msg``. The
+# batch queries return the list of them in the ``errors`` attribute of their
+# result.
+ObjectError = namedtuple('ObjectError', ('index', 'name', 'msg'))
+
+
 def _is_coordinate(coordinates):
     """
     Returns `True` if coordinates can be parsed via `astropy.coordinates`
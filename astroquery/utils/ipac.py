@@ -0,0 +1,118 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A fast reader for the fixed-width IPAC ASCII tables returned by the IRSA
+services. The data rows are sliced as a numpy byte array, one column at a
+time, instead of splitting every line in python.
+"""
+import numpy as np
+
+from astropy.table import Table, Column, MaskedColumn
+
+__all__ = ['read_ipac_table']
+
+# IPAC data types, as spelled in the type header row, and their numpy dtypes
+IPAC_DTYPES = {'int': 'i8', 'i': 'i8', 'long': 'i8', 'l': 'i8',
+               'double': 'f8', 'd': 'f8', 'float': 'f8', 'f': 'f8',
+               'real': 'f8', 'r': 'f8',
+               'char': 'S', 'c': 'S', 'date': 'S'}
+
+
+def _to_str(value):
+    """ Native string of a byte string """
+    return value if isinstance(value, str) else value.decode('utf-8')
+
+
+def _header_fields(line, bars):
+    """ The stripped fields of a header row between the column bars """
+    return [_to_str(line[a + 1:b].strip()) for a, b in zip(bars[:-1], bars[1:])]
+
+
+def read_ipac_table(content):
+    """
+    Parses an IPAC ASCII table.
+
+    The column limits are given by the ``|`` of the first header row. The
+    following header rows give the data types, units and null values. The
+    data rows are copied in a single array of bytes, and every column is
+    converted from its slice of this array in one step.
+
+    Parameters
+    ----------
+    content : str or bytes
+        The whole table, including the header.
+
+    Returns
+    -------
+    table : `astropy.table.Table`
+        The character columns are stripped of blanks. The table is masked if
+        any value is null; empty numeric values are also treated as null.
+        The ``\\keyword = value`` lines are stored in ``table.meta``.
+
+    Raises
+    ------
+    ValueError
+        If the header is missing or a data type is unknown.
+    """
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    lines = content.splitlines()
+    meta = {}
+    headers = []
+    first_data = len(lines)
+    for index, line in enumerate(lines):
+        if line.startswith(b'\\'):
+            if b'=' in line:
+                key, value = line[1:].split(b'=', 1)
+                meta[_to_str(key.strip())] = _to_str(value.strip())
+        elif line.startswith(b'|'):
+            headers.append(line)
+        elif line.strip():
+            first_data = index
+            break
+    if not headers:
+        raise ValueError("The IPAC table has no header.")
+
+    bars = [i for i in range(len(headers[0])) if headers[0][i:i + 1] == b'|']
+    names = _header_fields(headers[0], bars)
+    ncols = len(names)
+    types = _header_fields(headers[1], bars) if len(headers) > 1 else ['char'] * ncols
+    units = _header_fields(headers[2], bars) if len(headers) > 2 else [''] * ncols
+    nulls = _header_fields(headers[3], bars) if len(headers) > 3 else ['null'] * ncols
+
+    rows = [line for line in lines[first_data:] if line.strip()]
+    width = bars[-1] + 1
+    # the rows are padded with NUL bytes, which numpy drops from the strings
+    data = np.array(rows, dtype='S{0}'.format(width)).view('S1')
+    data = data.reshape(len(rows), width)
+
+    columns = []
+    masks = []
+    for i in range(ncols):
+        # a value may start under the bar preceding its column
+        start, stop = bars[i], bars[i + 1]
+        values = np.ascontiguousarray(data[:, start:stop])
+        values = np.char.strip(values.view('S{0}'.format(stop - start))[:, 0])
+        kind = IPAC_DTYPES.get(types[i].lower())
+        if kind is None:
+            raise ValueError("Unexpected type name: {0}.".format(types[i]))
+        mask = values == nulls[i].encode('utf-8')
+        if kind != 'S':
+            mask |= values == b''
+            if mask.any():
+                values = values.copy()
+                values[mask] = b'0'
+            values = values.astype(kind)
+        columns.append(values)
+        masks.append(mask)
+
+    if any(mask.any() for mask in masks):
+        table = Table([MaskedColumn(name=name, data=values, mask=mask,
+                                    unit=unit if unit not in ('', 'null') else None)
+                       for name, values, mask, unit
+                       in zip(names, columns, masks, units)], masked=True)
+    else:
+        table = Table([Column(name=name, data=values,
+                              unit=unit if unit not in ('', 'null') else None)
+                       for name, values, unit in zip(names, columns, units)])
+    table.meta.update(meta)
+    return table
@@ -0,0 +1,125 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Helpers to send a number of independent queries to a service concurrently.
+"""
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+__all__ = ['parallel_map', 'parallel_imap', 'chunks']
+
+# default number of simultaneous requests sent to a single service
+MAX_WORKERS = 4
+
+
+def chunks(sequence, size):
+    """
+    Split a sequence into successive slices of at most ``size`` items.
+
+    Parameters
+    ----------
+    sequence : sequence
+        Any sliceable sequence, e.g. a list or an `astropy.table.Table`.
+    size : int
+        Maximum number of items per slice.
+
+    Returns
+    -------
+    list of slices of ``sequence``
+
+    >>> chunks([1, 2, 3, 4, 5], 2)
+    [[1, 2], [3, 4], [5]]
+    """
+    if size < 1:
+        raise ValueError("Chunk size must be a positive integer")
+    return [sequence[i:i + size] for i in range(0, len(sequence), size)]
+
+
+def parallel_map(function, iterable, max_workers=None):
+    """
+    Apply ``function`` to every item of ``iterable`` using a pool of threads
+    and return the results in the order of the input. Queries spend most of
+    their time waiting on the network, so threads are sufficient to overlap
+    them. If any call raises, the exception is re-raised here.
+
+    Parameters
+    ----------
+    function : callable
+        Function of a single argument.
+    iterable : iterable
+        The arguments to call ``function`` with.
+    max_workers : int, optional
+        Maximum number of concurrent calls. Defaults to
+        `astroquery.utils.parallel.MAX_WORKERS`. With ``max_workers=1`` the
+        calls are made sequentially in the calling thread.
+
+    Returns
+    -------
+    list of the return values of ``function``
+
+    >>> parallel_map(abs, [-1, 2, -3])
+    [1, 2, 3]
+    """
+    items = list(iterable)
+    if max_workers is None:
+        max_workers = MAX_WORKERS
+    if max_workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        results = pool.map(function, items, chunksize=1)
+    except:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
+    return results
+
+
+def parallel_imap(function, iterable, max_workers=None):
+    """
+    Same as `parallel_map`, but returns a generator yielding the results in
+    the order of the input as soon as they are available, so that the caller
+    can process the first results while the next calls are running. At most
+    ``2 * max_workers`` calls are submitted ahead of the results yielded, so
+    that the results do not pile up in memory when the caller is slower than
+    the calls.
+
+    Parameters
+    ----------
+    function : callable
+        Function of a single argument.
+    iterable : iterable
+        The arguments to call ``function`` with.
+    max_workers : int, optional
+        Maximum number of concurrent calls. Defaults to
+        `astroquery.utils.parallel.MAX_WORKERS`.
+
+    Returns
+    -------
+    generator of the return values of ``function``
+
+    >>> list(parallel_imap(abs, [-1, 2, -3]))
+    [1, 2, 3]
+    """
+    items = list(iterable)
+    if max_workers is None:
+        max_workers = MAX_WORKERS
+    if max_workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield function(item)
+        return
+    pool = ThreadPool(min(max_workers, len(items)))
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(pool.apply_async(function, (item,)))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    except:
+        # also reached when the caller stops iterating early
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
@@ -40,5 +40,9 @@ class MockResponse(object):
         for l in c:
             yield l
 
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i+chunk_size]
+
     def raise_for_status(self):
         pass
@@ -6,12 +6,17 @@ import astropy.units as u
 from ...utils import chunk_read, chunk_report
 from ...utils import class_or_instance
 from ...utils import commons
+from ...utils import parallel
+from ...utils import tilecache
+from ...utils import ipac
 from ...utils.process_asyncs import async_to_sync_docstr,async_to_sync
 from ...utils.docstr_chompers import remove_returns,prepend_docstr_noreturns
 from astropy.table import Table
 from astropy.tests.helper import pytest, remote_data
 import astropy.io.votable as votable
 import textwrap
+import time
+import numpy as np
 from numpy import testing as npt
 from astropy.utils import OrderedDict
 import os
@@ -417,3 +422,156 @@ def test_filecontainer_get(patch_getreadablefileobj):
 def test_is_coordinate(coordinates, expected):
     out = commons._is_coordinate(coordinates)
     assert out == expected
+
+@pytest.mark.parametrize(('max_workers'), [1, 3, None])
+def test_parallel_map_order(max_workers):
+    out = parallel.parallel_map(lambda x: 2 * x, range(20), max_workers=max_workers)
+    assert out == [2 * x for x in range(20)]
+
+def test_parallel_map_raises():
+    with pytest.raises(ZeroDivisionError):
+        parallel.parallel_map(lambda x: 1 / x, [1, 0, 2], max_workers=2)
+
+@pytest.mark.parametrize(('max_workers'), [1, 3])
+def test_parallel_imap(max_workers):
+    out = parallel.parallel_imap(lambda x: 2 * x, range(20), max_workers=max_workers)
+    assert next(out) == 0
+    assert list(out) == [2 * x for x in range(1, 20)]
+    with pytest.raises(ZeroDivisionError):
+        list(parallel.parallel_imap(lambda x: 1 / x, [1, 0, 2], max_workers=max_workers))
+
+def test_parallel_imap_bounded():
+    started = []
+
+    def function(x):
+        started.append(x)
+        return x
+    out = parallel.parallel_imap(function, range(40), max_workers=2)
+    for consumed, result in enumerate(out):
+        assert result == consumed
+        # a slow caller: the calls submitted ahead of it stay bounded
+        time.sleep(0.01)
+        assert len(started) <= consumed + 2 * 2
+    assert sorted(started) == list(range(40))
+
+def test_chunks():
+    assert parallel.chunks(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+    assert parallel.chunks([], 3) == []
+    with pytest.raises(ValueError):
+        parallel.chunks([1], 0)
+
+def test_region_mask():
+    ra = np.array([10., 10.5, 10., 359.9, 9.])
+    dec = np.array([0., 0., 0.9, 0., 0.])
+    npt.assert_array_equal(tilecache.region_mask(ra, dec, 10., 0., radius=1.),
+                           [True, True, True, False, True])
+    npt.assert_array_equal(tilecache.region_mask(ra, dec, 0., 0., width=1., height=1.),
+                           [False, False, False, True, False])
+
+def test_polygon_mask():
+    # a triangle, and the same one across ra=0
+    ra = np.array([10.1, 10.5, 10.9, 10.5, 190.5])
+    dec = np.array([10.1, 10.5, 10.1, 10.95, -10.5])
+    npt.assert_array_equal(tilecache.polygon_mask(ra, dec, [10., 11., 10.5], [10., 10., 11.]),
+                           [True, True, False, False, False])
+    npt.assert_array_equal(tilecache.polygon_mask(ra - 10.5, dec, [359.5, 0.5, 0.], [10., 10., 11.]),
+                           [True, True, False, False, False])
+    # the edges are great circles: the middle of the northern edge of a
+    # box in ra/dec is inside the polygon, above the declination of the corners
+    npt.assert_array_equal(tilecache.polygon_mask([15., 15.], [60.5, 61.2],
+                                                  [10., 20., 20., 10.], [50., 50., 60., 60.]),
+                           [True, False])
+
+def test_tile_cache_tiles():
+    cache = tilecache.TileCache(tile_size=1.)
+    # a cone across RA=0 overlaps the first and last tiles of its band
+    indices = [index for band, index in cache.tiles(0.1, 0.5, radius=0.3)]
+    assert 0 in indices and cache._band_size(90) - 1 in indices
+    # a cone around the pole covers whole bands
+    tiles = cache.tiles(0., 89.9, radius=0.5)
+    assert len([t for t in tiles if t[0] == 179]) == cache._band_size(179)
+    for tile in cache.tiles(45., 30., radius=2.):
+        ra_min, ra_max, dec_min, dec_max = cache.tile_bounds(tile)
+        ra, dec, radius = cache.tile_cone(tile)
+        corners = tilecache.region_mask([ra_min, ra_min, ra_max, ra_max],
+                                        [dec_min, dec_max, dec_min, dec_max],
+                                        ra, dec, radius=radius)
+        assert corners.all()
+
+def test_tile_cache_query():
+    random = np.random.RandomState(0)
+    sources = Table([random.uniform(9, 11, 2000), random.uniform(39, 41, 2000),
+                     np.arange(2000)], names=['ra', 'dec', 'id'])
+    calls = []
+
+    def fetch(ra, dec, radius):
+        calls.append((ra, dec, radius))
+        mask = tilecache.region_mask(sources['ra'], sources['dec'], ra, dec, radius=radius)
+        return {'sources': sources[mask]}
+
+    def expected_ids(**region):
+        mask = tilecache.region_mask(sources['ra'], sources['dec'], **region)
+        return sorted(sources['id'][mask])
+
+    cache = tilecache.TileCache(tile_size=0.25)
+    result = cache.query('test', fetch, 10., 40., radius=0.3)
+    assert sorted(result['sources']['id']) == expected_ids(ra=10., dec=40., radius=0.3)
+    assert len(calls) == len(cache)
+    # an overlapping search inside the cached tiles is answered locally
+    ncalls = len(calls)
+    result = cache.query('test', fetch, 10.05, 40.05, radius=0.2)
+    assert sorted(result['sources']['id']) == expected_ids(ra=10.05, dec=40.05, radius=0.2)
+    result = cache.query('test', fetch, 10., 40., width=0.3, height=0.2)
+    assert sorted(result['sources']['id']) == expected_ids(ra=10., dec=40., width=0.3, height=0.2)
+    assert len(calls) == ncalls
+    # a different key does not share the tiles
+    cache.query('other', fetch, 10., 40., radius=0.1)
+    assert len(calls) > ncalls
+
+
+def test_tile_cache_incomplete():
+    calls = []
+
+    def fetch(ra, dec, radius):
+        calls.append((ra, dec, radius))
+        return {'sources': Table([[ra], [dec]], names=['ra', 'dec'])}
+
+    cache = tilecache.TileCache(tile_size=0.25)
+    result = cache.query('test', fetch, 10., 40., radius=0.1,
+                         complete=lambda result: False)
+    assert len(result['sources']) > 0
+    assert len(cache) == 0
+    # the truncated tiles are fetched again rather than served from the cache
+    ncalls = len(calls)
+    cache.query('test', fetch, 10., 40., radius=0.1)
+    assert len(calls) == 2 * ncalls
+    assert len(cache) == ncalls
+
+
+IPAC_TABLE = """\\fixlen = T
+\\RowsRetrieved =                 3
+|   id|        ra|  name|   mag|
+|  int|    double|  char|double|
+|     |       deg|      |   mag|
+| null|      null|  null|  null|
+     1  10.684737 m31     9.453
+     2  10.700000 null     null
+  null  10.710000 a b
+"""
+
+
+def test_read_ipac_table():
+    table = ipac.read_ipac_table(IPAC_TABLE)
+    assert table.colnames == ['id', 'ra', 'name', 'mag']
+    assert table['id'].dtype.kind == 'i'
+    assert table['ra'].dtype.kind == 'f'
+    npt.assert_allclose(table['ra'], [10.684737, 10.7, 10.71])
+    assert table['ra'].unit == u.deg
+    assert list(table['name'].mask) == [False, True, False]
+    assert table['name'][2] == b'a b'
+    # missing and null numeric values are masked
+    assert list(table['mag'].mask) == [False, True, True]
+    assert list(table['id'].mask) == [False, False, True]
+    assert table.meta['RowsRetrieved'] == '3'
+    # the same table given as bytes
+    assert len(ipac.read_ipac_table(IPAC_TABLE.encode('ascii'))) == 3
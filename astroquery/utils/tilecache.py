@@ -0,0 +1,345 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A spatial cache for cone and box catalog searches. The sky is divided in
+fixed tiles; the rows of every tile are fetched from the service once and
+later searches that overlap the same tiles are answered locally.
+"""
+import numpy as np
+
+import astropy.table as tbl
+# maintain compat with PY<2.7
+from astropy.utils import OrderedDict
+
+from . import parallel
+
+__all__ = ['TileCache', 'region_mask', 'polygon_mask']
+
+
+def region_mask(ra_values, dec_values, ra, dec, radius=None, width=None,
+                height=None):
+    """
+    Returns a boolean array that is True for the positions inside a cone or
+    a box. All angles are in decimal degrees.
+
+    Parameters
+    ----------
+    ra_values, dec_values : array-like
+        The positions to test.
+    ra, dec : float
+        The center of the region.
+    radius : float, optional
+        The radius of a cone.
+    width, height : float, optional
+        The dimensions of a box, used if ``radius`` is not given. The box
+        spans ``width / cos(dec)`` in right ascension.
+
+    Returns
+    -------
+    mask : `numpy.ndarray` of bool
+    """
+    ra_values = np.radians(np.asarray(ra_values, dtype=float))
+    dec_values = np.radians(np.asarray(dec_values, dtype=float))
+    ra, dec = np.radians(ra), np.radians(dec)
+    if radius is not None:
+        # haversine formula
+        hav = (np.sin((dec_values - dec) / 2) ** 2 +
+               np.cos(dec) * np.cos(dec_values) *
+               np.sin((ra_values - ra) / 2) ** 2)
+        distance = np.degrees(2 * np.arcsin(np.sqrt(np.clip(hav, 0, 1))))
+        return distance <= radius * (1 + 1e-9)
+    if height is None:
+        height = width
+    delta_ra = np.degrees((ra_values - ra + np.pi) % (2 * np.pi) - np.pi)
+    delta_dec = np.degrees(dec_values - dec)
+    cos_dec = max(np.cos(dec), 1e-3)
+    return ((np.abs(delta_dec) <= height / 2. * (1 + 1e-9)) &
+            (np.abs(delta_ra) * cos_dec <= width / 2. * (1 + 1e-9)))
+
+
+def _unit_vectors(ra, dec):
+    """ Cartesian unit vectors of positions in degrees """
+    ra, dec = np.radians(ra), np.radians(dec)
+    return np.array([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra),
+                     np.sin(dec)])
+
+
+def polygon_mask(ra_values, dec_values, polygon_ra, polygon_dec):
+    """
+    Returns a boolean array that is True for the positions inside a polygon
+    whose edges are great circles, as for the polygon searches of IRSA. All
+    angles are in decimal degrees.
+
+    The positions and vertices are projected on the plane tangent to the
+    sphere at the center of the vertices (gnomonic projection), where the
+    edges become straight lines, and tested with the even-odd rule. The
+    polygon must fit within a hemisphere.
+
+    Parameters
+    ----------
+    ra_values, dec_values : array-like
+        The positions to test.
+    polygon_ra, polygon_dec : array-like
+        The vertices of the polygon, in order.
+
+    Returns
+    -------
+    mask : `numpy.ndarray` of bool
+    """
+    points = _unit_vectors(np.asarray(ra_values, dtype=float),
+                           np.asarray(dec_values, dtype=float))
+    vertices = _unit_vectors(np.asarray(polygon_ra, dtype=float),
+                             np.asarray(polygon_dec, dtype=float))
+    center = vertices.sum(axis=1)
+    center /= np.sqrt((center ** 2).sum())
+    # orthonormal basis of the tangent plane
+    east = np.cross([0., 0., 1.], center)
+    if np.sqrt((east ** 2).sum()) < 1e-12:
+        east = np.array([1., 0., 0.])
+    east /= np.sqrt((east ** 2).sum())
+    north = np.cross(center, east)
+
+    def project(vectors):
+        depth = np.dot(center, vectors)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (np.dot(east, vectors) / depth,
+                    np.dot(north, vectors) / depth, depth)
+
+    x, y, depth = project(points)
+    polygon_x, polygon_y, _ = project(vertices)
+    inside = np.zeros(len(x), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(len(polygon_x)):
+            x1, y1 = polygon_x[i], polygon_y[i]
+            x2, y2 = polygon_x[i - 1], polygon_y[i - 1]
+            crosses = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+            inside ^= crosses
+    # points of the opposite hemisphere project onto the plane as well
+    return inside & (depth > 0)
+
+
+def _distance(ra1, dec1, ra2, dec2):
+    """ Angular distance in degrees between two positions in degrees """
+    ra1, dec1, ra2, dec2 = [np.radians(x) for x in (ra1, dec1, ra2, dec2)]
+    hav = (np.sin((dec2 - dec1) / 2) ** 2 +
+           np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2) ** 2)
+    return np.degrees(2 * np.arcsin(np.sqrt(min(hav, 1.))))
+
+
+class TileCache(object):
+    """
+    In-memory cache of catalog rows organized in sky tiles.
+
+    The sky is cut in declination bands of height ``tile_size``, and every
+    band in right ascension bins of about the same area, so that the tiles
+    are roughly square. A cone or box search is turned into the list of
+    tiles it overlaps; the tiles not yet cached are fetched concurrently,
+    each with a cone search circumscribing it, and each row is stored in the
+    single tile containing it. The result is then cut out of the cached
+    tiles locally.
+
+    The service must return complete tiles for the cache to be exact, so
+    row limits should be raised accordingly (see ``ROW_LIMIT`` of the
+    services using the cache). The tiles truncated by a row limit are used
+    for the search that fetched them, but never cached.
+
+    Parameters
+    ----------
+    tile_size : float, optional
+        Height of the declination bands, in degrees. Defaults to 0.5.
+    max_workers : int, optional
+        Maximum number of tiles fetched concurrently. Defaults to
+        `astroquery.utils.parallel.MAX_WORKERS`.
+
+    Examples
+    --------
+    >>> from astroquery.vizier import Vizier
+    >>> from astroquery.utils import TileCache
+    >>> v = Vizier(catalog="II/246")
+    >>> v.ROW_LIMIT = -1
+    >>> v.tile_cache = TileCache(tile_size=0.25)
+    >>> result = v.query_region("M 31", radius="0d5m0s")
+    >>> # only the missing tiles are fetched for an overlapping search
+    >>> result = v.query_region("M 31", radius="0d6m0s")
+    """
+
+    def __init__(self, tile_size=0.5, max_workers=None):
+        if not 0 < tile_size <= 90:
+            raise ValueError("tile_size must be between 0 and 90 degrees")
+        self.nbands = int(np.ceil(180. / tile_size))
+        self.band_height = 180. / self.nbands
+        self.max_workers = max_workers
+        self._tiles = {}
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def clear(self):
+        """ Removes all the cached tiles """
+        self._tiles.clear()
+
+    def _band_limits(self, band):
+        dec_min = -90. + band * self.band_height
+        return dec_min, dec_min + self.band_height
+
+    def _band_size(self, band):
+        """ Number of tiles in right ascension of a declination band """
+        dec_min, dec_max = self._band_limits(band)
+        if dec_min <= 0 <= dec_max:
+            cos_dec = 1.
+        else:
+            cos_dec = max(np.cos(np.radians(dec_min)),
+                          np.cos(np.radians(dec_max)))
+        return max(1, int(np.floor(360. * cos_dec / self.band_height)))
+
+    def tile_bounds(self, tile):
+        """
+        Returns the ``(ra_min, ra_max, dec_min, dec_max)`` limits of a tile,
+        in degrees.
+        """
+        band, index = tile
+        step = 360. / self._band_size(band)
+        dec_min, dec_max = self._band_limits(band)
+        return index * step, (index + 1) * step, dec_min, dec_max
+
+    def tile_cone(self, tile):
+        """
+        Returns the ``(ra, dec, radius)`` of a cone, in degrees, containing
+        the whole tile.
+        """
+        ra_min, ra_max, dec_min, dec_max = self.tile_bounds(tile)
+        if ra_max - ra_min >= 360.:
+            # a full ring around a pole
+            if dec_min + dec_max >= 0:
+                return 0., 90., 90. - dec_min
+            return 0., -90., dec_max + 90.
+        ra = (ra_min + ra_max) / 2.
+        dec = (dec_min + dec_max) / 2.
+        # the corners are the points of the tile farthest from its center
+        radius = max([_distance(ra, dec, corner_ra, corner_dec)
+                      for corner_ra in (ra_min, ra_max)
+                      for corner_dec in (dec_min, dec_max)])
+        return ra, dec, radius * 1.001
+
+    def tiles(self, ra, dec, radius=None, width=None, height=None):
+        """
+        Returns the list of ``(band, index)`` tiles overlapping a cone or a
+        box given in degrees (see `region_mask`).
+        """
+        if radius is not None:
+            half_height = radius
+        else:
+            if height is None:
+                height = width
+            half_height = height / 2.
+        dec_min = max(dec - half_height, -90.)
+        dec_max = min(dec + half_height, 90.)
+        if dec_min <= -90. or dec_max >= 90.:
+            half_ra = 180.
+        elif radius is not None:
+            ratio = np.sin(np.radians(radius)) / np.cos(np.radians(dec))
+            half_ra = 180. if ratio >= 1 else np.degrees(np.arcsin(ratio))
+        else:
+            half_ra = min(180., width / 2. / max(np.cos(np.radians(dec)), 1e-3))
+
+        first = int(np.floor((dec_min + 90.) / self.band_height))
+        last = min(int(np.floor((dec_max + 90.) / self.band_height)),
+                   self.nbands - 1)
+        tiles = []
+        for band in range(first, last + 1):
+            size = self._band_size(band)
+            step = 360. / size
+            if 2 * half_ra >= 360. - step:
+                indices = range(size)
+            else:
+                low = int(np.floor(((ra - half_ra) % 360.) / step)) % size
+                high = int(np.floor(((ra + half_ra) % 360.) / step)) % size
+                indices = [(low + i) % size
+                           for i in range((high - low) % size + 1)]
+            tiles += [(band, index) for index in indices]
+        return tiles
+
+    def _tile_mask(self, tile, ra_values, dec_values):
+        ra_min, ra_max, dec_min, dec_max = self.tile_bounds(tile)
+        ra_values = np.asarray(ra_values, dtype=float) % 360.
+        dec_values = np.asarray(dec_values, dtype=float)
+        mask = ((ra_values >= ra_min) & (ra_values < ra_max) &
+                (dec_values >= dec_min))
+        if tile[0] == self.nbands - 1:
+            return mask & (dec_values <= dec_max)
+        return mask & (dec_values < dec_max)
+
+    def query(self, key, fetch, ra, dec, radius=None, width=None,
+              height=None, ra_column='ra', dec_column='dec', complete=None):
+        """
+        Answers a cone or box search from the cached tiles, fetching the
+        missing ones first.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the service, catalog and query options, so that
+            different searches do not share tiles.
+        fetch : callable
+            ``fetch(ra, dec, radius)`` performs a cone search (in degrees)
+            and returns a mapping of table names to `astropy.table.Table`,
+            e.g. a `astroquery.utils.commons.TableList`.
+        ra, dec : float
+            The center of the search, in degrees.
+        radius, width, height : float, optional
+            The size of the cone or box, in degrees.
+        ra_column, dec_column : str, optional
+            The names of the position columns, in degrees, of the tables
+            returned by ``fetch``.
+        complete : callable, optional
+            ``complete(result)`` tells whether a result of ``fetch`` holds all
+            the rows of its cone, e.g. was not cut by a row limit. Incomplete
+            tiles are not cached, so that they are fetched again by the next
+            search. By default every result is taken as complete.
+
+        Returns
+        -------
+        tables : `~astropy.utils.OrderedDict`
+            The tables clipped to the requested region, possibly empty.
+        """
+        tiles = self.tiles(ra, dec, radius=radius, width=width, height=height)
+        missing = [tile for tile in tiles if (key, tile) not in self._tiles]
+
+        def fetch_tile(tile):
+            return fetch(*self.tile_cone(tile))
+
+        results = parallel.parallel_map(fetch_tile, missing,
+                                        max_workers=self.max_workers)
+        fetched = {}
+        for tile, result in zip(missing, results):
+            tile_tables = OrderedDict()
+            for name in result.keys():
+                table = result[name]
+                tile_tables[name] = table[self._tile_mask(tile,
+                                                          table[ra_column],
+                                                          table[dec_column])]
+            fetched[tile] = tile_tables
+            if complete is None or complete(result):
+                self._tiles[(key, tile)] = tile_tables
+
+        parts = OrderedDict()
+        for tile in tiles:
+            tile_tables = fetched.get(tile)
+            if tile_tables is None:
+                tile_tables = self._tiles[(key, tile)]
+            for name, table in tile_tables.items():
+                parts.setdefault(name, []).append(table)
+        tables = OrderedDict()
+        for name, name_parts in parts.items():
+            non_empty = [table for table in name_parts if len(table) > 0]
+            if len(non_empty) == 0:
+                tables[name] = name_parts[0]
+                continue
+            elif len(non_empty) == 1:
+                table = non_empty[0]
+            else:
+                table = tbl.vstack(non_empty)
+            tables[name] = table[region_mask(table[ra_column],
+                                             table[dec_column], ra, dec,
+                                             radius=radius, width=width,
+                                             height=height)]
+        return tables
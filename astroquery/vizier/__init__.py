@@ -28,6 +28,10 @@ VIZIER_TIMEOUT = ConfigurationItem('timeout', 60, 'default timeout for connectin
 
 ROW_LIMIT = ConfigurationItem('row_limit', 50, 'maximum number of rows that will be fetched from the result (set to -1 for unlimited).')
 
-from .core import Vizier,VizierClass
+POSITIONS_PER_QUERY = ConfigurationItem('positions_per_query', 1000, 'maximum number of positions of a table of coordinates sent in a single query.')
 
-__all__ = ['Vizier','VizierClass']
+MAX_POSITIONS_LENGTH = ConfigurationItem('max_positions_length', 100000, 'maximum number of characters of the position list sent in a single query.')
+
+from .core import Vizier,VizierClass,VizierSettings
+
+__all__ = ['Vizier','VizierClass','VizierSettings']
@@ -7,6 +7,13 @@ import warnings
 import json
 import traceback
 import tempfile
+from collections import namedtuple
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+import numpy as np
 
 import astropy.units as u
 import astropy.coordinates as coord
@@ -16,11 +23,14 @@ import astropy.utils.data as aud
 from astropy.utils import OrderedDict
 import astropy.io.votable as votable
 
-from ..query import BaseQuery
+from ..query import BaseQuery, accepts_settings
 from ..utils import commons
 from ..utils import async_to_sync
+from ..utils import parallel
 from ..utils import schema
-from . import VIZIER_SERVER, VIZIER_TIMEOUT, ROW_LIMIT
+from ..utils import tilecache
+from . import (VIZIER_SERVER, VIZIER_TIMEOUT, ROW_LIMIT, POSITIONS_PER_QUERY,
+               MAX_POSITIONS_LENGTH)
 from ..exceptions import TableParseError
 
 PY3 = sys.version_info[0] >= 3
@@ -30,15 +40,34 @@ if PY3:
 else:
     stringtypes = basestring
 
-__all__ = ['Vizier','VizierClass']
+__all__ = ['Vizier','VizierClass','VizierSettings']
 
 __doctest_skip__ = ['VizierClass.*']
 
+class VizierSettings(namedtuple('VizierSettings',
+                                ('columns', 'column_filters', 'catalog',
+                                 'keywords', 'row_limit', 'timeout'))):
+    """
+    Immutable settings of the Vizier queries. They can be passed to the query
+    methods of `VizierClass` with the ``settings`` keyword, instead of
+    configuring the shared `Vizier` instance, which is then safe to use from
+    several threads. Use `VizierClass.get_settings` to get the settings of an
+    instance and ``_replace`` to derive new ones. ``columns`` and
+    ``keywords`` are tuples of strings, ``column_filters`` a tuple of
+    ``(column, filter)`` pairs and ``catalog`` a string or tuple of strings.
+    """
+    __slots__ = ()
+
+
 @async_to_sync
 class VizierClass(BaseQuery):
     TIMEOUT = VIZIER_TIMEOUT()
     VIZIER_SERVER = VIZIER_SERVER()
     ROW_LIMIT = ROW_LIMIT()
+    POSITIONS_PER_QUERY = POSITIONS_PER_QUERY()
+    MAX_POSITIONS_LENGTH = MAX_POSITIONS_LENGTH()
+    # optional `astroquery.utils.TileCache` answering single cone/box queries
+    tile_cache = None
 
     _schema_columns = schema.Schema([str], error="columns must be a list of strings")
     _schema_column_filters = schema.Schema({schema.Optional(str):str}, error="column_filters must be a dictionary where both keys and values are strings")
@@ -52,6 +81,47 @@ class VizierClass(BaseQuery):
         if keywords:
             self.keywords = keywords
 
+    def get_settings(self):
+        """
+        Returns the current columns, column filters, catalog, keywords, row
+        limit and timeout as an immutable `VizierSettings`, which can be
+        passed to the queries with the ``settings`` keyword.
+
+        Examples
+        --------
+        >>> from astroquery.vizier import Vizier
+        >>> settings = Vizier.get_settings()._replace(
+        ...     columns=('_RAJ2000', '_DEJ2000', 'Jmag'), catalog='II/246')
+        >>> result = Vizier.query_object('M 31', settings=settings)
+        """
+        catalog = self.catalog
+        if isinstance(catalog, list):
+            catalog = tuple(catalog)
+        keywords = None
+        if self.keywords is not None:
+            keywords = tuple([key for group in self.keywords.keywords.values()
+                              for key in group])
+        return VizierSettings(tuple(self.columns),
+                              tuple(sorted(self.column_filters.items())),
+                              catalog, keywords, self.ROW_LIMIT, self.TIMEOUT)
+
+    def _from_settings(self, settings):
+        """ Returns a new instance configured from a `VizierSettings` """
+        catalog = settings.catalog
+        if isinstance(catalog, tuple):
+            catalog = list(catalog)
+        instance = self.__class__(columns=list(settings.columns),
+                                  column_filters=dict(settings.column_filters),
+                                  catalog=catalog,
+                                  keywords=(list(settings.keywords)
+                                            if settings.keywords else None))
+        for name in ('VIZIER_SERVER', 'POSITIONS_PER_QUERY',
+                     'MAX_POSITIONS_LENGTH', 'tile_cache'):
+            setattr(instance, name, getattr(self, name))
+        instance.ROW_LIMIT = settings.row_limit
+        instance.TIMEOUT = settings.timeout
+        return instance
+
     def _server_to_url(self, return_type='votable'):
         """
         Not generally meant to be modified, but there are different valid
@@ -80,6 +150,7 @@ class VizierClass(BaseQuery):
     def keywords(self):
         self._keywords = None
 
+    @accepts_settings
     def find_catalogs(self, keywords, include_obsolete=False, verbose=False):
         """
         Search Vizier for catalogs based on a set of keywords, e.g. author name
@@ -131,6 +202,7 @@ class VizierClass(BaseQuery):
 
         return result
 
+    @accepts_settings
     def get_catalogs_async(self, catalog, verbose=False):
         """
         Query the Vizier service for a specific catalog
@@ -151,6 +223,7 @@ class VizierClass(BaseQuery):
                                         self.TIMEOUT)
         return response
 
+    @accepts_settings
     def query_object_async(self, object_name, catalog=None):
         """
         Serves the same purpose as `astroquery.vizier.Vizier.query_object` but only
@@ -181,6 +254,7 @@ class VizierClass(BaseQuery):
             self.TIMEOUT)
         return response
 
+    @accepts_settings
     def query_region_async(self, coordinates, radius=None, inner_radius=None,
                            width=None, height=None, catalog=None,
                            get_query_payload=False):
@@ -228,65 +302,333 @@ class VizierClass(BaseQuery):
                 dec = '+' + dec
             center["-c"] = "".join([ra, dec])
         elif isinstance(coordinates, tbl.Table):
-            if ("_RAJ2000" in coordinates.keys()) and ("_DEJ2000" in coordinates.keys()):
-                pos_list = []
-                for pos in coord.ICRS(coordinates["_RAJ2000"], coordinates["_DEJ2000"], unit=(coordinates["_RAJ2000"].unit, coordinates["_DEJ2000"].unit)):
-                    ra_deg = pos.ra.to_string(unit="deg", decimal=True, precision=8)
-                    dec_deg = pos.dec.to_string(unit="deg", decimal=True, precision=8, alwayssign=True)
-                    pos_list += ["{}{}".format(ra_deg, dec_deg)]
-                center["-c"] = "<<;"+";".join(pos_list)
-                columns += ["_q"] # request a reference to the input table
-            else:
-                raise ValueError("Table must contain '_RAJ2000' and '_DEJ2000' columns!")
+            center["-c"] = "<<;" + ";".join(_format_positions(coordinates))
+            columns += ["_q"] # request a reference to the input table
         else:
             raise TypeError("{} must be one of: string, astropy coordinates, or table containing coordinates!")
-        # decide whether box or radius
+        center.update(_region_constraints(radius=radius,
+                                          inner_radius=inner_radius,
+                                          width=width, height=height))
+
+        data_payload = self._args_to_payload(center=center, columns=columns,
+                                             catalog=catalog)
+
+        if get_query_payload:
+            return data_payload
+
+        response = commons.send_request(self._server_to_url(), data_payload,
+                                        self.TIMEOUT)
+        return response
+
+    @accepts_settings
+    def query_region(self, coordinates, radius=None, inner_radius=None,
+                     width=None, height=None, catalog=None,
+                     split_truncated=False, max_depth=4, keys=None,
+                     max_workers=None, verbose=False):
+        """
+        Queries a region around the specified coordinates. Either a radius
+        or the dimensions of a box must be given. If ``tile_cache`` is set to
+        an `astroquery.utils.TileCache`, the cone and box queries of a single
+        position are answered from the cached sky tiles, and only the missing
+        tiles are queried. The tiles truncated by ``ROW_LIMIT`` are not cached.
+
+        Parameters
+        ----------
+        coordinates : str, `astropy.coordinates` object, or `astropy.table.Table`
+            The target around which to search. See
+            `astroquery.vizier.Vizier.query_region_async`. The rows of a
+            table are sent in batches of at most ``POSITIONS_PER_QUERY``
+            positions and ``MAX_POSITIONS_LENGTH`` characters, queried
+            concurrently; the ``_q`` column of the result still refers to
+            the rows of the whole input table.
+        radius : convertible to `astropy.coordinates.angles.Angle`
+            The radius of the circular region to query.
+        inner_radius: convertible to `astropy.coordinates.angles.Angle`
+            When set in addition to `radius`, the queried region becomes annular,
+            with outer radius `radius` and inner radius `inner_radius`.
+        width : convertible to `astropy.coordinates.angles.Angle`
+            The width of the square region to query.
+        height: convertible to `astropy.coordinates.angles.Angle`
+            When set in addition to `width`, the queried region becomes rectangular,
+            with the specified `width` and `height`.
+        catalog : str or list, optional
+            The catalog(s) which must be searched for this identifier.
+            If not specified, all matching catalogs will be searched.
+        split_truncated : bool, optional
+            If True, every catalog that returns ``ROW_LIMIT`` rows (and hence
+            was probably truncated by the server) is queried again in four
+            overlapping sub-boxes, recursively, until no sub-box is truncated
+            or ``max_depth`` is reached. The sub-queries of each level are sent
+            concurrently, and the merged rows are clipped to the original
+            region and de-duplicated. Only supported for a single position
+            and a cone or box region. Defaults to False.
+        max_depth : int, optional
+            Maximum number of times a region is split. Catalogs still
+            truncated at this depth are returned as is, with a warning.
+        keys : list of str, optional
+            Columns identifying a unique row, used to remove the sources
+            returned by more than one sub-box. Defaults to all the columns
+            whose name does not start with an underscore.
+        max_workers : int, optional
+            Maximum number of concurrent sub-queries or batches. Defaults to
+            `astroquery.utils.parallel.MAX_WORKERS`.
+
+        Returns
+        -------
+        `astroquery.utils.commons.TableList`
+            An OrderedDict of `astropy.table.Table` objects.
+
+        Examples
+        --------
+        >>> from astroquery.vizier import Vizier
+        >>> v = Vizier(catalog="II/246")
+        >>> v.ROW_LIMIT = 5000
+        >>> result = v.query_region("M 31", radius="0d30m0s",
+        ...                         split_truncated=True)
+        """
+        if isinstance(coordinates, tbl.Table) and not split_truncated:
+            result = self._query_table_positions(coordinates, radius=radius,
+                                                 inner_radius=inner_radius,
+                                                 width=width, height=height,
+                                                 catalog=catalog,
+                                                 max_workers=max_workers,
+                                                 verbose=verbose)
+            self.table = result
+            return result
+        if (self.tile_cache is not None and not split_truncated and
+                inner_radius is None):
+            result = self._query_region_cached(coordinates, radius=radius,
+                                               width=width, height=height,
+                                               catalog=catalog,
+                                               verbose=verbose)
+            self.table = result
+            return result
+        if not split_truncated:
+            response = self.query_region_async(coordinates, radius=radius,
+                                               inner_radius=inner_radius,
+                                               width=width, height=height,
+                                               catalog=catalog)
+            result = self._parse_result(response, verbose=verbose)
+            self.table = result
+            return result
+
+        if isinstance(coordinates, tbl.Table) or inner_radius is not None:
+            raise ValueError("split_truncated is only supported for a single "
+                             "position and a cone or box region")
+        c = commons.parse_coordinates(coordinates)
+        ra, dec = c.icrs.ra.degree, c.icrs.dec.degree
         if radius is not None:
-            # is radius a disk or an annulus?
-            if inner_radius is None:
-                radius = coord.Angle(radius)
-                unit, value = _parse_angle(radius)
-                key = "-c.r" + unit
-                center[key] = value
-            else:
-                i_radius = coord.Angle(inner_radius)
-                o_radius = coord.Angle(radius)
-                if i_radius.unit != o_radius.unit:
-                    o_radius = o_radius.to(i_radius.unit)
-                i_unit, i_value = _parse_angle(i_radius)
-                o_unit, o_value = _parse_angle(o_radius)
-                key = "-c.r" + i_unit
-                center[key] = ",".join([str(i_value), str(o_value)])
+            radius = commons.radius_to_unit(radius, 'degree')
+            width = height = 2 * radius
+            first = self._query_region_tables(ra, dec, catalog, radius=radius,
+                                              verbose=verbose)
         elif width is not None:
-            # is box a rectangle or square?
+            width = commons.radius_to_unit(width, 'degree')
             if height is None:
-                width = coord.Angle(width)
-                unit, value = _parse_angle(width)
-                key = "-c.b" + unit
-                center[key] = "x".join([str(value)] * 2)
+                height = width
             else:
-                w_box = coord.Angle(width)
-                h_box = coord.Angle(height)
-                if w_box.unit != h_box.unit:
-                    h_box = h_box.to(w_box.unit)
-                w_unit, w_value = _parse_angle(h_box)
-                h_unit, h_value = _parse_angle(w_box)
-                key = "-c.b" + w_unit
-                center[key] = "x".join([str(w_value), str(h_value)])
+                height = commons.radius_to_unit(height, 'degree')
+            first = self._query_region_tables(ra, dec, catalog, width=width,
+                                              height=height, verbose=verbose)
         else:
             raise Exception(
                 "At least one of radius, width/height must be specified")
 
-        data_payload = self._args_to_payload(center=center, columns=columns,
-                                             catalog=catalog)
+        # tables[name] collects the pieces of each catalog, keeping the order
+        # of the first response; split holds the catalogs that were subdivided
+        tables = OrderedDict()
+        split = []
+        pending = []
+        truncated = self._truncated_names(first)
+        for name in first.keys():
+            if name in truncated and max_depth > 0:
+                split.append(name)
+                tables[name] = []
+            else:
+                tables[name] = [first[name]]
+        if truncated:
+            if max_depth > 0:
+                pending = [(box, truncated)
+                           for box in _split_box(ra, dec, width, height)]
+            else:
+                self._warn_truncated(truncated)
 
-        if get_query_payload:
-            return data_payload
+        def query_box(job):
+            (box_ra, box_dec, box_width, box_height), names = job
+            return self._query_region_tables(box_ra, box_dec, names,
+                                             width=box_width,
+                                             height=box_height,
+                                             verbose=verbose)
+
+        depth = 1
+        while pending:
+            results = parallel.parallel_map(query_box, pending,
+                                            max_workers=max_workers)
+            next_pending = []
+            still_truncated = []
+            for (box, names), result in zip(pending, results):
+                truncated = self._truncated_names(result)
+                for name in result.keys():
+                    if name in truncated and depth < max_depth:
+                        continue
+                    tables.setdefault(name, []).append(result[name])
+                if truncated:
+                    if depth < max_depth:
+                        next_pending += [(sub_box, truncated)
+                                         for sub_box in _split_box(*box)]
+                    else:
+                        still_truncated += [name for name in truncated
+                                            if name not in still_truncated]
+            if still_truncated:
+                self._warn_truncated(still_truncated)
+            pending = next_pending
+            depth += 1
+
+        merged = OrderedDict()
+        for name, parts in tables.items():
+            if name not in split:
+                merged[name] = parts[0]
+                continue
+            if len(parts) == 0:
+                continue
+            elif len(parts) == 1:
+                table = parts[0]
+            else:
+                table = tbl.vstack(parts)
+            table = _clip_to_region(table, ra, dec, radius=radius,
+                                    width=width, height=height)
+            merged[name] = _unique_rows(table, keys)
+        result = commons.TableList(merged)
+        self.table = result
+        return result
+
+    def _query_table_positions(self, coordinates, radius=None,
+                               inner_radius=None, width=None, height=None,
+                               catalog=None, max_workers=None, verbose=False):
+        """
+        Queries every row of a table of coordinates, in batches of at most
+        ``POSITIONS_PER_QUERY`` positions and ``MAX_POSITIONS_LENGTH``
+        characters sent concurrently, and stacks the results. The ``_q``
+        column of the merged tables refers to the rows of the whole input
+        table (starting at 1), as it would for a single query.
+        """
+        catalog = VizierClass._schema_catalog.validate(catalog)
+        positions = _format_positions(coordinates)
+        region = _region_constraints(radius=radius, inner_radius=inner_radius,
+                                     width=width, height=height)
+        batches = _position_batches(positions, self.POSITIONS_PER_QUERY,
+                                    self.MAX_POSITIONS_LENGTH)
+
+        def query_batch(batch):
+            start, batch_positions = batch
+            center = {"-c": "<<;" + ";".join(batch_positions)}
+            center.update(region)
+            data_payload = self._args_to_payload(center=center,
+                                                 columns=["_q"],
+                                                 catalog=catalog)
+            response = commons.send_request(self._server_to_url(),
+                                            data_payload, self.TIMEOUT)
+            return start, self._parse_result(response, verbose=verbose)
+
+        results = parallel.parallel_map(query_batch, batches,
+                                        max_workers=max_workers)
+        if len(results) == 1:
+            return results[0][1]
+        table_dict = OrderedDict()
+        for start, result in results:
+            for name in result.keys():
+                table = result[name]
+                if start > 0 and '_q' in table.colnames:
+                    _offset_column(table, '_q', start)
+                table_dict.setdefault(name, []).append(table)
+        for name in table_dict.keys():
+            if len(table_dict[name]) > 1:
+                table_dict[name] = tbl.vstack(table_dict[name])
+            else:
+                table_dict[name] = table_dict[name][0]
+        return commons.TableList(table_dict)
+
+    def _query_region_cached(self, coordinates, radius=None, width=None,
+                             height=None, catalog=None, verbose=False):
+        """
+        Answers a cone or box query from ``self.tile_cache``, querying Vizier
+        only for the tiles that are not cached yet.
+        """
+        catalog = VizierClass._schema_catalog.validate(catalog)
+        if catalog is None:
+            catalog = self.catalog
+        c = commons.parse_coordinates(coordinates)
+        ra, dec = c.icrs.ra.degree, c.icrs.dec.degree
+        if radius is not None:
+            radius = commons.radius_to_unit(radius, 'degree')
+        elif width is not None:
+            width = commons.radius_to_unit(width, 'degree')
+            if height is not None:
+                height = commons.radius_to_unit(height, 'degree')
+        else:
+            raise Exception(
+                "At least one of radius, width/height must be specified")
+        # the tiles depend on everything that changes the rows returned
+        key = ('vizier', self.VIZIER_SERVER, repr(catalog), repr(self.columns),
+               repr(sorted(self.column_filters.items())), str(self.keywords),
+               self.ROW_LIMIT)
+
+        def fetch(tile_ra, tile_dec, tile_radius):
+            result = self._query_region_tables(tile_ra, tile_dec, catalog,
+                                               radius=tile_radius,
+                                               verbose=verbose)
+            truncated = self._truncated_names(result)
+            if truncated:
+                self._warn_truncated(truncated)
+            return result
+
+        tables = self.tile_cache.query(key, fetch, ra, dec, radius=radius,
+                                       width=width, height=height,
+                                       ra_column='_RAJ2000',
+                                       dec_column='_DEJ2000',
+                                       complete=lambda result:
+                                       not self._truncated_names(result))
+        return commons.TableList([(name, table)
+                                  for name, table in tables.items()
+                                  if len(table) > 0])
 
+    def _query_region_tables(self, ra, dec, catalog, radius=None, width=None,
+                             height=None, verbose=False):
+        """
+        Queries a cone or box in decimal degrees and returns the parsed
+        `astroquery.utils.commons.TableList`.
+        """
+        center = coord.ICRS(ra, dec, unit=(u.deg, u.deg))
+        if radius is not None:
+            data_payload = self.query_region_async(center,
+                                                   radius=radius * u.deg,
+                                                   catalog=catalog,
+                                                   get_query_payload=True)
+        else:
+            data_payload = self.query_region_async(center,
+                                                   width=width * u.deg,
+                                                   height=height * u.deg,
+                                                   catalog=catalog,
+                                                   get_query_payload=True)
         response = commons.send_request(self._server_to_url(), data_payload,
                                         self.TIMEOUT)
-        return response
+        return self._parse_result(response, verbose=verbose)
+
+    def _truncated_names(self, table_list):
+        """
+        Returns the names of the tables that hit ``ROW_LIMIT``.
+        """
+        if self.ROW_LIMIT is None or self.ROW_LIMIT <= 0:
+            return []
+        return [name for name in table_list.keys()
+                if len(table_list[name]) >= self.ROW_LIMIT]
 
+    def _warn_truncated(self, names):
+        warnings.warn("The results of {0} reached ROW_LIMIT={1} and are "
+                      "probably incomplete.".format(", ".join(names),
+                                                    self.ROW_LIMIT))
+
+    @accepts_settings
     def query_constraints_async(self, catalog=None, **kwargs):
         """
         Send a query to Vizier in which you specify constraints with keyword/value
@@ -348,6 +690,106 @@ class VizierClass(BaseQuery):
             self.TIMEOUT)
         return response
 
+    @accepts_settings
+    def iter_query_region(self, coordinates, radius=None, inner_radius=None,
+                          width=None, height=None, catalog=None,
+                          chunk_size=10000):
+        """
+        Serves the same purpose as `astroquery.vizier.Vizier.query_region`, but
+        parses the VOTable while it is being downloaded and yields the rows in
+        tables of at most ``chunk_size`` rows. Combined with ``ROW_LIMIT = -1``
+        this allows very large results to be processed in bounded memory.
+
+        Parameters
+        ----------
+        coordinates : str, `astropy.coordinates` object, or `astropy.table.Table`
+            The target around which to search. See
+            `astroquery.vizier.Vizier.query_region`.
+        radius : convertible to `astropy.coordinates.angles.Angle`
+            The radius of the circular region to query.
+        inner_radius: convertible to `astropy.coordinates.angles.Angle`
+            When set in addition to `radius`, the queried region becomes annular,
+            with outer radius `radius` and inner radius `inner_radius`.
+        width : convertible to `astropy.coordinates.angles.Angle`
+            The width of the square region to query.
+        height: convertible to `astropy.coordinates.angles.Angle`
+            When set in addition to `width`, the queried region becomes rectangular,
+            with the specified `width` and `height`.
+        catalog : str or list, optional
+            The catalog(s) which must be searched for this identifier.
+            If not specified, all matching catalogs will be searched.
+        chunk_size : int, optional
+            Maximum number of rows in each yielded table. Defaults to 10000.
+
+        Returns
+        -------
+        generator
+            Yields ``(catalog_name, table)`` pairs, where ``table`` is an
+            `astropy.table.Table` holding the next chunk of rows of
+            ``catalog_name``.
+
+        Examples
+        --------
+        >>> from astroquery.vizier import Vizier
+        >>> v = Vizier(catalog="II/246")
+        >>> v.ROW_LIMIT = -1
+        >>> for name, chunk in v.iter_query_region("M 31", radius="0d30m0s"):
+        ...     print(name, len(chunk))
+        II/246/out 10000
+        II/246/out 10000
+        ...
+        """
+        data_payload = self.query_region_async(coordinates, radius=radius,
+                                               inner_radius=inner_radius,
+                                               width=width, height=height,
+                                               catalog=catalog,
+                                               get_query_payload=True)
+        return self._iter_query(data_payload, chunk_size)
+
+    @accepts_settings
+    def iter_query_constraints(self, catalog=None, chunk_size=10000, **kwargs):
+        """
+        Serves the same purpose as `astroquery.vizier.Vizier.query_constraints`,
+        but parses the VOTable while it is being downloaded and yields the rows
+        in tables of at most ``chunk_size`` rows.
+
+        Parameters
+        ----------
+        catalog : str or list, optional
+            The catalog(s) which must be searched for this identifier.
+            If not specified, all matching catalogs will be searched.
+        chunk_size : int, optional
+            Maximum number of rows in each yielded table. Defaults to 10000.
+        kwargs : dict
+            Any key/value pairs besides "catalog" and "chunk_size" will be
+            parsed as additional column filters.
+
+        Returns
+        -------
+        generator
+            Yields ``(catalog_name, table)`` pairs, where ``table`` is an
+            `astropy.table.Table` holding the next chunk of rows of
+            ``catalog_name``.
+        """
+        catalog = VizierClass._schema_catalog.validate(catalog)
+        data_payload = self._args_to_payload(
+            catalog=catalog,
+            column_filters=kwargs,
+            center={'-c.rd':180})
+        return self._iter_query(data_payload, chunk_size)
+
+    def _iter_query(self, data_payload, chunk_size):
+        """
+        Sends the query as a streamed request and returns a generator over
+        the parsed ``(catalog_name, table)`` chunks.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        response = commons.send_request(self._server_to_url(), data_payload,
+                                        self.TIMEOUT, stream=True)
+        return _iter_votable_chunks(response.iter_content(chunk_size=65536),
+                                    chunk_size)
+
     def _args_to_payload(self, *args, **kwargs):
         """
         accepts the arguments for different query functions and
@@ -369,7 +811,8 @@ class VizierClass(BaseQuery):
         # process: columns
         columns = kwargs.get('columns')
         if columns is None:
-            columns = self.columns
+            # a copy, as the list is extended below
+            columns = list(self.columns)
         else:
             columns = self.columns + columns
         # process: columns - always request computed positions in degrees
@@ -507,6 +950,313 @@ def _parse_angle(angle):
     return unit, value
 
 
+def _format_positions(table):
+    """
+    Formats the ``_RAJ2000`` and ``_DEJ2000`` columns of a table as a list of
+    Vizier ``ra+dec`` position strings in decimal degrees.
+    """
+    if not ("_RAJ2000" in table.colnames and "_DEJ2000" in table.colnames):
+        raise ValueError("Table must contain '_RAJ2000' and '_DEJ2000' columns!")
+    positions = coord.ICRS(table["_RAJ2000"], table["_DEJ2000"],
+                           unit=(table["_RAJ2000"].unit, table["_DEJ2000"].unit))
+    ra = np.atleast_1d(positions.ra.degree)
+    dec = np.atleast_1d(positions.dec.degree)
+    return np.char.add(np.char.mod('%.8f', ra),
+                       np.char.mod('%+.8f', dec)).tolist()
+
+
+def _position_batches(positions, max_count, max_length):
+    """
+    Splits a list of position strings into consecutive batches of at most
+    ``max_count`` positions and ``max_length`` characters once joined.
+
+    Returns
+    -------
+    list of ``(start, positions)`` tuples, ``start`` being the index of the
+    first position of the batch in ``positions``.
+    """
+    if max_count < 1:
+        raise ValueError("max_count must be a positive integer")
+    batches = []
+    start = 0
+    length = 0
+    for index, position in enumerate(positions):
+        size = len(position) + 1
+        if index > start and (index - start >= max_count or
+                              length + size > max_length):
+            batches.append((start, positions[start:index]))
+            start = index
+            length = 0
+        length += size
+    if start < len(positions):
+        batches.append((start, positions[start:]))
+    return batches
+
+
+def _offset_column(table, name, offset):
+    """
+    Adds ``offset`` to the integer column ``name`` of ``table``, widening it
+    so that the shifted values cannot overflow.
+    """
+    column = table[name]
+    index = table.colnames.index(name)
+    data = np.asarray(column, dtype=np.int64) + offset
+    if table.masked:
+        new_column = tbl.MaskedColumn(data=data, name=name,
+                                      mask=np.ma.getmaskarray(column),
+                                      unit=column.unit,
+                                      description=column.description)
+    else:
+        new_column = tbl.Column(data=data, name=name, unit=column.unit,
+                                description=column.description)
+    table.remove_column(name)
+    table.add_column(new_column, index=index)
+
+
+def _region_constraints(radius=None, inner_radius=None, width=None,
+                        height=None):
+    """
+    Returns the Vizier constraints (``-c.r*`` or ``-c.b*``) of a cone,
+    annulus or box region.
+    """
+    center = {}
+    # decide whether box or radius
+    if radius is not None:
+        # is radius a disk or an annulus?
+        if inner_radius is None:
+            radius = coord.Angle(radius)
+            unit, value = _parse_angle(radius)
+            key = "-c.r" + unit
+            center[key] = value
+        else:
+            i_radius = coord.Angle(inner_radius)
+            o_radius = coord.Angle(radius)
+            if i_radius.unit != o_radius.unit:
+                o_radius = o_radius.to(i_radius.unit)
+            i_unit, i_value = _parse_angle(i_radius)
+            o_unit, o_value = _parse_angle(o_radius)
+            key = "-c.r" + i_unit
+            center[key] = ",".join([str(i_value), str(o_value)])
+    elif width is not None:
+        # is box a rectangle or square?
+        if height is None:
+            width = coord.Angle(width)
+            unit, value = _parse_angle(width)
+            key = "-c.b" + unit
+            center[key] = "x".join([str(value)] * 2)
+        else:
+            w_box = coord.Angle(width)
+            h_box = coord.Angle(height)
+            if w_box.unit != h_box.unit:
+                h_box = h_box.to(w_box.unit)
+            w_unit, w_value = _parse_angle(w_box)
+            h_unit, h_value = _parse_angle(h_box)
+            key = "-c.b" + w_unit
+            center[key] = "x".join([str(w_value), str(h_value)])
+    else:
+        raise Exception(
+            "At least one of radius, width/height must be specified")
+
+    return center
+
+
+def _split_box(ra, dec, width, height, margin=0.02):
+    """
+    Splits a box, given in decimal degrees, into four quadrants that overlap
+    by a fraction ``margin`` of their size so that no source is lost at the
+    edges.
+
+    Returns
+    -------
+    list of ``(ra, dec, width, height)`` tuples
+    """
+    # the box covers width / cos(dec) in right ascension: each quadrant
+    # covers half of that span, at its own declination
+    cos_dec = max(np.cos(np.radians(dec)), 1e-3)
+    boxes = []
+    for offset_dec in (-height / 4., height / 4.):
+        sub_dec = min(max(dec + offset_dec, -90.), 90.)
+        sub_width = width / 2. * np.cos(np.radians(sub_dec)) / cos_dec
+        for offset_ra in (-width / 4., width / 4.):
+            sub_ra = (ra + offset_ra / cos_dec) % 360.
+            boxes.append((sub_ra, sub_dec, sub_width * (1 + margin),
+                          height / 2. * (1 + margin)))
+    return boxes
+
+
+def _clip_to_region(table, ra, dec, radius=None, width=None, height=None):
+    """
+    Keeps the rows of ``table`` whose computed position (``_RAJ2000``,
+    ``_DEJ2000``) falls within the cone or box, in decimal degrees, that was
+    originally queried.
+    """
+    if '_RAJ2000' not in table.colnames or '_DEJ2000' not in table.colnames:
+        return table
+    return table[tilecache.region_mask(table['_RAJ2000'], table['_DEJ2000'],
+                                       ra, dec, radius=radius, width=width,
+                                       height=height)]
+
+
+def _unique_rows(table, keys=None):
+    """
+    Removes the rows of ``table`` that repeat an earlier row in the ``keys``
+    columns. By default all the columns not starting with an underscore (the
+    ones computed by Vizier) are used.
+    """
+    if keys is None:
+        keys = [name for name in table.colnames if not name.startswith('_')]
+        if not keys:
+            keys = table.colnames
+    values = [np.ma.asarray(table[key]).tolist() for key in keys]
+    seen = set()
+    keep = []
+    for index, row in enumerate(zip(*values)):
+        if row not in seen:
+            seen.add(row)
+            keep.append(index)
+    if len(keep) == len(table):
+        return table
+    return table[np.array(keep, dtype=int)]
+
+
+# numpy equivalents of the scalar VOTable datatypes; anything else
+# (char, unicodeChar, arrays, complex types) is kept as a string column
+_VOTABLE_DTYPES = {'boolean': 'bool',
+                   'unsignedByte': 'u1',
+                   'short': 'i2',
+                   'int': 'i4',
+                   'long': 'i8',
+                   'float': 'f4',
+                   'double': 'f8'}
+
+
+class _ContentReader(object):
+
+    """
+    Minimal read-only file-like object wrapping an iterator of strings,
+    e.g. `requests.Response.iter_content`, so that the XML parser can consume
+    a response while it is still being downloaded.
+    """
+
+    def __init__(self, content_iter):
+        self._content_iter = iter(content_iter)
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                chunk = next(self._content_iter)
+            except StopIteration:
+                break
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode('utf-8')
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _iter_votable_chunks(content_iter, chunk_size):
+    """
+    Incrementally parse a VOTable (TABLEDATA serialization) and yield
+    ``(table_name, table)`` pairs holding at most ``chunk_size`` rows each.
+    Parsed rows are discarded from the XML tree as soon as they have been
+    converted, so the memory used does not grow with the size of the result.
+
+    Parameters
+    ----------
+    content_iter : iterable
+        Iterable over the raw content of the VOTable.
+    chunk_size : int
+        Maximum number of rows per yielded table.
+    """
+    table_names = {}
+    table_fields = {}
+    name = None
+    fields = []
+    rows = []
+    tabledata = None
+    parser = ElementTree.iterparse(_ContentReader(content_iter),
+                                   events=('start', 'end'))
+    try:
+        for event, elem in parser:
+            # strip the VOTable namespace, if any
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if tag == 'TABLE':
+                    ref = elem.get('ref')
+                    if ref is not None and ref in table_names:
+                        # a reference to an earlier table shares its
+                        # name and field definitions
+                        name = table_names[ref]
+                        fields = table_fields[ref]
+                    else:
+                        name = elem.get('name')
+                        fields = []
+                    if elem.get('ID') is not None:
+                        table_names[elem.get('ID')] = name
+                        table_fields[elem.get('ID')] = fields
+                elif tag == 'TABLEDATA':
+                    tabledata = elem
+            elif tag == 'FIELD':
+                fields.append((elem.get('name'), elem.get('datatype'),
+                               elem.get('arraysize'), elem.get('unit')))
+            elif tag == 'TR':
+                rows.append([td.text for td in elem])
+                elem.clear()
+                if len(rows) >= chunk_size:
+                    yield name, _rows_to_table(fields, rows)
+                    rows = []
+                    tabledata.clear()
+            elif tag == 'TABLE':
+                if rows:
+                    yield name, _rows_to_table(fields, rows)
+                    rows = []
+                tabledata = None
+                elem.clear()
+    except SyntaxError as ex:
+        # ElementTree.ParseError is a subclass of SyntaxError
+        raise TableParseError("Failed to parse VIZIER result stream!\n"
+                              "Exception: " + str(ex))
+
+
+def _rows_to_table(fields, rows):
+    """
+    Convert a list of rows of VOTable cell strings into a masked
+    `astropy.table.Table`, using the FIELD datatypes for the column dtypes.
+    Empty cells are masked.
+
+    Parameters
+    ----------
+    fields : list
+        ``(name, datatype, arraysize, unit)`` tuple for each FIELD.
+    rows : list
+        List of rows, each a list of cell strings (or None for empty cells).
+    """
+    columns = []
+    for index, (name, datatype, arraysize, unit) in enumerate(fields):
+        values = [row[index] if index < len(row) else None for row in rows]
+        mask = np.array([value is None or value.strip() == ''
+                         for value in values], dtype=bool)
+        dtype = _VOTABLE_DTYPES.get(datatype)
+        if dtype is None or arraysize is not None:
+            data = np.array([value if value is not None else ''
+                             for value in values])
+        elif dtype == 'bool':
+            data = np.array([value is not None and
+                             value.strip().lower() in ('t', 'true', '1')
+                             for value in values], dtype=bool)
+        else:
+            data = np.array([value if not masked else '0'
+                             for value, masked in zip(values, mask)])
+            data = data.astype(dtype)
+        columns.append(tbl.MaskedColumn(data=data, name=name, mask=mask,
+                                        unit=unit))
+    return tbl.Table(columns, masked=True)
+
+
 class VizierKeyword(list):
 
     """Helper class for setting keywords for Vizier queries"""
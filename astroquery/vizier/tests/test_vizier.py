@@ -1,11 +1,13 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 import os
+import warnings
 import requests
 from astropy.tests.helper import pytest
 from numpy import testing as npt
 from astropy.table import Table
 from ... import vizier
 from ...utils import commons
+from ...utils import TileCache
 from ...utils.testing_tools import MockResponse
 import astropy.units as u
 import astropy.coordinates as coord
@@ -35,6 +37,7 @@ def post_mockreturn(url, data=None, timeout=10, **kwargs):
     datad = dict([urlparse.parse_qsl(d)[0] for d in data.split('\n')])
     filename = data_path(VO_DATA[datad['-source']])
     content = open(filename, "r").read()
+    kwargs.pop('stream', None)
     return MockResponse(content, **kwargs)
 
 def parse_objname(obj):
@@ -106,6 +109,175 @@ def test_query_region(patch_post):
     assert isinstance(result, commons.TableList)
 
 
+def test_query_region_split_truncated(patch_post, recwarn):
+    v = vizier.core.VizierClass()
+    v.ROW_LIMIT = 14
+    result = v.query_region(coord.ICRS(ra=307.35388, dec=40.18858, unit=(u.deg, u.deg)),
+                            radius=1 * u.deg, catalog="B/iram/pdbi",
+                            split_truncated=True, max_depth=1)
+    # each of the four sub-boxes returns the same 14 rows again
+    assert len(result['B/iram/pdbi']) == 14
+    w = recwarn.pop(UserWarning)
+    assert 'B/iram/pdbi' in str(w.message)
+
+
+def test_query_region_split_not_truncated(patch_post):
+    v = vizier.core.VizierClass()
+    v.ROW_LIMIT = 50
+    center = coord.ICRS(ra=307.35388, dec=40.18858, unit=(u.deg, u.deg))
+    result = v.query_region(center, radius='0d5m', catalog="B/iram/pdbi",
+                            split_truncated=True)
+    expected = v.query_region(center, radius='0d5m', catalog="B/iram/pdbi")
+    assert result.keys() == expected.keys()
+    npt.assert_array_equal(result[0]['Name'], expected[0]['Name'])
+
+
+def test_query_region_split_table():
+    with pytest.raises(ValueError):
+        vizier.core.Vizier.query_region(Table([[1.], [2.]], names=['_RAJ2000', '_DEJ2000']),
+                                        radius='0d5m', split_truncated=True)
+
+
+POSITIONS_VOTABLE = """<?xml version="1.0"?>
+<VOTABLE version="1.2" xmlns="http://www.ivoa.net/xml/VOTable/v1.2">
+<RESOURCE name="test">
+<TABLE name="test/positions">
+<FIELD name="_q" datatype="short"/>
+<FIELD name="_RAJ2000" datatype="double" unit="deg"/>
+<FIELD name="_DEJ2000" datatype="double" unit="deg"/>
+<DATA><TABLEDATA>
+{rows}
+</TABLEDATA></DATA>
+</TABLE>
+</RESOURCE>
+</VOTABLE>
+"""
+
+
+def post_positions_mockreturn(url, data=None, timeout=10, **kwargs):
+    # one row per queried position, numbered from 1 within the request
+    script = dict([line.split('=', 1) for line in data.split('\n') if '=' in line])
+    positions = script['-c'][3:].split(';')
+    rows = ["<TR><TD>{0}</TD><TD>{1}</TD><TD>{2}</TD></TR>".format(i + 1, *pos.replace('-', ' -').replace('+', ' ').split())
+            for i, pos in enumerate(positions)]
+    return MockResponse(POSITIONS_VOTABLE.format(rows="\n".join(rows)))
+
+
+def test_query_region_table_batches(request):
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_positions_mockreturn)
+    v = vizier.core.VizierClass(catalog="test/positions")
+    v.POSITIONS_PER_QUERY = 3
+    targets = Table([[10. + i for i in range(7)], [-5. + i for i in range(7)]],
+                    names=['_RAJ2000', '_DEJ2000'])
+    targets['_RAJ2000'].unit = u.deg
+    targets['_DEJ2000'].unit = u.deg
+    result = v.query_region(targets, radius='0d1m')
+    table = result['test/positions']
+    assert list(table['_q']) == list(range(1, 8))
+    npt.assert_allclose(table['_RAJ2000'], targets['_RAJ2000'])
+    npt.assert_allclose(table['_DEJ2000'], targets['_DEJ2000'])
+
+
+def test_position_batches():
+    positions = ['1.0+2.0', '3.0+4.0', '5.0+6.0', '7.0-8.0', '9.0-1.0']
+    batches = vizier.core._position_batches(positions, 2, 1000)
+    assert [start for start, batch in batches] == [0, 2, 4]
+    assert sum([batch for start, batch in batches], []) == positions
+    # limited by the joined length: two positions of 7 characters + ';'
+    batches = vizier.core._position_batches(positions, 10, 16)
+    assert [len(batch) for start, batch in batches] == [2, 2, 1]
+
+
+def test_format_positions():
+    targets = Table([[299.59, 10.], [35.201, -2.5]], names=['_RAJ2000', '_DEJ2000'])
+    targets['_RAJ2000'].unit = u.deg
+    targets['_DEJ2000'].unit = u.deg
+    assert vizier.core._format_positions(targets) == ['299.59000000+35.20100000',
+                                                      '10.00000000-2.50000000']
+    with pytest.raises(ValueError):
+        vizier.core._format_positions(Table([[1.]], names=['ra']))
+
+
+def test_query_region_tile_cache(request):
+    calls = []
+
+    def post_counting(*args, **kwargs):
+        calls.append(args)
+        return post_mockreturn(*args, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_counting)
+    v = vizier.core.VizierClass()
+    v.ROW_LIMIT = -1
+    v.tile_cache = TileCache(tile_size=0.25)
+    center = coord.ICRS(ra=307.35388, dec=40.18858, unit=(u.deg, u.deg))
+    result = v.query_region(center, radius='0d5m', catalog="B/iram/pdbi")
+    assert len(result['B/iram/pdbi']) == 14
+    ncalls = len(calls)
+    assert ncalls == len(v.tile_cache)
+    result = v.query_region(center, radius='0d3m', catalog="B/iram/pdbi")
+    assert len(result['B/iram/pdbi']) == 14
+    assert len(calls) == ncalls
+
+
+def test_query_region_tile_cache_truncated(request):
+    calls = []
+
+    def post_counting(*args, **kwargs):
+        calls.append(args)
+        return post_mockreturn(*args, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post_counting)
+    v = vizier.core.VizierClass()
+    v.ROW_LIMIT = 5
+    v.tile_cache = TileCache(tile_size=0.25)
+    center = coord.ICRS(ra=307.35388, dec=40.18858, unit=(u.deg, u.deg))
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always')
+        v.query_region(center, radius='0d5m', catalog="B/iram/pdbi")
+    assert any('ROW_LIMIT' in str(warning.message) for warning in w)
+    assert len(v.tile_cache) == 0
+    # the truncated tiles are not served from the cache
+    ncalls = len(calls)
+    v.query_region(center, radius='0d3m', catalog="B/iram/pdbi")
+    assert len(calls) > ncalls
+
+
+def test_split_box():
+    boxes = vizier.core._split_box(10., 0., 2., 1.)
+    assert len(boxes) == 4
+    npt.assert_allclose(sorted(set([b[0] for b in boxes])), [9.5, 10.5])
+    npt.assert_allclose(sorted(set([b[1] for b in boxes])), [-0.25, 0.25])
+    assert all(b[3] > 0.5 for b in boxes)
+
+
+def test_unique_rows():
+    t = Table([[1, 2, 1, 3], ['a', 'b', 'a', 'c'], [0.1, 0.2, 0.3, 0.4]],
+              names=['id', 'name', '_r'])
+    result = vizier.core._unique_rows(t)
+    assert list(result['id']) == [1, 2, 3]
+    result = vizier.core._unique_rows(t, keys=['_r'])
+    assert len(result) == 4
+
+
+def test_iter_query_region(patch_post):
+    chunks = list(vizier.core.Vizier.iter_query_region(coord.ICRS(ra=307.35388, dec=40.18858, unit=(u.deg, u.deg)),
+                                                       radius='0d5m', catalog="B/iram/pdbi",
+                                                       chunk_size=5))
+    assert [len(table) for name, table in chunks] == [5, 5, 4]
+    assert all(name == 'B/iram/pdbi' for name, table in chunks)
+    assert all(isinstance(table, Table) for name, table in chunks)
+
+
+def test_iter_query_constraints(patch_post):
+    chunks = list(vizier.core.Vizier.iter_query_constraints(catalog=["HIP", "NOMAD", "UCAC"],
+                                                            chunk_size=1000))
+    result = vizier.core.Vizier.query_constraints(catalog=["HIP", "NOMAD", "UCAC"])
+    assert len(chunks) == len(result)
+    for name, table in chunks:
+        assert len(table) == len(result[name])
+
+
 def test_query_object_async(patch_post):
     response = vizier.core.Vizier.query_object_async("HD 226868", catalog=["NOMAD", "UCAC"])
     assert response is not None
@@ -163,3 +335,32 @@ class TestVizierClass:
         v = vizier.core.Vizier(columns=['Vmag', 'B-V', '_RAJ2000', '_DEJ2000'])
         assert len(v.columns) == 4
 
+
+
+def test_query_settings(request):
+    posted = []
+
+    def post(url, data=None, timeout=10, **kwargs):
+        posted.append(data.split('\n'))
+        return post_mockreturn(url, data=data, timeout=timeout, **kwargs)
+    mp = request.getfuncargvalue("monkeypatch")
+    mp.setattr(requests, 'post', post)
+    v = vizier.core.VizierClass(catalog='B/iram/pdbi')
+    settings = v.get_settings()._replace(columns=('Jmag',), row_limit=5,
+                                         catalog='J/ApJ/706/83')
+    before = v.get_settings()
+    result = v.query_region(coord.ICRS(ra=299.590, dec=35.201,
+                                       unit=(u.deg, u.deg)),
+                            radius=5 * u.arcmin, settings=settings)
+    assert isinstance(result, commons.TableList)
+    assert '-source=J/ApJ/706/83' in posted[0]
+    assert '-out=Jmag,_RAJ2000,_DEJ2000' in posted[0]
+    assert '-out.max=5' in posted[0]
+    # the instance is left untouched
+    assert v.get_settings() == before
+    result = v.query_region(coord.ICRS(ra=299.590, dec=35.201,
+                                       unit=(u.deg, u.deg)),
+                            radius=5 * u.arcmin)
+    assert '-source=B/iram/pdbi' in posted[1]
+    # queries do not extend the columns of the instance
+    assert v.columns == ['*']